@@ -0,0 +1,36 @@
+import struct
+from socket import AF_INET6, inet_aton, inet_ntoa, inet_ntop, inet_pton
+
+# ================= PACKED ADDRESSES ================= #
+
+# The capture backends hand detectors integers instead of address strings:
+# an int key is smaller than the string (28-32 bytes against 60+), hashes
+# faster and is shared by every table the host appears in. Text only comes
+# back when an alert or report is printed.
+#
+#   IPv4  the 32-bit address
+#   IPv6  the 128-bit address with bit 128 set, so ::1 and 0.0.0.1 differ
+#   MAC   the 48-bit address
+
+IPV6_FLAG = 1 << 128
+unpack_u32 = struct.Struct("!I").unpack
+
+
+def pack_ip(text):
+    try:
+        return unpack_u32(inet_aton(text))[0]
+    except OSError:
+        return IPV6_FLAG | int.from_bytes(inet_pton(AF_INET6, text), "big")
+
+
+# Address text for an int from pack_ip; strings (standalone scripts) pass through
+def ip_text(value):
+    if isinstance(value, str):
+        return value
+    if value >= IPV6_FLAG:
+        return inet_ntop(AF_INET6, (value ^ IPV6_FLAG).to_bytes(16, "big"))
+    return inet_ntoa(value.to_bytes(4, "big"))
+
+
+def pack_mac(text):
+    return int(text.replace(":", ""), 16)
@@ -1,10 +1,14 @@
 import subprocess
-from collections import defaultdict, deque
-from datetime import datetime, timezone
-from pymongo import MongoClient
+import time
 import os
 from dotenv import load_dotenv
 
+from heuristics import HeuristicStore
+from hoststate import BindingTable, HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sinks import MongoAlertWriter, get_client
+
 # ENV
 
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
@@ -16,95 +20,158 @@ INTERFACE = "any"
 TIME_WINDOW = 30          # seconds
 MAC_THRESHOLD = 2         # different MACs for same IP
 ALERT_COOLDOWN = 30       # seconds (avoid alert spam)
-
-# MONGODB
-
-client = MongoClient(MONGO_URI)
-db = client["alert_db"]
-collection = db["alerts"]
+MAX_HOSTS = 100000        # tracked hosts per state table
 
 # DATA STRUCTURES
 
-ip_mac_map = defaultdict(lambda: defaultdict(deque))
-last_alert = {}
-
-# TSHARK COMMAND
-
-cmd = [
-    "tshark",
-    "-i", INTERFACE,
-    "-Y", "arp.opcode == 2",          # ARP Reply
-    "-T", "fields",
-    "-e", "frame.time_epoch",
-    "-e", "arp.src.proto_ipv4",
-    "-e", "arp.src.hw_mac"
-]
-
-proc = subprocess.Popen(
-    cmd,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.DEVNULL,
-    text=True
-)
-
-print("ARP Spoofing Detection Started...")
-
-# MAIN LOOP
-
-try:
-    for line in proc.stdout:
-        try:
-            timestamp, ip, mac = line.strip().split()
-            timestamp = float(timestamp)
-        except ValueError:
-            continue
-
-        # Store MAC usage per IP
-        ip_mac_map[ip][mac].append(timestamp)
-
-        # Cleanup old entries (sliding window)
-        for m in list(ip_mac_map[ip].keys()):
-            while ip_mac_map[ip][m] and ip_mac_map[ip][m][0] < timestamp - TIME_WINDOW:
-                ip_mac_map[ip][m].popleft()
-
-            if not ip_mac_map[ip][m]:
-                del ip_mac_map[ip][m]
-
-        mac_count = len(ip_mac_map[ip])
+ip_mac_map = BindingTable(TIME_WINDOW, MAX_HOSTS)     # ip -> {mac: last seen}
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics(heuristics):
+    global TIME_WINDOW, MAC_THRESHOLD, ALERT_COOLDOWN
+    version = heuristics.version
+    config = heuristics.get("arp")
+    TIME_WINDOW, MAC_THRESHOLD, ALERT_COOLDOWN = config["time_window"], config["mac_threshold"], config["cooldown"]
+    ip_mac_map.resize(TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+# PER-PACKET DETECTION
+# One line of tshark output; alerts go to emit(). bench.py drives this
+# directly, without tshark or Mongo.
+
+def handle(line, stats, emit, timer=None):
+    try:
+        timestamp, ip, mac = line.strip().split()
+        timestamp = float(timestamp)
+    except ValueError:
+        stats.parse_error()
+        return
+
+    if timer:
+        timer.lap("parse")
+
+    # Expire idle hosts (bounded work per packet)
+    ip_mac_map.tick(timestamp)
+    last_alert.tick(timestamp)
+
+    # Record the binding; stale ones expire on the timer wheel
+    macs = ip_mac_map.bind(ip, mac, timestamp)
+    mac_count = len(macs)
+    if mac_count >= MAC_THRESHOLD:
+        mac_count = ip_mac_map.live(ip, timestamp)     # exact, ignores stale bindings not yet pruned
+    stats.packet(ip, timestamp)
+    if DEBUG:
         print(f"ARP Reply: {ip} → MACs seen = {mac_count}")
+    if timer:
+        timer.lap("window")
 
-        # DETECTION
-
-        if mac_count >= MAC_THRESHOLD:
-            now = datetime.now(timezone.utc)
+    # DETECTION
 
-            # Cooldown check
-            if ip in last_alert and (now - last_alert[ip]).total_seconds() < ALERT_COOLDOWN:
-                continue
+    alert = None
+    if mac_count >= MAC_THRESHOLD:
+        now = timestamp      # packet time, the same clock as the windows
 
+        # Cooldown check
+        if ip not in last_alert or now - last_alert[ip] >= ALERT_COOLDOWN:
             alert = {
                 "type": "alert",
                 "attack": "ARP Spoofing",
                 "ip": ip,
                 # "mac_addresses": list(ip_mac_map[ip].keys()),
                 "timestamp": now,
+                "packet_time": timestamp,       # latency.py: time-to-alert
+                "detected_at": time.time(),
                 "message": f"ARP spoofing suspected: {ip} mapped to multiple MAC addresses",
                 "tips": "Verify network devices and consider using static ARP entries.",
                 "status": "unresolved"
             }
 
-            # Store alert in MongoDB
-            collection.insert_one(alert)
+    # Every packet, alerting or not
+    if timer:
+        timer.lap("detect")
 
-            print("ALERT STORED IN DATABASE:", alert)
+    if alert is None:
+        return
+
+    emit(alert)
+    if timer:
+        timer.lap("sink")
+
+    last_alert[ip] = timestamp
+
+
+# TSHARK COMMAND
 
-            last_alert[ip] = now
+cmd = [
+    "tshark",
+    "-i", INTERFACE,
+    "-f", "arp[6:2] = 2",
+    "-Y", "arp.opcode == 2",          # ARP Reply
+    "-T", "fields",
+    "-e", "frame.time_epoch",
+    "-e", "arp.src.proto_ipv4",
+    "-e", "arp.src.hw_mac"
+]
 
-except KeyboardInterrupt:
-    print("\n Stopping ARP Spoofing Detection...")
 
-finally:
-    proc.terminate()
-    proc.wait()
-    client.close()
-    print("Detector shutdown complete")
+def main():
+    # MONGODB
+    client = get_client(MONGO_URI)
+    db = client["alert_db"]
+    collection = db["alerts"]
+    alert_writer = MongoAlertWriter(collection)   # batched, off the packet loop
+
+    # Hot-reloadable thresholds (Mongo, cached in heuristics.json)
+    heuristics = HeuristicStore(db["heuristics"], {
+        "arp": {"time_window": TIME_WINDOW, "mac_threshold": MAC_THRESHOLD, "cooldown": ALERT_COOLDOWN}
+    })
+    heuristic_version = apply_heuristics(heuristics)
+
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+
+    print("ARP Spoofing Detection Started...")
+
+    # Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+    stats = StatsReporter("arp", hosts=lambda: len(ip_mac_map))
+    prof = StageProfiler("arp")     # IDS_PROFILE=1 or kill -USR1 to enable
+
+    # Queue alert for MongoDB (written in batches)
+    def emit(alert):
+        alert_writer.write(alert)
+        print("ALERT QUEUED FOR DATABASE:", alert)
+        stats.alert()
+
+    # MAIN LOOP
+
+    try:
+        for line in proc.stdout:
+            timer = prof.start() if prof.enabled else None
+            if heuristics.version != heuristic_version:
+                heuristic_version = apply_heuristics(heuristics)
+            handle(line, stats, emit, timer)
+
+    except KeyboardInterrupt:
+        print("\n Stopping ARP Spoofing Detection...")
+
+    finally:
+        stats.close()
+        prof.close()
+        heuristics.close()
+        proc.terminate()
+        proc.wait()
+        alert_writer.close()
+        client.close()
+        print("Detector shutdown complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import subprocess
-import socketio
-from collections import defaultdict, deque
-from datetime import datetime, timezone
-from pymongo import MongoClient
+import time
 import os
 from dotenv import load_dotenv
 
+from emitter import LiveEmitter
+from heuristics import HeuristicStore
+from hoststate import BindingTable, HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sinks import MongoAlertWriter, get_client
+
 # ENV
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
 MONGO_URI = os.getenv("MONGO_URI")
@@ -15,40 +19,48 @@ INTERFACE = "any"
 TIME_WINDOW = 30           # seconds
 MAC_THRESHOLD = 2          # different MACs for same IP
 ALERT_COOLDOWN = 30        # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
 ATTACK_TYPE = "ARP_SPOOFING"
 
 BACKEND_SOCKET_URL = "http://localhost:5001"
 
 # SOCKET.IO CLIENT
-sio = socketio.Client(reconnection=True)
-
-@sio.event
-def connect():
-    print("Connected to backend Socket.IO server")
-
-@sio.event
-def disconnect():
-    print("Disconnected from backend Socket.IO server")
-
-try:
-    sio.connect(BACKEND_SOCKET_URL)
-except Exception as e:
-    print("Unable to connect to backend:", e)
-    exit(1)
+live = LiveEmitter(BACKEND_SOCKET_URL)   # background thread, buffers while backend is down
 
 # MONGODB
-client = MongoClient(MONGO_URI)
+client = get_client(MONGO_URI)
 db = client["alert_db"]
 collection = db["alerts"]
+alert_writer = MongoAlertWriter(collection)   # batched, off the packet loop
 
 # DATA STRUCTURES
-ip_mac_map = defaultdict(lambda: defaultdict(deque))
-last_alert = {}
+ip_mac_map = BindingTable(TIME_WINDOW, MAX_HOSTS)     # ip -> {mac: last seen}
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Hot-reloadable thresholds (Mongo, cached in heuristics.json)
+heuristics = HeuristicStore(db["heuristics"], {
+    "arp": {"time_window": TIME_WINDOW, "mac_threshold": MAC_THRESHOLD, "cooldown": ALERT_COOLDOWN}
+})
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics():
+    global TIME_WINDOW, MAC_THRESHOLD, ALERT_COOLDOWN
+    version = heuristics.version
+    config = heuristics.get("arp")
+    TIME_WINDOW, MAC_THRESHOLD, ALERT_COOLDOWN = config["time_window"], config["mac_threshold"], config["cooldown"]
+    ip_mac_map.resize(TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # TSHARK COMMAND
 cmd = [
     "tshark",
     "-i", INTERFACE,
+    "-f", "arp[6:2] = 2",
     "-Y", "arp.opcode == 2",       # ARP Reply
     "-T", "fields",
     "-e", "frame.time_epoch",
@@ -65,66 +77,94 @@ proc = subprocess.Popen(
 
 print("Live ARP Spoofing IDS started...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("arpLive", hosts=lambda: len(ip_mac_map))
+prof = StageProfiler("arpLive")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # MAIN LOOP
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         try:
             timestamp, ip, mac = line.strip().split()
             timestamp = float(timestamp)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Store MAC usage per IP
-        ip_mac_map[ip][mac].append(timestamp)
+        if timer:
+            timer.lap("parse")
 
-        # Sliding window cleanup
-        for m in list(ip_mac_map[ip].keys()):
-            while ip_mac_map[ip][m] and ip_mac_map[ip][m][0] < timestamp - TIME_WINDOW:
-                ip_mac_map[ip][m].popleft()
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
 
-            if not ip_mac_map[ip][m]:
-                del ip_mac_map[ip][m]
+        # Expire idle hosts (bounded work per packet)
+        ip_mac_map.tick(timestamp)
+        last_alert.tick(timestamp)
 
-        mac_count = len(ip_mac_map[ip])
-        print(f"ARP Reply from {ip} | MACs seen = {mac_count}")
+        # Record the binding; stale ones expire on the timer wheel
+        macs = ip_mac_map.bind(ip, mac, timestamp)
+        mac_count = len(macs)
+        if mac_count >= MAC_THRESHOLD:
+            mac_count = ip_mac_map.live(ip, timestamp)     # exact, ignores stale bindings not yet pruned
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"ARP Reply from {ip} | MACs seen = {mac_count}")
+        if timer:
+            timer.lap("window")
 
         # DETECTION
+        alert = None
         if mac_count >= MAC_THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_alert.get(ip)
 
             # Cooldown check
-            if last_time and (now - last_time).total_seconds() < ALERT_COOLDOWN:
-                continue
-
-            alert = {
-                "attack_type": ATTACK_TYPE,
-                "ip": ip,
-                "mac_count": mac_count,
-                "time_window": TIME_WINDOW,
-                "severity": "High",
-                "timestamp": now.isoformat(),
-                "message": "Possible ARP spoofing detected: IP mapped to multiple MAC addresses",
-                "status": "unresolved"
-            }
+            if not last_time or now - last_time >= ALERT_COOLDOWN:
+                alert = {
+                    "attack_type": ATTACK_TYPE,
+                    "ip": ip,
+                    "mac_count": mac_count,
+                    "time_window": TIME_WINDOW,
+                    "severity": "High",
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": "Possible ARP spoofing detected: IP mapped to multiple MAC addresses",
+                    "status": "unresolved"
+                }
+
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
 
-            # Store alert in MongoDB
-            collection.insert_one(alert)
+        # Queue alert for MongoDB (written in batches)
+        alert_writer.write(alert)
 
-            # Emit live alert to backend
-            sio.emit("live_alert", alert)
+        # Emit live alert to backend
+        live.emit(alert)
+        if timer:
+            timer.lap("sink")
 
-            print("LIVE ALERT SENT & STORED:", alert)
+        print("LIVE ALERT SENT & QUEUED:", alert)
+        stats.alert()
 
-            last_alert[ip] = now
-            ip_mac_map[ip].clear()
+        last_alert[ip] = timestamp
+        ip_mac_map.clear(ip)
 
 except KeyboardInterrupt:
     print("\nStopping ARP Spoofing IDS...")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
     proc.wait()
+    alert_writer.close()
     client.close()
-    sio.disconnect()
+    live.close()
     print("IDS shutdown complete")
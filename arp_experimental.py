@@ -1,14 +1,18 @@
 import subprocess
-import csv
-from collections import defaultdict, deque
 from datetime import datetime, timezone
 
+from datasets import DatasetWriter
+from hoststate import BindingTable, HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+
 # ================= CONFIG ================= #
 
 INTERFACE = "any"
 TIME_WINDOW = 30            # seconds
 MAC_THRESHOLD = 2           # MACs per IP
 ALERT_COOLDOWN = 30         # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
 ATTACK_TYPE = "ARP_SPOOFING"
 
 CSV_FILE = "arp_spoofing_alerts.csv"
@@ -16,26 +20,26 @@ CSV_FILE = "arp_spoofing_alerts.csv"
 # ========================================= #
 
 # DATA STRUCTURES
-ip_mac_map = defaultdict(lambda: defaultdict(deque))
-last_alert = {}
+ip_mac_map = BindingTable(TIME_WINDOW, MAX_HOSTS)     # ip -> {mac: last seen}
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
 
 # CSV SETUP
-with open(CSV_FILE, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "timestamp",
-        "attack_type",
-        "ip",
-        "mac_count",
-        "time_window",
-        "severity",
-        "message"
-    ])
+# Alerts are rare, so every row is flushed straight away
+alert_log = DatasetWriter(CSV_FILE, [
+    "timestamp",
+    "attack_type",
+    "ip",
+    "mac_count",
+    "time_window",
+    "severity",
+    "message"
+], truncate=True, flush_rows=1)
 
 # TSHARK COMMAND
 cmd = [
     "tshark",
     "-i", INTERFACE,
+    "-f", "arp[6:2] = 2",
     "-Y", "arp.opcode == 2",
     "-T", "fields",
     "-e", "frame.time_epoch",
@@ -52,62 +56,82 @@ proc = subprocess.Popen(
 
 print("ARP Spoofing IDS started (CSV logging enabled)...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("arp_experimental", hosts=lambda: len(ip_mac_map))
+prof = StageProfiler("arp_experimental")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # ================= MAIN LOOP ================= #
 
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         try:
             timestamp, ip, mac = line.strip().split()
             timestamp = float(timestamp)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Track MAC usage per IP
-        ip_mac_map[ip][mac].append(timestamp)
-
-        # Sliding window cleanup
-        for m in list(ip_mac_map[ip].keys()):
-            while ip_mac_map[ip][m] and ip_mac_map[ip][m][0] < timestamp - TIME_WINDOW:
-                ip_mac_map[ip][m].popleft()
+        if timer:
+            timer.lap("parse")
 
-            if not ip_mac_map[ip][m]:
-                del ip_mac_map[ip][m]
+        # Expire idle hosts (bounded work per packet)
+        ip_mac_map.tick(timestamp)
+        last_alert.tick(timestamp)
 
-        mac_count = len(ip_mac_map[ip])
-        print(f"ARP Reply from {ip} | MACs seen = {mac_count}")
+        # Record the binding; stale ones expire on the timer wheel
+        macs = ip_mac_map.bind(ip, mac, timestamp)
+        mac_count = len(macs)
+        if mac_count >= MAC_THRESHOLD:
+            mac_count = ip_mac_map.live(ip, timestamp)     # exact, ignores stale bindings not yet pruned
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"ARP Reply from {ip} | MACs seen = {mac_count}")
+        if timer:
+            timer.lap("window")
 
         # DETECTION
+        alert = None
         if mac_count >= MAC_THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_alert.get(ip)
 
-            if last_time and (now - last_time).total_seconds() < ALERT_COOLDOWN:
-                continue
-
-            alert = [
-                now.isoformat(),
-                ATTACK_TYPE,
-                ip,
-                mac_count,
-                TIME_WINDOW,
-                "High",
-                "Possible ARP spoofing detected: IP mapped to multiple MAC addresses"
-            ]
+            if not last_time or now - last_time >= ALERT_COOLDOWN:
+                alert = [
+                    datetime.fromtimestamp(now, timezone.utc).isoformat(),
+                    ATTACK_TYPE,
+                    ip,
+                    mac_count,
+                    TIME_WINDOW,
+                    "High",
+                    "Possible ARP spoofing detected: IP mapped to multiple MAC addresses"
+                ]
+
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
 
-            # Write to CSV
-            with open(CSV_FILE, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(alert)
+        # Write to CSV
+        alert_log.write_row(alert)
+        if timer:
+            timer.lap("sink")
 
-            print("ALERT SAVED TO CSV:", alert)
+        print("ALERT SAVED TO CSV:", alert)
+        stats.alert()
 
-            last_alert[ip] = now
-            ip_mac_map[ip].clear()
+        last_alert[ip] = timestamp
+        ip_mac_map.clear(ip)
 
 except KeyboardInterrupt:
     print("\nStopping ARP Spoofing IDS...")
 
 finally:
+    stats.close()
+    prof.close()
     proc.terminate()
     proc.wait()
+    alert_log.close()
     print("IDS shutdown complete")
@@ -0,0 +1,462 @@
+import argparse
+import heapq
+import importlib
+import json
+import os
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from socket import inet_aton
+
+from capture import CaptureEngine, Packet
+from detectors import DETECTORS, SYN_ENGINES
+from reporter import StatsReporter
+
+# ================= DETECTOR BENCHMARK ================= #
+
+# Synthetic-traffic benchmark for the detectors, without tshark, MongoDB or
+# Socket.IO:
+#
+#   python bench.py                          # every scenario, both backends
+#   python bench.py --scenarios syn_flood --packets 500000
+#   python bench.py --save-baseline          # record bench_baseline.json
+#   python bench.py --syn-engine sketch      # Count-Min SYN engine instead
+#   python bench.py --keep bench_data        # also keep the .txt/.pcap inputs
+#   python bench.py --scripts ""             # skip the standalone scripts
+#
+# Each scenario is generated once as tshark field output (the exact text
+# the tshark backend parses) and as a classic pcap (decoded by
+# pcapstream), then replayed through CaptureEngine with all detectors in a
+# fresh process, so the peak RSS figure belongs to that run alone.
+#
+# The standalone scripts (tcp_syn.py, port_scan.py, arp.py) have their own
+# per-packet code, separate from detectors.py. Each is imported in a fresh
+# process and its handle() is fed the lines its tshark command would
+# print; nothing is written to Mongo. Importing them needs python-dotenv
+# and pymongo; without those the script runs are reported as skipped.
+#
+# Results are compared with the stored baseline: throughput or peak RSS
+# worse than --tolerance, or any change in alert counts, is reported and
+# makes the exit status non-zero. Throughput and RSS depend on the
+# machine, so no baseline is shipped; record one on the machine you
+# compare on first:
+#
+#   python bench.py --save-baseline          # on the commit to compare against
+#   python bench.py                          # later: compare with it
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_PACKETS = 200000
+SEED = 1337
+START = 1700000000.0        # epoch of the first synthetic packet
+
+SYN = 0x002
+ACK = 0x010
+PSH_ACK = 0x018
+SYN_ACK = 0x012
+
+
+# ================= SYNTHETIC TRAFFIC ================= #
+
+def lan_ip(rng):
+    return f"10.0.{rng.randrange(4)}.{rng.randrange(1, 255)}"
+
+
+def spoofed_ip(rng):
+    return f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+
+def host_mac(ip):
+    return "02:00:" + ":".join(f"{int(part):02x}" for part in ip.split("."))
+
+
+# One interactive SSH session: the handshake, then a keystroke and its
+# echo every few seconds
+def ssh_session(rng, client, server):
+    sport = rng.randrange(32768, 61000)
+    ts = START + rng.uniform(0.0, 1.0)
+    yield Packet(ts, "tcp", client, server, sport, 22, SYN, -1, 0, None)
+    yield Packet(ts + 0.0005, "tcp", server, client, 22, sport, SYN_ACK, -1, 0, None)
+    yield Packet(ts + 0.001, "tcp", client, server, sport, 22, ACK, -1, 0, None)
+    while True:
+        ts += rng.uniform(2.5, 5.0)
+        yield Packet(ts, "tcp", client, server, sport, 22, PSH_ACK, -1, 0, None)
+        yield Packet(ts + 0.0005, "tcp", server, client, 22, sport, PSH_ACK, -1, 0, None)
+
+
+# Normal LAN chatter: established TCP, occasional new connections, pings,
+# consistent ARP replies and three SSH sessions to one server. With
+# keystrokes at least 2.5 s apart the server sends at most 18 packets in
+# any 10 s for the three sessions together, handshakes included, so benign
+# traffic stays under the ssh thresholds (20 per source, 200 per
+# destination in 10 s).
+def background(rng, n, rate=20000.0):
+    hosts = [lan_ip(rng) for _ in range(200)]
+    servers = [f"10.1.0.{i}" for i in range(1, 21)]
+    ssh = heapq.merge(*(ssh_session(rng, client, servers[0]) for client in rng.sample(hosts, 3)),
+                      key=lambda pkt: pkt.ts)
+    next_ssh = next(ssh)
+    ts = START
+
+    for _ in range(n):
+        ts += rng.expovariate(rate)
+        if next_ssh.ts <= ts:
+            yield next_ssh
+            next_ssh = next(ssh)
+            continue
+
+        src = rng.choice(hosts)
+        roll = rng.random()
+
+        if roll < 0.85:
+            yield Packet(ts, "tcp", src, rng.choice(servers), rng.randrange(32768, 61000),
+                         rng.choice((80, 443, 8080)), rng.choice((ACK, PSH_ACK)), -1, 0, None)
+        elif roll < 0.95:
+            yield Packet(ts, "tcp", src, rng.choice(servers), rng.randrange(32768, 61000),
+                         rng.choice((80, 443)), SYN, -1, 0, None)
+        elif roll < 0.98:
+            yield Packet(ts, "icmp", src, rng.choice(servers), 0, 0, 0, 8, 0, None)
+        else:
+            yield Packet(ts, "arp", src, None, 0, 0, 0, -1, 2, host_mac(src))
+
+
+def attack(n, rate, make, rng):
+    ts = START + 0.5
+    for i in range(n):
+        ts += rng.expovariate(rate)
+        yield make(ts, i)
+
+
+def syn_flood(rng, n):
+    return attack(n, 50000.0, lambda ts, i: Packet(
+        ts, "tcp", "192.0.2.66", "10.1.0.1", rng.randrange(1024, 65535), 80, SYN, -1, 0, None), rng)
+
+
+def spoofed_flood(rng, n):
+    return attack(n, 50000.0, lambda ts, i: Packet(
+        ts, "tcp", spoofed_ip(rng), "10.1.0.1", rng.randrange(1024, 65535), 80, SYN, -1, 0, None), rng)
+
+
+# One scanner walking the ports of one host
+def vertical_scan(rng, n):
+    return attack(n, 5000.0, lambda ts, i: Packet(
+        ts, "tcp", "192.0.2.77", "10.1.0.5", 45000, 1 + i % 65535, SYN, -1, 0, None), rng)
+
+
+# One scanner probing one port across the address space
+def horizontal_scan(rng, n):
+    return attack(n, 5000.0, lambda ts, i: Packet(
+        ts, "tcp", "192.0.2.78", f"10.{2 + i // 65536 % 200}.{i // 256 % 256}.{i % 256}",
+        45000, 445, SYN, -1, 0, None), rng)
+
+
+# A second MAC answering for the gateway address
+def arp_spoof(rng, n):
+    macs = (host_mac("10.0.0.1"), "de:ad:be:ef:00:01")
+    return attack(n, 200.0, lambda ts, i: Packet(
+        ts, "arp", "10.0.0.1", None, 0, 0, 0, -1, 2, macs[i % 2]), rng)
+
+
+def ping_flood(rng, n):
+    return attack(n, 20000.0, lambda ts, i: Packet(
+        ts, "icmp", "192.0.2.99", "10.1.0.1", 0, 0, 0, 8, 0, None), rng)
+
+
+# SSH password guessing, one connection attempt after another
+def ssh_bruteforce(rng, n):
+    return attack(n, 500.0, lambda ts, i: Packet(
+        ts, "tcp", "192.0.2.22", "10.1.0.1", 40000 + i % 20000, 22, (SYN, PSH_ACK, ACK)[i % 3], -1, 0, None), rng)
+
+
+# name -> attack generator; None is background only
+SCENARIOS = {
+    "benign": None,
+    "syn_flood": syn_flood,
+    "spoofed_flood": spoofed_flood,
+    "vertical_scan": vertical_scan,
+    "horizontal_scan": horizontal_scan,
+    "arp_spoof": arp_spoof,
+    "ping_flood": ping_flood,
+    "ssh_bruteforce": ssh_bruteforce,
+}
+
+
+# Background plus attack, half and half, in time order
+def generate(name, n):
+    rng = random.Random(f"{SEED}:{name}")
+    make = SCENARIOS[name]
+    if make is None:
+        return background(rng, n)
+    return heapq.merge(background(rng, n - n // 2), make(rng, n // 2), key=lambda pkt: pkt.ts)
+
+
+# ================= SERIALIZERS ================= #
+
+# One line of `tshark -T fields -E separator=, -E occurrence=f` output
+def tshark_line(pkt):
+    if pkt.proto == "arp":
+        return f"{pkt.ts:.6f},,,,,,,{pkt.arp_op},{pkt.src},{pkt.mac}\n"
+    if pkt.proto == "icmp":
+        return f"{pkt.ts:.6f},{pkt.src},{pkt.dst},,,,{pkt.icmp_type},,,\n"
+    return f"{pkt.ts:.6f},{pkt.src},{pkt.dst},{pkt.sport},{pkt.dport},0x{pkt.flags:04x},,,,\n"
+
+
+PCAP_HEADER = struct.Struct("<IHHiIII")
+PCAP_RECORD = struct.Struct("<IIII")
+ETH_HEADER = struct.Struct("!6s6sH")
+IPV4_HEADER = struct.Struct("!BBHHHBBH4s4s")
+TCP_HEADER = struct.Struct("!HHIIHHHH")
+ARP_BODY = struct.Struct("!HHBBH6s4s6s4s")
+
+BROADCAST = b"\xff" * 6
+ZERO_MAC = b"\x00" * 6
+
+
+def ipv4(src, dst, proto, payload):
+    header = IPV4_HEADER.pack(0x45, 0, 20 + len(payload), 0, 0, 64, proto, 0, inet_aton(src), inet_aton(dst))
+    return header + payload
+
+
+# Ethernet frame carrying the fields the decoder reads
+def frame(pkt):
+    if pkt.proto == "arp":
+        mac = bytes.fromhex(pkt.mac.replace(":", ""))
+        body = ARP_BODY.pack(1, 0x0800, 6, 4, pkt.arp_op, mac, inet_aton(pkt.src), ZERO_MAC, inet_aton("10.0.0.254"))
+        return ETH_HEADER.pack(BROADCAST, mac, 0x0806) + body
+
+    if pkt.proto == "icmp":
+        payload = bytes((pkt.icmp_type, 0)) + b"\x00" * 6
+        return ETH_HEADER.pack(BROADCAST, ZERO_MAC, 0x0800) + ipv4(pkt.src, pkt.dst, 1, payload)
+
+    tcp = TCP_HEADER.pack(pkt.sport, pkt.dport, 0, 0, (5 << 12) | pkt.flags, 65535, 0, 0)
+    return ETH_HEADER.pack(BROADCAST, ZERO_MAC, 0x0800) + ipv4(pkt.src, pkt.dst, 6, tcp)
+
+
+def syn_only(pkt):
+    return pkt.proto == "tcp" and pkt.flags & (SYN | ACK) == SYN
+
+
+# Standalone script -> the line its tshark command prints for a packet,
+# None where its capture filter drops the packet
+SCRIPTS = {
+    "tcp_syn": lambda pkt: f"{pkt.ts:.6f}\t{pkt.src}\t{pkt.dst}\n" if syn_only(pkt) else None,
+    "port_scan": lambda pkt: f"{pkt.ts:.6f}\t{pkt.src}\t{pkt.dst}\t{pkt.dport}\n" if syn_only(pkt) else None,
+    "arp": lambda pkt: f"{pkt.ts:.6f}\t{pkt.src}\t{pkt.mac}\n" if pkt.proto == "arp" and pkt.arp_op == 2 else None,
+}
+
+
+def write_inputs(name, n, directory, scripts):
+    paths = {
+        "tshark": os.path.join(directory, f"{name}.txt"),
+        "pcap": os.path.join(directory, f"{name}.pcap"),
+    }
+    for script in scripts:
+        paths[script] = os.path.join(directory, f"{name}.{script}.txt")
+
+    with open(paths["tshark"], "w") as text, open(paths["pcap"], "wb") as pcap:
+        outputs = [(SCRIPTS[script], open(paths[script], "w")) for script in scripts]
+        try:
+            pcap.write(PCAP_HEADER.pack(0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+            for pkt in generate(name, n):
+                text.write(tshark_line(pkt))
+                data = frame(pkt)
+                sec = int(pkt.ts)
+                pcap.write(PCAP_RECORD.pack(sec, int((pkt.ts - sec) * 1e6), len(data), len(data)))
+                pcap.write(data)
+                for line_of, out in outputs:
+                    line = line_of(pkt)
+                    if line is not None:
+                        out.write(line)
+        finally:
+            for _, out in outputs:
+                out.close()
+
+    return paths
+
+
+# ================= RUNNER ================= #
+
+# CaptureEngine fed from recorded tshark output instead of a tshark process
+class TextReplayEngine(CaptureEngine):
+
+    def lines(self):
+        with open(self.read_file) as f:
+            yield from f
+
+
+# Runs in a child process; prints one JSON result line
+def run_one(backend, path, syn_engine):
+    if backend in SCRIPTS:
+        run_script(backend, path, syn_engine)
+        return
+
+    detectors = [SYN_ENGINES[syn_engine]() if name == "syn" else cls() for name, cls in DETECTORS.items()]
+    if backend == "tshark":
+        engine = TextReplayEngine(detectors, read_file=path)
+    else:
+        engine = CaptureEngine(detectors, backend="pcap", read_file=path)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    alerts = Counter()
+
+    started = time.perf_counter()
+    for det, alert in engine.run():
+        alerts[det.NAME] += 1
+    elapsed = time.perf_counter() - started
+
+    report(engine.packet_count, elapsed, rss_before, {name: alerts[name] for name in sorted(DETECTORS)})
+
+
+# A standalone script's handle(), fed its own tshark lines; alerts are
+# counted per attack instead of queued for Mongo
+def run_script(name, path, syn_engine):
+    os.environ["IDS_SYN_ENGINE"] = syn_engine     # read by tcp_syn.py on import
+    try:
+        script = importlib.import_module(name)
+    except ImportError as e:
+        print(json.dumps({"skipped": str(e)}))
+        return
+
+    handle = script.handle
+    stats = StatsReporter(name, interval=0)
+    alerts = Counter()
+
+    def emit(alert):
+        alerts[alert["attack"]] += 1
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    packets = 0
+
+    started = time.perf_counter()
+    with open(path) as f:
+        for line in f:
+            packets += 1
+            handle(line, stats, emit)
+    elapsed = time.perf_counter() - started
+
+    report(packets, elapsed, rss_before, dict(sorted(alerts.items())))
+
+
+def report(packets, elapsed, rss_before, alerts):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "packets": packets,
+        "seconds": round(elapsed, 4),
+        "pps": round(packets / elapsed) if elapsed > 0 else 0,
+        "peak_rss_mb": round(peak / 1024, 1),           # ru_maxrss is KiB on Linux
+        "rss_growth_mb": round((peak - rss_before) / 1024, 1),
+        "alerts": alerts,
+    }))
+
+
+def measure(backend, path, syn_engine):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run", backend, path, "--syn-engine", syn_engine],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# ================= BASELINE ================= #
+
+def compare(key, result, base, tolerance):
+    problems = []
+    if result["pps"] < base["pps"] * (1 - tolerance):
+        problems.append(f"throughput {result['pps']} < baseline {base['pps']} pkt/s")
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+        problems.append(f"peak RSS {result['peak_rss_mb']} > baseline {base['peak_rss_mb']} MB")
+    if result["alerts"] != base["alerts"]:
+        problems.append(f"alerts {result['alerts']} != baseline {base['alerts']}")
+    return [f"{key}: {p}" for p in problems]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic-traffic benchmark for the detectors")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--backends", default="tshark,pcap", help="tshark (text parsing) and/or pcap")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS),
+                        help=f"standalone scripts to drive, comma separated subset of: {', '.join(SCRIPTS)}")
+    parser.add_argument("--packets", type=int, default=DEFAULT_PACKETS, help="packets per scenario")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative throughput/RSS regression before flagging")
+    parser.add_argument("--syn-engine", choices=SYN_ENGINES, default="exact")
+    parser.add_argument("--keep", metavar="DIR", help="write the generated inputs here and keep them")
+    parser.add_argument("--run", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.run:
+        run_one(*args.run, args.syn_engine)
+        return
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    scripts = [s.strip() for s in args.scripts.split(",") if s.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario: {name}")
+    for script in scripts:
+        if script not in SCRIPTS:
+            raise SystemExit(f"Unknown script: {script}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}, nothing to compare with (record one with --save-baseline)")
+
+    directory = args.keep or tempfile.mkdtemp(prefix="ids-bench-")
+    os.makedirs(directory, exist_ok=True)
+
+    results = {}
+    problems = []
+    print(f"{'scenario':<16} {'backend':<9} {'pkt/s':>9} {'peak MB':>8} {'alerts'}")
+
+    try:
+        for name in scenarios:
+            inputs = write_inputs(name, args.packets, directory, scripts)
+            for backend in backends + scripts:
+                key = f"{name}/{backend}"
+                if args.syn_engine != "exact":
+                    key += f"/{args.syn_engine}"
+                result = measure(backend, inputs[backend], args.syn_engine)
+                if "skipped" in result:
+                    print(f"{name:<16} {backend:<9} skipped: {result['skipped']}")
+                    continue
+
+                results[key] = result
+                fired = ", ".join(f"{det}={count}" for det, count in result["alerts"].items() if count) or "-"
+                print(f"{name:<16} {backend:<9} {result['pps']:>9} {result['peak_rss_mb']:>8} {fired}")
+
+                base = baseline.get(key)
+                if base is not None and base.get("packets") == result["packets"]:
+                    problems += compare(key, result, base, args.tolerance)
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    elif problems:
+        print("\nREGRESSIONS:")
+        for problem in problems:
+            print(" ", problem)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
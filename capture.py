@@ -0,0 +1,297 @@
+import subprocess
+import time
+from collections import namedtuple
+
+from addresses import pack_ip, pack_mac
+from latency import stamp
+from metrics import REGISTRY
+from profiler import StageProfiler
+
+# ================= PACKET RECORD ================= #
+
+# One parsed packet, shared by every detector.
+# Addresses are packed to ints (addresses.py); empty tshark fields become
+# None (addresses) or 0 (numbers).
+Packet = namedtuple("Packet", [
+    "ts",           # frame.time_epoch (float)
+    "proto",        # "arp" / "icmp" / "tcp"
+    "src",          # ip.src or arp.src.proto_ipv4 (packed)
+    "dst",          # ip.dst (packed)
+    "sport",        # tcp.srcport
+    "dport",        # tcp.dstport
+    "flags",        # tcp.flags (int)
+    "icmp_type",    # icmp.type
+    "arp_op",       # arp.opcode
+    "mac",          # arp.src.hw_mac (packed)
+])
+
+# Union of the fields every detector needs, in output order
+FIELDS = [
+    "frame.time_epoch",
+    "ip.src",
+    "ip.dst",
+    "tcp.srcport",
+    "tcp.dstport",
+    "tcp.flags",
+    "icmp.type",
+    "arp.opcode",
+    "arp.src.proto_ipv4",
+    "arp.src.hw_mac",
+]
+
+
+def parse_line(line):
+    parts = line.rstrip("\n").split(",")
+    if len(parts) != len(FIELDS):
+        return None
+
+    ts, src, dst, sport, dport, flags, icmp_type, arp_op, arp_ip, mac = parts
+
+    try:
+        ts = float(ts)
+
+        if arp_op:
+            return Packet(ts, "arp", pack_ip(arp_ip), None, 0, 0, 0, -1, int(arp_op), pack_mac(mac))
+
+        if icmp_type:
+            return Packet(ts, "icmp", pack_ip(src), pack_ip(dst), 0, 0, 0, int(icmp_type), 0, None)
+
+        if flags:
+            return Packet(ts, "tcp", pack_ip(src), pack_ip(dst), int(sport), int(dport), int(flags, 16), -1, 0, None)
+    except (ValueError, OSError):
+        return None
+
+    return None
+
+
+# ================= CAPTURE ENGINE ================= #
+
+# Runs a single capture process and hands each parsed packet to the
+# detectors interested in its protocol.
+#
+# Backends:
+#   tshark - tshark text dissection over the union of all detector fields
+#   pcap   - raw pcapng from dumpcap, decoded natively by pcapstream
+#
+# With read_file set the engine replays a capture instead of sniffing.
+# Detectors run on packet time either way, so a replay raises the same
+# alerts as the live capture did; packets are processed as fast as
+# possible unless a speed multiplier asks for paced playback (speed=1.0 is
+# real time, 10.0 is ten times faster).
+#
+# Live captures also pass the union of the detectors' BPF capture filters
+# with -f, so the kernel drops irrelevant packets before they are copied to
+# user space; the display filter still applies on top of it.
+#
+# `profiler` samples time per stage: "read" (tshark pipe and parsing),
+# "detect" (window update and check) and "sink" (the caller's handling of
+# a yielded alert).
+#
+# Alerts are stamped with the triggering packet time and the detection
+# time (latency.py) before they are yielded.
+#
+# An optional heuristics.HeuristicStore retunes the detectors in place
+# whenever its version changes, between two packets.
+
+BACKENDS = ("tshark", "pcap")
+
+
+class CaptureEngine:
+
+    def __init__(self, detectors, interface="any", backend="tshark", read_file=None, speed=0,
+                 heuristics=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown capture backend: {backend}")
+
+        self.detectors = list(detectors)
+        self.interface = interface
+        self.backend = backend
+        self.read_file = read_file
+        self.speed = speed
+        self.heuristics = heuristics
+        self.heuristic_version = None
+        self.profiler = StageProfiler("engine", stages=("read", "parse", "detect", "sink"))
+
+        self.packet_count = 0
+        self.m_lines = REGISTRY.counter("ids_capture_lines_total", "Lines read from tshark", backend=backend)
+        self.m_parse_errors = REGISTRY.counter(
+            "ids_capture_parse_errors_total", "tshark lines that did not parse", backend=backend)
+
+        # proto -> detectors, so each packet only visits relevant ones
+        self.routes = {}
+        for det in self.detectors:
+            self.routes.setdefault(det.PROTO, []).append(det)
+
+        self.proc = None
+
+    # Applies the store's current values if they changed since last time
+    def apply_heuristics(self):
+        version = self.heuristics.version
+        if version == self.heuristic_version:
+            return False
+        self.heuristic_version = version
+        for det in self.detectors:
+            det.configure(**self.heuristics.get(det.NAME))
+        return True
+
+    def display_filter(self):
+        filters = sorted({det.DISPLAY_FILTER for det in self.detectors})
+        return " || ".join(f"({f})" for f in filters)
+
+    # One BPF program for every detector; "" if any detector needs everything
+    def capture_filter(self):
+        filters = sorted({det.CAPTURE_FILTER for det in self.detectors})
+        if not filters or "" in filters:
+            return ""
+        if len(filters) == 1:
+            return filters[0]
+        return " or ".join(f"({f})" for f in filters)
+
+    def command(self):
+        bpf = self.capture_filter()
+        bpf_args = ["-f", bpf] if bpf else []
+
+        if self.backend == "pcap":
+            # Replay files are read directly, dumpcap only sniffs
+            return [
+                "dumpcap",
+                "-q",
+                "-i", self.interface,
+                *bpf_args,
+                "-w", "-",
+            ]
+
+        # Capture filters only apply to live capture
+        if self.read_file:
+            source = ["-r", self.read_file]
+        else:
+            source = ["-i", self.interface, *bpf_args]
+
+        cmd = [
+            "tshark",
+            "-n",
+            "-l",
+            *source,
+            "-Y", self.display_filter(),
+            "-T", "fields",
+            "-E", "separator=,",
+            "-E", "occurrence=f",
+        ]
+        for field in FIELDS:
+            cmd += ["-e", field]
+        return cmd
+
+    # tshark output, one line per packet
+    def lines(self):
+        self.proc = subprocess.Popen(
+            self.command(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        return self.proc.stdout
+
+    # With `prof`, each packet's timer starts here: the wait for a line is
+    # "read" and parsing it "parse", lines that fail to parse included.
+    # The caller picks the timer up as prof.timer while prof.timed.
+    def packets(self, prof=None):
+        if self.backend == "pcap":
+            # Imported here: pcapstream itself depends on Packet
+            from pcapstream import read_packets, read_pcap
+
+            if self.read_file:
+                packets = read_pcap(self.read_file)
+            else:
+                self.proc = subprocess.Popen(
+                    self.command(),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL
+                )
+                packets = read_packets(self.proc.stdout)
+
+            # Decoding is done as the stream is read, so it counts as "read"
+            for pkt in packets:
+                if prof is not None and prof.enabled:
+                    prof.start()
+                yield pkt
+            return
+
+        lines = self.m_lines
+        parse_errors = self.m_parse_errors
+        for line in self.lines():
+            timer = prof.start() if prof is not None and prof.enabled else None
+            lines.inc()
+            pkt = parse_line(line)
+            if timer:
+                timer.lap("parse")
+            if pkt is None:
+                parse_errors.inc()
+                continue
+            yield pkt
+
+    # Sleeps so packets are released at `speed` times their recorded pace;
+    # the sleep is booked to "read"
+    def paced(self, packets, prof=None):
+        first_ts = None
+        start = 0.0
+
+        for pkt in packets:
+            if first_ts is None:
+                first_ts = pkt.ts
+                start = time.monotonic()
+            else:
+                delay = (pkt.ts - first_ts) / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                    if prof is not None and prof.timed:
+                        prof.timer.lap("read")
+            yield pkt
+
+    # Yields (detector, alert) for every alert raised
+    def run(self):
+        routes = self.routes
+        heuristics = self.heuristics
+        prof = self.profiler
+        live = self.read_file is None
+        if heuristics is not None:
+            self.apply_heuristics()
+
+        packets = self.packets(prof)
+        if self.read_file and self.speed > 0:
+            packets = self.paced(packets, prof)
+
+        for pkt in packets:
+            self.packet_count += 1
+            timer = prof.timer if prof.timed else None
+
+            if heuristics is not None and heuristics.version != self.heuristic_version:
+                self.apply_heuristics()
+
+            for det in routes.get(pkt.proto, ()):
+                if not det.accepts(pkt):
+                    continue
+
+                if det.stats is not None:
+                    det.stats.packet(pkt.src, pkt.ts if live else None)
+
+                alert = det.process(pkt)
+                if alert is not None:
+                    if timer:
+                        timer.lap("detect")
+                    stamp(alert, pkt.ts)
+                    if det.stats is not None:
+                        det.stats.alert()
+                    yield det, alert
+                    if timer:
+                        timer.lap("sink")
+
+            # Routing included, even when no detector took the packet
+            if timer:
+                timer.lap("detect")
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+            self.proc = None
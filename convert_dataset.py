@@ -0,0 +1,29 @@
+import argparse
+import time
+
+from datasets import columnar_path, convert_csv
+
+# Converts CSV datasets written by the *_experimental scripts into the
+# columnar layout (see datasets.py):
+#
+#   python convert_dataset.py port_scan.csv ssh_traffic_log.csv tcp_syn_dataset.csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CSV datasets to columnar format")
+    parser.add_argument("csv_files", nargs="+")
+    parser.add_argument("-o", "--output", help="output directory (single input only)")
+    args = parser.parse_args()
+
+    if args.output and len(args.csv_files) > 1:
+        raise SystemExit("--output only works with a single input file")
+
+    for csv_file in args.csv_files:
+        out = args.output or columnar_path(csv_file)
+        started = time.monotonic()
+        rows = convert_csv(csv_file, out)
+        print(f"{csv_file} -> {out}: {rows} rows in {time.monotonic() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
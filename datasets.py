@@ -0,0 +1,299 @@
+import csv
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime
+from socket import inet_aton
+
+# ================= BUFFERED DATASET WRITER ================= #
+
+# CSV writer for the *_experimental labelers that keeps the file open for
+# the whole capture instead of reopening it per packet.
+#
+# Rows go through a large userspace buffer and reach the disk when
+# `flush_rows` rows have accumulated, when `flush_interval` seconds have
+# passed, or on close(). Once the file grows past `max_bytes` it is rotated
+# to name.1.csv, name.2.csv, ... (up to `backups` files) and a fresh file
+# with the header is started.
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+
+class DatasetWriter:
+
+    def __init__(self, path, header, truncate=False, flush_rows=1000, flush_interval=1.0,
+                 max_bytes=DEFAULT_MAX_BYTES, backups=5):
+        self.path = path
+        self.header = header
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self.rows = 0              # rows written in total
+        self.pending = 0           # rows since the last flush
+        self.last_flush = time.monotonic()
+
+        self.open("w" if truncate else "a")
+
+    def open(self, mode):
+        self.file = open(self.path, mode, newline="", buffering=BUFFER_SIZE)
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(self.header)
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+        self.pending += 1
+
+        if self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotated_name(self, n):
+        base, ext = os.path.splitext(self.path)
+        return f"{base}.{n}{ext}"
+
+    def rotate(self):
+        self.file.close()
+
+        for n in range(self.backups - 1, 0, -1):
+            src = self.rotated_name(n)
+            if os.path.exists(src):
+                os.replace(src, self.rotated_name(n + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.rotated_name(1))
+        else:
+            os.remove(self.path)
+
+        self.open("w")
+
+    def close(self):
+        self.file.flush()
+        self.file.close()
+
+
+# ================= COLUMNAR DATASET FORMAT ================= #
+
+# Typed, column-per-file layout for training data:
+#
+#   port_scan.cols/
+#       schema.json        column names, array typecodes, byte order
+#       labels.json        label dictionary (index -> label string)
+#       timestamp.col      float64 epoch seconds
+#       src_ip.col         uint32 IPv4 addresses
+#       dst_port.col       uint16
+#       label.col          uint8 index into labels.json
+#       ...
+#
+# Each .col file is a flat native-endian array, so it appends with a single
+# write per chunk and loads with numpy.fromfile / numpy.memmap without any
+# parsing. Writing only needs the standard library.
+
+COLUMNAR_SUFFIX = ".cols"
+IPV4 = struct.Struct("!I")
+
+
+def parse_timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        # Older CSVs carry ISO wall-clock strings
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_ip(value):
+    try:
+        return IPV4.unpack(inet_aton(value))[0]
+    except (OSError, TypeError):
+        return 0      # empty or non-IPv4 (e.g. IPv6) addresses
+
+
+def parse_int(value):
+    return int(value) if value else 0
+
+
+def parse_hex(value):
+    return int(value, 16) if value else 0
+
+
+# column name -> (array typecode, parser); label is dictionary encoded
+COLUMN_TYPES = {
+    "timestamp": ("d", parse_timestamp),
+    "src_ip": ("I", parse_ip),
+    "dst_ip": ("I", parse_ip),
+    "ip_len": ("H", parse_int),
+    "ttl": ("B", parse_int),
+    "src_port": ("H", parse_int),
+    "dst_port": ("H", parse_int),
+    "tcp_seq": ("I", parse_int),
+    "tcp_flags": ("H", parse_hex),
+    "icmp_type": ("B", parse_int),
+    "icmp_code": ("B", parse_int),
+    "icmp_seq": ("H", parse_int),
+    "packet_count": ("I", parse_int),
+    "unique_port_count": ("I", parse_int),
+    "label": ("B", None),
+}
+
+# array typecode -> numpy dtype name, for loaders
+NUMPY_DTYPES = {"d": "float64", "I": "uint32", "H": "uint16", "B": "uint8"}
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+
+class ColumnarWriter:
+
+    def __init__(self, path, header, truncate=False, flush_rows=65536, flush_interval=5.0):
+        unknown = [name for name in header if name not in COLUMN_TYPES]
+        if unknown:
+            raise ValueError(f"No columnar type for columns: {', '.join(unknown)}")
+
+        self.path = path
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.rows = 0
+        self.skipped = 0
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+        os.makedirs(path, exist_ok=True)
+        schema_file = os.path.join(path, "schema.json")
+
+        if truncate or not os.path.exists(schema_file):
+            for name in self.header:
+                open(self.column_file(name), "wb").close()
+            self.labels = []
+        else:
+            with open(schema_file) as f:
+                if json.load(f)["columns"] != self.header:
+                    raise ValueError(f"{path} was written with different columns")
+            self.labels = load_labels(path)
+
+        with open(schema_file, "w") as f:
+            json.dump({
+                "columns": self.header,
+                "types": {name: COLUMN_TYPES[name][0] for name in self.header},
+                "byteorder": sys.byteorder,
+            }, f, indent=2)
+
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        self.columns = [array(COLUMN_TYPES[name][0]) for name in self.header]
+        self.parsers = [COLUMN_TYPES[name][1] or self.encode_label for name in self.header]
+
+    def column_file(self, name):
+        return os.path.join(self.path, name + ".col")
+
+    def encode_label(self, label):
+        index = self.label_index.get(label)
+        if index is None:
+            index = self.label_index[label] = len(self.labels)
+            self.labels.append(label)
+        return index
+
+    # Takes the same string row the CSV writer gets
+    def write_row(self, row):
+        try:
+            values = [parse(value) for parse, value in zip(self.parsers, row)]
+            for column, value in zip(self.columns, values):
+                column.append(value)
+        except (ValueError, OverflowError):
+            # Malformed field (e.g. repeated tshark occurrences); the row is
+            # skipped as a whole so columns stay aligned
+            for column in self.columns:
+                if len(column) > self.pending:
+                    del column[self.pending:]
+            self.skipped += 1
+            return
+
+        self.rows += 1
+        self.pending += 1
+
+        if self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        for name, column in zip(self.header, self.columns):
+            with open(self.column_file(name), "ab") as f:
+                column.tofile(f)
+            del column[:]
+
+        with open(os.path.join(self.path, "labels.json"), "w") as f:
+            json.dump(self.labels, f)
+
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+
+def load_labels(path):
+    labels_file = os.path.join(path, "labels.json")
+    if not os.path.exists(labels_file):
+        return []
+    with open(labels_file) as f:
+        return json.load(f)
+
+
+# Returns ({column: numpy array}, labels). numpy is only needed for loading.
+def load_columnar(path, columns=None, mmap=False):
+    import numpy as np
+
+    with open(os.path.join(path, "schema.json")) as f:
+        schema = json.load(f)
+
+    order = "<" if schema.get("byteorder", "little") == "little" else ">"
+    data = {}
+    for name in columns or schema["columns"]:
+        dtype = np.dtype(NUMPY_DTYPES[schema["types"][name]]).newbyteorder(order)
+        col_file = os.path.join(path, name + ".col")
+        if mmap:
+            data[name] = np.memmap(col_file, dtype=dtype, mode="r")
+        else:
+            data[name] = np.fromfile(col_file, dtype=dtype)
+
+    return data, load_labels(path)
+
+
+# Writer for `csv_path` in the requested format ("csv" or "columnar")
+def open_dataset(csv_path, header, format="csv", **kwargs):
+    if format == "csv":
+        return DatasetWriter(csv_path, header, **kwargs)
+    if format == "columnar":
+        kwargs.pop("max_bytes", None)
+        kwargs.pop("backups", None)
+        return ColumnarWriter(columnar_path(csv_path), header, **kwargs)
+    raise ValueError(f"Unknown dataset format: {format}")
+
+
+# Converts an existing CSV dataset to the columnar layout
+def convert_csv(csv_path, out_path=None):
+    out_path = out_path or columnar_path(csv_path)
+
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        writer = ColumnarWriter(out_path, header, truncate=True)
+        for row in reader:
+            if len(row) == len(header):
+                writer.write_row(row)
+        writer.close()
+
+    return writer.rows
@@ -0,0 +1,611 @@
+from math import sqrt
+
+from addresses import ip_text
+from heuristics import resize_table
+from hoststate import DEFAULT_MAX_HOSTS, BindingTable, HostTable
+from sketches import DEFAULT_DEPTH, DEFAULT_WIDTH, CountMinWindow, HeavyHitters, SweepWindow, VictimWindow
+from windows import DistinctWindow, RateWindow
+
+# In-process versions of arp.py, icmp.py, ssh.py, tcp_syn.py and port_scan.py.
+# Each detector consumes capture.Packet records and returns an alert dict
+# (same shape the standalone scripts store in MongoDB) or None.
+#
+# Windows, cooldowns and alert timestamps all run on packet time
+# (frame.time_epoch floats), so live capture and replay behave the same and
+# a stalled tshark pipe cannot end a cooldown early. The sinks turn
+# "timestamp" into a datetime.
+
+
+class Detector:
+    NAME = ""
+    PROTO = ""              # capture.Packet.proto this detector reads
+    DISPLAY_FILTER = ""     # tshark -Y equivalent of the standalone script
+    CAPTURE_FILTER = ""     # BPF (-f) superset of DISPLAY_FILTER, "" = everything
+    HEURISTICS = ()         # tunable attributes, see heuristics.py
+
+    # Optional reporter.StatsReporter fed by the capture engine
+    stats = None
+
+    def accepts(self, pkt):
+        return True
+
+    # Current tunable values, used as the heuristics defaults
+    def heuristics(self):
+        return {key: getattr(self, key) for key in self.HEURISTICS}
+
+    # Applies new heuristics in place; window and cooldown state is kept
+    def configure(self, **params):
+        for key, value in params.items():
+            if key in self.HEURISTICS:
+                setattr(self, key, value)
+
+    def process(self, pkt):
+        raise NotImplementedError
+
+    # Sharded runs (sharding.py) keep per-source state in the shard of
+    # pkt.src and per-destination state in the shard of pkt.dst. Detectors
+    # with per-destination state override both halves; process() is the
+    # two on one packet. Others only have a source half.
+    process_victim = None
+
+    def process_source(self, pkt):
+        return self.process(pkt)
+
+    # name -> HostTable, for eviction counters
+    def tables(self):
+        return {}
+
+    def table_stats(self):
+        return {name: table.stats() for name, table in self.tables().items()}
+
+    def host_count(self):
+        return max((len(table) for table in self.tables().values()), default=0)
+
+    def cooled_down(self, last_alert, key, now, cooldown):
+        last_time = last_alert.get(key)
+        return last_time is None or now - last_time >= cooldown
+
+
+# ================= ARP SPOOFING ================= #
+
+class ArpSpoofDetector(Detector):
+    NAME = "arp"
+    PROTO = "arp"
+    DISPLAY_FILTER = "arp.opcode == 2"
+    CAPTURE_FILTER = "arp[6:2] = 2"
+    HEURISTICS = ("time_window", "mac_threshold", "cooldown")
+
+    def __init__(self, time_window=30, mac_threshold=2, cooldown=30, max_hosts=DEFAULT_MAX_HOSTS):
+        self.time_window = time_window
+        self.mac_threshold = mac_threshold
+        self.cooldown = cooldown
+
+        # ip -> {mac: last seen}, bindings expire on the timer wheel
+        self.ip_mac_map = BindingTable(time_window, max_hosts)
+        self.last_alert = HostTable(cooldown, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.arp_op == 2
+
+    def tables(self):
+        return {"ip_mac_map": self.ip_mac_map, "last_alert": self.last_alert}
+
+    def configure(self, **params):
+        super().configure(**params)
+        self.ip_mac_map.resize(self.time_window)
+        self.last_alert.idle_ttl = self.cooldown
+
+    def process(self, pkt):
+        ip, timestamp = pkt.src, pkt.ts
+        self.ip_mac_map.tick(timestamp)
+        self.last_alert.tick(timestamp)
+
+        # Quick count (may hold a binding that expired within the last
+        # wheel bucket), confirmed before alerting
+        macs = self.ip_mac_map.bind(ip, pkt.mac, timestamp)
+        if len(macs) < self.mac_threshold:
+            return None
+        if self.ip_mac_map.live(ip, timestamp) < self.mac_threshold:
+            return None
+
+        now = pkt.ts
+        if not self.cooled_down(self.last_alert, ip, now, self.cooldown):
+            return None
+
+        self.last_alert[ip] = now
+        return {
+            "type": "alert",
+            "attack": "ARP Spoofing",
+            "ip": ip_text(ip),
+            "timestamp": now,
+            "message": f"ARP spoofing suspected: {ip_text(ip)} mapped to multiple MAC addresses",
+            "tips": "Verify network devices and consider using static ARP entries.",
+            "status": "unresolved"
+        }
+
+
+# ================= VICTIM TRACKING ================= #
+
+# Packets toward each destination in a sliding window, with a
+# distinct-source estimate (sketches.VictimWindow), so a botnet whose
+# members each stay under the per-source threshold still raises a victim
+# alert once a destination receives `threshold` packets from at least
+# `min_sources` sources. The estimate is only read once the count is
+# reached and is cached between register changes.
+#
+# Shared by the rate detectors below and the standalone icmp, ssh and
+# tcp_syn scripts (Live versions included), which key it by address text
+# instead of packed ints. `head` holds the alert's leading fields, e.g.
+# {"type": "alert", "attack": ...} or {"attack_type": ...} for the
+# dashboard.
+
+class VictimTracker:
+
+    def __init__(self, head, threshold, min_sources, time_window, cooldown, max_hosts=DEFAULT_MAX_HOSTS):
+        self.head = head
+        self.threshold = threshold
+        self.min_sources = min_sources
+        self.time_window = time_window
+        self.cooldown = cooldown
+
+        self.victims = HostTable(time_window, max_hosts, factory=lambda: VictimWindow(self.time_window))
+        self.last_alert = HostTable(cooldown, max_hosts)
+
+    def configure(self, threshold, min_sources, time_window, cooldown):
+        self.threshold = threshold
+        self.min_sources = min_sources
+        self.time_window = time_window
+        self.cooldown = cooldown
+        resize_table(self.victims, time_window)
+        self.last_alert.idle_ttl = cooldown
+
+    # Expire idle destinations (bounded work per packet)
+    def tick(self, now):
+        self.victims.tick(now)
+        self.last_alert.tick(now)
+
+    # Counts a packet from `src` toward `victim`; returns the in-window count
+    def add(self, victim, src, now):
+        return self.victims[victim].add(now, src)
+
+    # Alert for a victim whose count reached `threshold`, or None while it
+    # cools down or has too few sources
+    def check(self, victim, count, now):
+        last_time = self.last_alert.get(victim)
+        if last_time is not None and now - last_time < self.cooldown:
+            return None
+        sources = self.victims[victim].source_count(now)
+        if sources < self.min_sources:
+            return None
+
+        self.last_alert[victim] = now
+        alert = dict(self.head)
+        alert.update({
+            "ip": ip_text(victim),
+            "packet_count": count,
+            "source_count": sources,
+            "time_window": self.time_window,
+            "timestamp": now,
+            "message": f"{count} packets from about {sources} sources toward {ip_text(victim)} "
+            f"in {self.time_window}s (possible distributed attack)",
+            "status": "unresolved"
+        })
+        return alert
+
+
+# ================= RATE DETECTORS ================= #
+
+# Shared logic of icmp.py, ssh.py and tcp_syn.py: count packets per source
+# in a sliding window and alert once the count reaches the threshold.
+# The same packets are also counted per destination (VictimTracker).
+
+class RateDetector(Detector):
+    HEURISTICS = ("threshold", "time_window", "cooldown", "victim_threshold", "victim_sources")
+    VICTIM_ATTACK = ""
+
+    def __init__(self, threshold, time_window, cooldown, victim_threshold, victim_sources,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        self.threshold = threshold
+        self.time_window = time_window
+        self.cooldown = cooldown
+        self.victim_threshold = victim_threshold
+        self.victim_sources = victim_sources
+
+        self.ip_packets = HostTable(time_window, max_hosts, factory=lambda: RateWindow(self.time_window))
+        self.last_alert = HostTable(cooldown, max_hosts)
+        self.victims = VictimTracker({"type": "alert", "attack": self.VICTIM_ATTACK}, victim_threshold,
+                                     victim_sources, time_window, cooldown, max_hosts)
+
+    def tables(self):
+        return {"ip_packets": self.ip_packets, "last_alert": self.last_alert,
+                "victims": self.victims.victims, "last_victim_alert": self.victims.last_alert}
+
+    def configure(self, **params):
+        super().configure(**params)
+        resize_table(self.ip_packets, self.time_window)
+        self.last_alert.idle_ttl = self.cooldown
+        self.victims.configure(self.victim_threshold, self.victim_sources, self.time_window, self.cooldown)
+
+    # Destination the packet is aimed at, None if it has no victim
+    def victim_of(self, pkt):
+        return pkt.dst
+
+    def process(self, pkt):
+        alert = self.process_source(pkt)
+        victim, victim_count = self.count_victim(pkt)
+        if alert is None and victim_count >= self.victim_threshold:
+            return self.victims.check(victim, victim_count, pkt.ts)
+        return alert
+
+    def process_source(self, pkt):
+        ip, now = pkt.src, pkt.ts
+        self.ip_packets.tick(now)
+        self.last_alert.tick(now)
+
+        count = self.ip_packets[ip].add(now)
+        if count >= self.threshold and self.cooled_down(self.last_alert, ip, now, self.cooldown):
+            self.last_alert[ip] = now
+            return self.make_alert(ip, count, now)
+        return None
+
+    def process_victim(self, pkt):
+        victim, victim_count = self.count_victim(pkt)
+        if victim_count >= self.victim_threshold:
+            return self.victims.check(victim, victim_count, pkt.ts)
+        return None
+
+    # Count the packet toward its destination: (victim, in-window packets)
+    def count_victim(self, pkt):
+        self.victims.tick(pkt.ts)
+        victim = self.victim_of(pkt)
+        if victim is None:
+            return None, 0
+        return victim, self.victims.add(victim, pkt.src, pkt.ts)
+
+    def make_alert(self, ip, count, now):
+        raise NotImplementedError
+
+
+class IcmpFloodDetector(RateDetector):
+    NAME = "icmp"
+    PROTO = "icmp"
+    DISPLAY_FILTER = "icmp.type == 8"
+    CAPTURE_FILTER = "icmp[icmptype] = icmp-echo"
+    VICTIM_ATTACK = "Distributed ICMP Ping Flood"
+
+    def __init__(self, threshold=100, time_window=5, cooldown=60, victim_threshold=1000, victim_sources=20,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        super().__init__(threshold, time_window, cooldown, victim_threshold, victim_sources, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.icmp_type == 8
+
+    def make_alert(self, ip, count, now):
+        return {
+            "type": "alert",
+            "attack": "ICMP Ping Flood",
+            "ip": ip_text(ip),
+            "packet_count": count,
+            "time_window": self.time_window,
+            "timestamp": now,
+            "message": f"High-rate ICMP echo requests detected from {ip_text(ip)}",
+            "tips": "Check firewall rules and consider rate limiting ICMP.",
+            "status": "unresolved"
+        }
+
+
+class SshBruteForceDetector(RateDetector):
+    NAME = "ssh"
+    PROTO = "tcp"
+    DISPLAY_FILTER = "tcp.port == 22"
+    CAPTURE_FILTER = "tcp port 22"
+    VICTIM_ATTACK = "Distributed SSH Brute Force"
+
+    def __init__(self, threshold=20, time_window=10, cooldown=60, victim_threshold=200, victim_sources=10,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        super().__init__(threshold, time_window, cooldown, victim_threshold, victim_sources, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.sport == 22 or pkt.dport == 22
+
+    # Server replies are aimed at the client, not at a victim
+    def victim_of(self, pkt):
+        return pkt.dst if pkt.dport == 22 else None
+
+    def make_alert(self, ip, count, now):
+        return {
+            "type": "alert",
+            "attack": "SSH Brute Force",
+            "ip": ip_text(ip),
+            "timestamp": now,
+            "message": f"High-rate SSH authentication traffic detected from {ip_text(ip)}",
+            "tips": "Inspect /var/log/auth.log and block the IP if malicious.",
+            "status": "unresolved"
+        }
+
+
+# SYN set, ACK clear
+SYN_ONLY_MASK = 0x12
+SYN_ONLY = 0x02
+
+
+class SynFloodDetector(RateDetector):
+    NAME = "syn"
+    PROTO = "tcp"
+    DISPLAY_FILTER = "tcp.flags.syn == 1 && tcp.flags.ack == 0"
+    CAPTURE_FILTER = "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn"
+    VICTIM_ATTACK = "Distributed TCP SYN Flood"
+
+    def __init__(self, threshold=500, time_window=10, cooldown=60, victim_threshold=5000, victim_sources=50,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        super().__init__(threshold, time_window, cooldown, victim_threshold, victim_sources, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.flags & SYN_ONLY_MASK == SYN_ONLY
+
+    def make_alert(self, ip, count, now):
+        return {
+            "type": "alert",
+            "attack": "TCP SYN Flood",
+            "ip": ip_text(ip),
+            "timestamp": now,
+            "message": "High rate of TCP SYN packets detected "
+            "(possible SYN flood attack)",
+            "status": "unresolved"
+        }
+
+
+# ================= SKETCH SYN FLOOD ================= #
+
+# Alternative SYN flood engine for floods from randomized source addresses,
+# which would otherwise create one window per spoofed source and never
+# reach the threshold for any of them.
+#
+# Per-source, per-destination and per-(source, destination) counts live in
+# windowed Count-Min Sketches (sketches.py), so memory is fixed however
+# many sources there are; only sources and destinations that actually
+# alerted are kept, for their cooldowns. A source alert fires like
+# SynFloodDetector's (the estimate never undercounts), and an aggregate
+# alert fires when the SYN rate toward one destination reaches
+# `dst_threshold`, naming the heaviest sources toward that destination.
+
+class SynSketchDetector(Detector):
+    NAME = "syn"
+    PROTO = "tcp"
+    DISPLAY_FILTER = SynFloodDetector.DISPLAY_FILTER
+    CAPTURE_FILTER = SynFloodDetector.CAPTURE_FILTER
+    HEURISTICS = ("threshold", "dst_threshold", "time_window", "cooldown")
+
+    def __init__(self, threshold=500, dst_threshold=5000, time_window=10, cooldown=60,
+                 width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, top_k=32, max_hosts=DEFAULT_MAX_HOSTS):
+        self.threshold = threshold
+        self.dst_threshold = dst_threshold
+        self.time_window = time_window
+        self.cooldown = cooldown
+
+        self.src_counts = CountMinWindow(time_window, width, depth)
+        self.dst_counts = CountMinWindow(time_window, width, depth)
+        self.pair_counts = CountMinWindow(time_window, width, depth)
+        self.top_pairs = HeavyHitters(self.pair_counts, top_k)
+        self.last_alert = HostTable(cooldown, max_hosts)
+        self.last_dst_alert = HostTable(cooldown, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.flags & SYN_ONLY_MASK == SYN_ONLY
+
+    def tables(self):
+        return {"last_alert": self.last_alert, "last_dst_alert": self.last_dst_alert}
+
+    def configure(self, **params):
+        super().configure(**params)
+        if self.time_window != self.src_counts.time_window:
+            self.src_counts.resize(self.time_window)
+            self.dst_counts.resize(self.time_window)
+            self.pair_counts.resize(self.time_window)
+        self.last_alert.idle_ttl = self.cooldown
+        self.last_dst_alert.idle_ttl = self.cooldown
+
+    def process(self, pkt):
+        alert = self.process_source(pkt)
+        dst_count = self.count_victim(pkt)
+        if alert is None:
+            return self.check_victim(pkt, dst_count)
+        return alert
+
+    def process_source(self, pkt):
+        ip, now = pkt.src, pkt.ts
+        self.last_alert.tick(now)
+
+        count = self.src_counts.add(ip, now)
+        if count >= self.threshold and self.cooled_down(self.last_alert, ip, now, self.cooldown):
+            self.last_alert[ip] = now
+            return {
+                "type": "alert",
+                "attack": "TCP SYN Flood",
+                "ip": ip_text(ip),
+                "packet_count": count,
+                "estimated": True,
+                "timestamp": now,
+                "message": "High rate of TCP SYN packets detected "
+                "(possible SYN flood attack)",
+                "status": "unresolved"
+            }
+        return None
+
+    def process_victim(self, pkt):
+        return self.check_victim(pkt, self.count_victim(pkt))
+
+    # Count the packet toward its destination; returns the estimate
+    def count_victim(self, pkt):
+        now = pkt.ts
+        self.last_dst_alert.tick(now)
+        pair = (pkt.src, pkt.dst)
+        self.top_pairs.offer(pair, self.pair_counts.add(pair, now))
+        return self.dst_counts.add(pkt.dst, now)
+
+    def check_victim(self, pkt, dst_count):
+        now = pkt.ts
+        if dst_count >= self.dst_threshold and self.cooled_down(self.last_dst_alert, pkt.dst, now, self.cooldown):
+            self.last_dst_alert[pkt.dst] = now
+            return {
+                "type": "alert",
+                "attack": "Distributed TCP SYN Flood",
+                "ip": ip_text(pkt.dst),
+                "packet_count": dst_count,
+                "time_window": self.time_window,
+                "top_sources": [{"ip": ip_text(src), "count": n} for src, n in self.top_pairs.top_sources(pkt.dst, 5)],
+                "timestamp": now,
+                "message": f"SYN rate toward {ip_text(pkt.dst)} spiked (possible distributed SYN flood "
+                "from spoofed or many sources)",
+                "status": "unresolved"
+            }
+
+        return None
+
+
+# ================= PORT SCAN ================= #
+
+class PortScanDetector(Detector):
+    NAME = "portscan"
+    PROTO = "tcp"
+    DISPLAY_FILTER = "tcp.flags.syn == 1 && tcp.flags.ack == 0"
+    CAPTURE_FILTER = "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn"
+    HEURISTICS = ("port_threshold", "host_threshold", "block_threshold", "time_window", "cooldown")
+
+    # Three shapes of scan from one source, all over the same window:
+    #
+    #   vertical    many ports, any hosts         port_threshold distinct ports
+    #   horizontal  one port across many hosts    host_threshold distinct hosts on a port
+    #   block       several ports on several hosts
+    #
+    # The block score is the geometric mean of the two ratios,
+    # sqrt(ports / port_threshold * hosts / host_threshold), so it only
+    # grows when both dimensions do. Host counts live in a SweepWindow per
+    # source: a source that sweeps a /16 costs one register array per
+    # tracked port, not one entry per host.
+
+    def __init__(self, port_threshold=15, host_threshold=50, block_threshold=0.5, time_window=10, cooldown=60,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        self.port_threshold = port_threshold
+        self.host_threshold = host_threshold
+        self.block_threshold = block_threshold
+        self.time_window = time_window
+        self.cooldown = cooldown
+
+        # ip -> distinct dst_port window
+        self.ip_ports = HostTable(time_window, max_hosts, factory=lambda: DistinctWindow(self.time_window))
+        # ip -> distinct dst windows, overall and per recent dst_port
+        self.ip_sweeps = HostTable(time_window, max_hosts, factory=lambda: SweepWindow(self.time_window))
+        # ip (vertical), (ip, dst_port) (horizontal) or (ip, "block") -> last alert
+        self.last_alert = HostTable(cooldown, max_hosts)
+
+    def accepts(self, pkt):
+        return pkt.flags & SYN_ONLY_MASK == SYN_ONLY
+
+    def tables(self):
+        return {"ip_ports": self.ip_ports, "ip_sweeps": self.ip_sweeps, "last_alert": self.last_alert}
+
+    def configure(self, **params):
+        super().configure(**params)
+        resize_table(self.ip_ports, self.time_window)
+        resize_table(self.ip_sweeps, self.time_window)
+        self.last_alert.idle_ttl = self.cooldown
+
+    def process(self, pkt):
+        ip, dst, port, now = pkt.src, pkt.dst, pkt.dport, pkt.ts
+        self.ip_ports.tick(now)
+        self.ip_sweeps.tick(now)
+        self.last_alert.tick(now)
+
+        # Sliding window unique port count, and quick host counts (upper
+        # bounds while sparse, confirmed before alerting)
+        count = self.ip_ports[ip].add(now, port)
+        hosts, port_hosts = self.ip_sweeps[ip].add(now, dst, port)
+
+        if count >= self.port_threshold:
+            if self.cooled_down(self.last_alert, ip, now, self.cooldown):
+                self.last_alert[ip] = now
+                return {
+                    "type": "alert",
+                    "attack": "Port Scan",
+                    "ip": ip_text(ip),
+                    "timestamp": now,
+                    "message": "Multiple ports probed in a short time (possible reconnaissance activity)",
+                    "status": "unresolved"
+                }
+
+        if port_hosts >= self.host_threshold:
+            alert = self.check_horizontal(ip, port, now)
+            if alert is not None:
+                return alert
+
+        # Block: below the vertical threshold (that alert covers wider scans)
+        if 2 <= count < self.port_threshold and hosts >= 2 and \
+                count * hosts >= self.block_threshold ** 2 * self.port_threshold * self.host_threshold:
+            return self.check_block(ip, count, now)
+        return None
+
+    def check_horizontal(self, ip, port, now):
+        key = (ip, port)
+        if not self.cooled_down(self.last_alert, key, now, self.cooldown):
+            return None
+        hosts = self.ip_sweeps[ip].port_host_count(port, now)
+        if hosts < self.host_threshold:
+            return None
+
+        self.last_alert[key] = now
+        return {
+            "type": "alert",
+            "attack": "Horizontal Port Scan",
+            "ip": ip_text(ip),
+            "port": port,
+            "host_count": hosts,
+            "time_window": self.time_window,
+            "timestamp": now,
+            "message": f"Port {port} probed on about {hosts} hosts in {self.time_window}s "
+            f"(possible network sweep)",
+            "status": "unresolved"
+        }
+
+    def check_block(self, ip, ports, now):
+        key = (ip, "block")
+        if not self.cooled_down(self.last_alert, key, now, self.cooldown):
+            return None
+        hosts = self.ip_sweeps[ip].host_count(now)
+        score = sqrt(ports / self.port_threshold * hosts / self.host_threshold)
+        if hosts < 2 or score < self.block_threshold:
+            return None
+
+        self.last_alert[key] = now
+        return {
+            "type": "alert",
+            "attack": "Block Port Scan",
+            "ip": ip_text(ip),
+            "port_count": ports,
+            "host_count": hosts,
+            "score": round(score, 2),
+            "time_window": self.time_window,
+            "timestamp": now,
+            "message": f"{ports} ports probed across about {hosts} hosts in {self.time_window}s "
+            f"(possible block scan)",
+            "status": "unresolved"
+        }
+
+
+# name -> detector class, used by the launcher to enable a subset
+DETECTORS = {
+    cls.NAME: cls
+    for cls in (
+        ArpSpoofDetector,
+        IcmpFloodDetector,
+        SshBruteForceDetector,
+        SynFloodDetector,
+        PortScanDetector,
+    )
+}
+
+# SYN flood engines selectable for the "syn" detector
+SYN_ENGINES = {
+    "exact": SynFloodDetector,
+    "sketch": SynSketchDetector,
+}
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import socketio
+
+from latency import LatencyTracker
+from metrics import register_sink_metrics
+
+# ================= NON-BLOCKING LIVE ALERT EMITTER ================= #
+
+# Sends alerts to the dashboard backend over Socket.IO from a background
+# thread, so a slow or unreachable backend never stalls the packet loop.
+#
+# - emit() only appends to a bounded ring; when the ring is full the oldest
+#   pending alert is dropped and counted.
+# - Alerts arriving within `coalesce_interval` of each other (up to
+#   `batch_size`) are sent together in one pass of the sender thread, still
+#   one `event` per alert, which is what the dashboard backend handles.
+#   Setting `batch_event` sends such a group as one event carrying a list
+#   instead, for a consumer that handles it.
+# - While the backend is down, alerts stay in the ring and are replayed in
+#   order once the connection comes back. Startup no longer fails when the
+#   backend is unreachable; the emitter keeps retrying.
+# - Alert latency (latency.py) is recorded once emit() has handed an alert
+#   to the transport; pass track_latency=False for replays.
+
+class LiveEmitter:
+
+    def __init__(self, url, event="live_alert", batch_event=None,
+                 batch_size=50, coalesce_interval=0.2, max_pending=5000, retry_interval=5.0,
+                 track_latency=True):
+        self.url = url
+        self.event = event
+        self.batch_event = batch_event
+        self.batch_size = batch_size
+        self.coalesce_interval = coalesce_interval
+        self.retry_interval = retry_interval
+
+        self.pending = deque(maxlen=max_pending)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+        self.ever_connected = False
+
+        # Counters
+        self.emitted = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+
+        register_sink_metrics(self, "socketio", "emitted", lambda: len(self.pending))
+        self.latency = LatencyTracker("socketio", enabled=track_latency)
+
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.on("connect", self.on_connect)
+        self.sio.on("disconnect", self.on_disconnect)
+
+        self.thread = threading.Thread(target=self.run, name="live-emitter", daemon=True)
+        self.thread.start()
+
+    def on_connect(self):
+        self.ever_connected = True
+        print("Connected to backend Socket.IO server")
+        self.wakeup.set()    # replay anything buffered while down
+
+    def on_disconnect(self):
+        print("Disconnected from backend Socket.IO server")
+
+    # Called from the packet loop
+    def emit(self, alert):
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(alert)
+        self.wakeup.set()
+
+    def connect(self):
+        try:
+            self.sio.connect(self.url)
+            return True
+        except Exception as e:
+            print("Unable to connect to backend:", e)
+            return False
+
+    def run(self):
+        next_attempt = 0.0
+
+        while not self.stopping.is_set():
+            self.wakeup.wait(1.0)
+            self.wakeup.clear()
+
+            if not self.sio.connected:
+                # socketio reconnects by itself after the first success;
+                # until then (backend down at startup) retry here, and
+                # never after, so the two do not race
+                if not self.ever_connected and time.monotonic() >= next_attempt and not self.connect():
+                    next_attempt = time.monotonic() + self.retry_interval
+                continue
+
+            # Let a burst accumulate before sending it as one event
+            if len(self.pending) < self.batch_size:
+                self.stopping.wait(self.coalesce_interval)
+
+            self.drain()
+
+        if self.sio.connected:
+            self.drain()
+
+    def drain(self):
+        while self.pending and self.sio.connected:
+            with self.lock:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+
+            sent = self.send(batch)
+            if sent < len(batch):
+                unsent = batch[sent:]
+                self.failed += len(unsent)
+                # Put the unsent ones back in front so ordering survives a reconnect
+                with self.lock:
+                    for alert in reversed(unsent):
+                        if len(self.pending) == self.pending.maxlen:
+                            self.dropped += 1
+                            continue
+                        self.pending.appendleft(alert)
+                return
+
+    # Returns how many alerts of `batch` went out, in order
+    def send(self, batch):
+        payload = [serialize(alert) for alert in batch]
+        sent = 0
+        try:
+            if len(payload) == 1 or self.batch_event is None:
+                for alert in payload:
+                    self.sio.emit(self.event, alert)
+                    sent += 1
+            else:
+                self.sio.emit(self.batch_event, payload)
+                self.batches += 1
+                sent = len(batch)
+        except Exception as e:
+            print("Live alert emit failed:", e)
+
+        if sent:
+            self.latency.record(batch[:sent])
+            self.emitted += sent
+        return sent
+
+    def close(self, timeout=5.0):
+        self.stopping.set()
+        self.wakeup.set()
+        self.thread.join(timeout)
+        if self.sio.connected:
+            self.sio.disconnect()
+        self.latency.report()
+
+    def stats(self):
+        return {
+            "connected": self.sio.connected,
+            "pending": len(self.pending),
+            "emitted": self.emitted,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+# Socket.IO payloads must be JSON: the float packet-time "timestamp" and any
+# datetimes go out as ISO strings
+def serialize(alert):
+    alert = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in alert.items()}
+    timestamp = alert.get("timestamp")
+    if isinstance(timestamp, float):
+        alert["timestamp"] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+    return alert
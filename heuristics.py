@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+
+# ================= HOT-RELOADABLE HEURISTICS ================= #
+
+# Shared config layer for detector thresholds.
+#
+# Values live in the Mongo `heuristics` collection, one document per
+# detector with _id "<name>_heuristic" (e.g. "icmp_heuristic"). The store
+# keeps the last good values in memory and in a local JSON cache file, so
+# a sensor starts with the last known thresholds even when Mongo is down,
+# and a sensor without Mongo can be tuned by editing the file.
+#
+# Sensors with different built-in defaults share the file (icmpLive.py
+# cools down for 10 s, ids.py for 60 s), so only values that came from the
+# collection are cached; "_mongo" lists the entries written that way. Each
+# sensor also records its defaults under "_defaults", and values in other
+# entries that equal another sensor's default are ignored: older versions
+# cached every sensor's defaults as if they were configured.
+#
+# A background thread follows a change stream where the server supports
+# one and polls every `refresh_interval` seconds otherwise. Each change
+# bumps `version`; packet loops compare it with the version they applied
+# and retune their detectors in place, so tshark keeps running and window
+# state is kept.
+
+HEURISTICS_FILE = os.getenv("IDS_HEURISTICS_FILE", "heuristics.json")
+DEFAULT_REFRESH_INTERVAL = 30.0
+MONGO_KEY = "_mongo"
+DEFAULTS_KEY = "_defaults"
+
+
+def doc_id(name):
+    return f"{name}_heuristic"
+
+
+# Casts a configured value to the type of its default; numbers must be > 0
+def coerce(value, default):
+    if isinstance(default, str):
+        return str(value)
+
+    value = float(value)
+    if value <= 0:
+        raise ValueError(f"must be positive, got {value}")
+    if isinstance(default, int) and value.is_integer():
+        return int(value)
+    return value
+
+
+class HeuristicStore:
+
+    def __init__(self, collection=None, defaults=None, path=HEURISTICS_FILE,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL, watch=True):
+        self.collection = collection
+        self.defaults = {name: dict(values) for name, values in (defaults or {}).items()}
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.use_watch = watch and collection is not None
+
+        self.configs = {name: dict(values) for name, values in self.defaults.items()}
+        self.fetched = None       # {name: values} from the collection, once reachable
+        self.cached = None        # what was last written to the file
+        self.version = 0
+        self.file_mtime = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+        # Cached values first, so a failed fetch still starts from them
+        self.load_file()
+        self.refresh()
+        if self.cached is None:
+            self.save_file()      # records our defaults for the other sensors
+
+        self.thread = threading.Thread(target=self.run, name="heuristics", daemon=True)
+        self.thread.start()
+
+    # Current values for one detector (a copy; safe to keep)
+    def get(self, name):
+        return dict(self.configs.get(name, {}))
+
+    # Merges `docs` ({name: raw values}) and bumps the version on change
+    def update(self, docs, source):
+        changed = []
+        with self.lock:
+            for name, raw in docs.items():
+                defaults = self.defaults.get(name)
+                if defaults is None or not raw:
+                    continue
+
+                values = dict(self.configs[name])
+                for key, default in defaults.items():
+                    if key not in raw:
+                        continue
+                    try:
+                        values[key] = coerce(raw[key], default)
+                    except (TypeError, ValueError) as e:
+                        print(f"[!] Ignoring heuristic {name}.{key}={raw[key]!r}: {e}")
+
+                if values != self.configs[name]:
+                    self.configs[name] = values
+                    changed.append(name)
+
+            if changed:
+                self.version += 1
+
+        for name in changed:
+            print(f"[*] Heuristic {name} from {source}: {self.configs[name]}")
+        return bool(changed)
+
+    def fetch(self):
+        ids = {doc_id(name): name for name in self.defaults}
+        docs = {}
+        for doc in self.collection.find({"_id": {"$in": list(ids)}}):
+            docs[ids[doc["_id"]]] = doc
+        return docs
+
+    # Mongo when reachable (and cache the result), otherwise the file
+    def refresh(self):
+        if self.collection is not None:
+            try:
+                docs = self.fetch()
+            except Exception as e:
+                print("Heuristics fetch failed, using cached values:", e)
+            else:
+                self.update(docs, "mongo")
+                self.fetched = {
+                    name: {key: self.configs[name][key] for key in self.defaults[name] if key in raw}
+                    for name, raw in docs.items()
+                }
+                if self.fetched != self.cached:
+                    self.save_file()
+                return
+
+        self.load_file()
+
+    def load_file(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.file_mtime:
+            return
+        self.file_mtime = mtime
+
+        try:
+            with open(self.path) as f:
+                docs = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Unreadable heuristics file {self.path}:", e)
+            return
+        if isinstance(docs, dict):
+            self.update(configured(docs, self.defaults), self.path)
+
+    # Other sensors share the file, so only our own entries are replaced:
+    # the values fetched from the collection, and our defaults
+    def save_file(self):
+        try:
+            with open(self.path) as f:
+                docs = json.load(f)
+        except (OSError, ValueError):
+            docs = {}
+        if not isinstance(docs, dict):
+            docs = {}
+
+        known = docs.setdefault(DEFAULTS_KEY, {})
+        for name, values in self.defaults.items():
+            seen = known.setdefault(name, {})
+            for key, value in values.items():
+                if value not in seen.setdefault(key, []):
+                    seen[key].append(value)
+
+        if self.fetched is not None:
+            cached = set(docs.get(MONGO_KEY, ()))
+            for name in self.defaults:
+                if name in self.fetched:
+                    docs[name] = self.fetched[name]
+                    cached.add(name)
+                elif name in cached:
+                    # Deleted from the collection since it was cached
+                    docs.pop(name, None)
+                    cached.discard(name)
+            docs[MONGO_KEY] = sorted(cached)
+
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(docs, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.file_mtime = os.path.getmtime(self.path)
+            self.cached = self.fetched
+        except OSError as e:
+            print(f"Unable to write heuristics cache {self.path}:", e)
+
+    def watch(self):
+        pipeline = [{"$match": {"documentKey._id": {"$in": [doc_id(name) for name in self.defaults]}}}]
+        with self.collection.watch(pipeline, max_await_time_ms=1000) as stream:
+            while not self.stopping.is_set():
+                if stream.try_next() is not None:
+                    self.refresh()
+
+    def run(self):
+        while not self.stopping.is_set():
+            if self.use_watch:
+                try:
+                    self.watch()
+                    continue
+                except Exception as e:
+                    # Standalone servers have no change streams
+                    print("Heuristics change stream unavailable, polling instead:", e)
+                    self.use_watch = False
+
+            if self.stopping.wait(self.refresh_interval):
+                break
+            self.refresh()
+
+    def close(self, timeout=2.0):
+        self.stopping.set()
+        self.thread.join(timeout)
+
+
+# Entries of a heuristics file that were configured: everything cached
+# from the collection, and in other entries the values that are not just
+# another sensor's built-in default
+def configured(docs, own):
+    known = docs.get(DEFAULTS_KEY) or {}
+    cached = set(docs.get(MONGO_KEY) or ())
+    entries = {}
+    for name, raw in docs.items():
+        if name.startswith("_") or not isinstance(raw, dict):
+            continue
+        if name not in cached:
+            defaults = known.get(name) or {}
+            mine = own.get(name, {})
+            raw = {key: value for key, value in raw.items()
+                   if value == mine.get(key) or value not in defaults.get(key, ())}
+        entries[name] = raw
+    return entries
+
+
+# Retunes a HostTable of sliding windows to a new time window in place
+def resize_table(table, time_window):
+    table.idle_ttl = time_window
+    for window in table.values():
+        window.resize(time_window)
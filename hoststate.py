@@ -0,0 +1,280 @@
+from array import array
+
+from timerwheel import WHEEL
+
+# ================= BOUNDED HOST TABLE ================= #
+
+# Dict-like per-host state with a hard cap on tracked hosts.
+#
+# Idle expiry runs on the shared timerwheel.WHEEL. Timers belong to slots,
+# not keys: a slot gets one timer when it is first filled, and when it
+# fires expire() drops the slot's host if it was not touched since, or
+# hands back its current deadline. A slot freed by eviction or del keeps
+# its timer for the next host to use it, so the wheel never holds more
+# than one timer per slot (at most `max_hosts` per table) however fast
+# hosts come and go. tick(now) moves the table clock (packet time) and the
+# wheel, whose work per packet is bounded whatever the number of hosts.
+#
+# `prune(value, cutoff)`, if given, is called when a timer finds its host
+# still active, to drop stale state inside the value.
+#
+# Entries live in parallel arrays indexed by slot (struct of arrays): one
+# dict maps the key (a packed address) to its slot, and key, value,
+# last-seen time and a referenced bit sit in plain lists and typed arrays.
+# A host costs its dict entry plus about 25 bytes, instead of an ordered
+# dict node and a boxed float. Slots freed by expiry are reused, and the
+# slot numbers themselves are one shared list of ints, so tables tracking
+# the same hosts do not each box their own.
+#
+# Inserting past `max_hosts` evicts a host that was not touched since the
+# clock hand last passed it (CLOCK, a second-chance approximation of least
+# recently seen), which puts a ceiling on memory whatever the source
+# addresses look like. The hand looks at most MAX_SCAN slots per eviction.
+#
+# With idle_ttl >= the detector's window and cooldown, an expired host
+# has nothing left in its window, so expiry never changes a detection.
+#
+# A host seen by all five ids.py detectors costs about 1.8 KB across their
+# tables (port scan ~770 B, ARP ~310 B, each rate detector ~200 B), so a
+# million of them needs about 1.8 GB, short of the 1 GB goal. The default
+# cap keeps a sensor under 300 MB.
+
+DEFAULT_MAX_HOSTS = 100000
+MAX_SCAN = 64
+
+EMPTY = object()    # key of a free slot
+SLOT_IDS = []       # slot number -> the int object used for it by every table
+
+
+class HostTable:
+
+    def __init__(self, idle_ttl, max_hosts=DEFAULT_MAX_HOSTS, factory=None, wheel=None, prune=None):
+        self.idle_ttl = idle_ttl
+        self.max_hosts = max_hosts
+        self.factory = factory
+        self.prune = prune
+        self.wheel = wheel if wheel is not None else WHEEL
+
+        self.index = {}                # key -> slot
+        self.keys = []                 # slot -> key, EMPTY when free
+        self.vals = []                 # slot -> value
+        self.seen = array("d")         # slot -> last touch (packet time)
+        self.ref = bytearray()         # slot -> touched since the hand passed
+        self.timed = bytearray()       # slot -> has a timer on the wheel
+        self.free = []                 # free slots
+        self.hand = 0
+        self.now = 0.0
+
+        # Counters
+        self.expired = 0               # removed by idle TTL
+        self.evicted = 0               # removed by CLOCK under pressure
+
+    # Advance the table clock and the timer wheel
+    def tick(self, now):
+        if now > self.now:
+            self.now = now
+            self.wheel.advance(now)
+
+    # Timer callback: drop the host in `slot` if idle, else return when to
+    # look again. The timer of a free slot is dropped.
+    def expire(self, slot, now):
+        key = self.keys[slot]
+        if key is EMPTY:
+            self.timed[slot] = 0
+            return None
+        deadline = self.seen[slot] + self.idle_ttl
+        if deadline >= now:
+            if self.prune is not None:
+                self.prune(self.vals[slot], now - self.idle_ttl)
+            return deadline
+        self.release(key, slot)
+        self.timed[slot] = 0
+        self.expired += 1
+        return None
+
+    def release(self, key, slot):
+        del self.index[key]
+        self.keys[slot] = EMPTY
+        self.vals[slot] = None
+        self.free.append(slot)
+
+    # Free one slot: the first host not touched since the hand last passed
+    def evict(self):
+        keys, ref = self.keys, self.ref
+        size = len(keys)
+        hand = self.hand
+        for _ in range(MAX_SCAN):
+            if hand >= size:
+                hand = 0
+            if keys[hand] is not EMPTY:
+                if not ref[hand]:
+                    break
+                ref[hand] = 0
+            hand += 1
+        else:
+            # Everything recently touched: take the next occupied slot
+            while True:
+                if hand >= size:
+                    hand = 0
+                if keys[hand] is not EMPTY:
+                    break
+                hand += 1
+
+        self.hand = hand + 1
+        self.release(keys[hand], hand)
+        self.evicted += 1
+
+    def insert(self, key, value):
+        while len(self.index) >= self.max_hosts:
+            self.evict()
+
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+            self.vals[slot] = value
+            self.seen[slot] = self.now
+            self.ref[slot] = 0
+        else:
+            slot = len(self.keys)
+            if slot == len(SLOT_IDS):
+                SLOT_IDS.append(slot)
+            slot = SLOT_IDS[slot]
+            self.keys.append(key)
+            self.vals.append(value)
+            self.seen.append(self.now)
+            self.ref.append(0)
+            self.timed.append(0)
+
+        self.index[key] = slot
+        if not self.timed[slot]:
+            self.timed[slot] = 1
+            self.wheel.schedule(self.now + self.idle_ttl, self, slot)
+        return value
+
+    def __getitem__(self, key):
+        slot = self.index.get(key)
+        if slot is not None:
+            self.seen[slot] = self.now
+            self.ref[slot] = 1
+            return self.vals[slot]
+        if self.factory is None:
+            raise KeyError(key)
+        return self.insert(key, self.factory())
+
+    def __setitem__(self, key, value):
+        slot = self.index.get(key)
+        if slot is not None:
+            self.vals[slot] = value
+            self.seen[slot] = self.now
+            self.ref[slot] = 1
+        else:
+            self.insert(key, value)
+
+    def __delitem__(self, key):
+        self.release(key, self.index[key])
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def get(self, key, default=None):
+        slot = self.index.get(key)
+        if slot is not None:
+            self.seen[slot] = self.now
+            self.ref[slot] = 1
+            return self.vals[slot]
+        return default
+
+    # get() without touching the host
+    def peek(self, key, default=None):
+        slot = self.index.get(key)
+        if slot is not None:
+            return self.vals[slot]
+        return default
+
+    def pop(self, key, default=None):
+        slot = self.index.get(key)
+        if slot is None:
+            return default
+        value = self.vals[slot]
+        self.release(key, slot)
+        return value
+
+    def values(self):
+        vals = self.vals
+        return [vals[slot] for slot in self.index.values()]
+
+    def items(self):
+        vals = self.vals
+        return [(key, vals[slot]) for key, slot in self.index.items()]
+
+    def stats(self):
+        return {
+            "hosts": len(self.index),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+# ================= ARP MAC BINDINGS ================= #
+
+# ip -> {mac: last seen} for ARP replies. The per-ip dicts live in a
+# HostTable (same ttl), which keeps the cap on tracked addresses and drops
+# an address `ttl` after its last reply. A reply only touches its own
+# binding; stale bindings of an address that keeps replying are pruned
+# when its slot timer comes round, so they go within two ttl and the
+# wheel holds one timer per tracked address, not per binding.
+#
+# len() of a dict is therefore an upper bound; live() gives the exact
+# count.
+
+def prune_bindings(macs, cutoff):
+    for mac in [mac for mac, last in macs.items() if last < cutoff]:
+        del macs[mac]
+
+
+class BindingTable:
+
+    def __init__(self, ttl, max_hosts=DEFAULT_MAX_HOSTS, wheel=None):
+        self.ttl = ttl
+        self.hosts = HostTable(ttl, max_hosts, factory=dict, wheel=wheel, prune=prune_bindings)
+
+    def tick(self, now):
+        self.hosts.tick(now)
+
+    # Record a reply binding `ip` to `mac`; returns the ip's bindings
+    def bind(self, ip, mac, timestamp):
+        macs = self.hosts[ip]
+        last = macs.get(mac)
+        if last is None or timestamp > last:
+            macs[mac] = timestamp
+        return macs
+
+    # Bindings of `ip` used in the window ending at `timestamp`
+    def live(self, ip, timestamp):
+        macs = self.hosts.peek(ip)
+        if not macs:
+            return 0
+        cutoff = timestamp - self.ttl
+        return sum(1 for last in macs.values() if last >= cutoff)
+
+    # Forget the bindings of `ip`
+    def clear(self, ip):
+        macs = self.hosts.peek(ip)
+        if macs:
+            macs.clear()
+
+    def resize(self, ttl):
+        self.ttl = ttl
+        self.hosts.idle_ttl = ttl
+
+    def stats(self):
+        return self.hosts.stats()
+
+    def __len__(self):
+        return len(self.hosts)
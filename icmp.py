@@ -1,10 +1,17 @@
 import subprocess
-from collections import defaultdict, deque
-from datetime import datetime, timezone
-from pymongo import MongoClient
+import time
 import os
 from dotenv import load_dotenv
 
+from detectors import VictimTracker
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from latency import stamp
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sinks import MongoAlertWriter, get_client
+from windows import RateWindow
+
 # Environment variables
 
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
@@ -16,24 +23,56 @@ threshold = 100        # ICMP packets in window
 time_window = 5        # seconds
 interface = "any"
 ALERT_COOLDOWN = 60    # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
+VICTIM_THRESHOLD = 1000   # packets toward one destination in window
+VICTIM_SOURCES = 20      # distinct sources needed for a victim alert
 
 # MongoDB
-client = MongoClient(MONGO_URI)
+client = get_client(MONGO_URI)
 db = client["alert_db"]
 collection = db["alerts"]
+alert_writer = MongoAlertWriter(collection)   # batched, off the packet loop
 
 # ICMP Tracking
-ip_packets = defaultdict(deque)
-last_alert_time = {}
+ip_packets = HostTable(time_window, MAX_HOSTS, factory=lambda: RateWindow(time_window))
+last_alert_time = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Per-destination counts and distinct sources (botnet floods)
+victims = VictimTracker({"type": "alert", "attack": "Distributed ICMP Ping Flood"}, VICTIM_THRESHOLD, VICTIM_SOURCES,
+                        time_window, ALERT_COOLDOWN, MAX_HOSTS)
+
+# Hot-reloadable thresholds (Mongo, cached in heuristics.json)
+heuristics = HeuristicStore(db["heuristics"], {
+    "icmp": {"threshold": threshold, "time_window": time_window, "cooldown": ALERT_COOLDOWN,
+             "victim_threshold": VICTIM_THRESHOLD, "victim_sources": VICTIM_SOURCES}
+})
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics():
+    global threshold, time_window, ALERT_COOLDOWN, VICTIM_THRESHOLD, VICTIM_SOURCES
+    version = heuristics.version
+    config = heuristics.get("icmp")
+    threshold, time_window, ALERT_COOLDOWN = config["threshold"], config["time_window"], config["cooldown"]
+    resize_table(ip_packets, time_window)
+    last_alert_time.idle_ttl = ALERT_COOLDOWN
+    VICTIM_THRESHOLD, VICTIM_SOURCES = config["victim_threshold"], config["victim_sources"]
+    victims.configure(VICTIM_THRESHOLD, VICTIM_SOURCES, time_window, ALERT_COOLDOWN)
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # ICMP Echo Request filter
 cmd = [
     "tshark",
     "-i", interface,
+    "-f", "icmp[icmptype] = icmp-echo",
     "-Y", "icmp.type == 8",
     "-T", "fields",
     "-e", "frame.time_epoch",
-    "-e", "ip.src"
+    "-e", "ip.src",
+    "-e", "ip.dst"
 ]
 
 proc = subprocess.Popen(
@@ -45,52 +84,92 @@ proc = subprocess.Popen(
 
 print("ICMP Ping Flood monitoring started..")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("icmp", hosts=lambda: len(ip_packets))
+prof = StageProfiler("icmp")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         try:
-            timestamp, ip = line.strip().split()
+            timestamp, ip, dst = line.strip().split()
             timestamp = float(timestamp)
         except ValueError:
+            stats.parse_error()
             continue
 
-        ip_packets[ip].append(timestamp)
-
-        # Sliding window cleanup
-        while ip_packets[ip] and ip_packets[ip][0] < timestamp - time_window:
-            ip_packets[ip].popleft()
-
-        count = len(ip_packets[ip])
-        print(f"ICMP packets from {ip} | count={count}")
-
+        if timer:
+            timer.lap("parse")
+
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
+
+        # Expire idle hosts (bounded work per packet)
+        ip_packets.tick(timestamp)
+        last_alert_time.tick(timestamp)
+        victims.tick(timestamp)
+
+        # Sliding window count
+        count = ip_packets[ip].add(timestamp)
+        victim_count = victims.add(dst, ip, timestamp)
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"ICMP packets from {ip} | count={count}")
+        if timer:
+            timer.lap("window")
+
+        # VICTIM DETECTION: many sources under the threshold, one destination
+        if victim_count >= VICTIM_THRESHOLD:
+            alert = victims.check(dst, victim_count, timestamp)
+            if alert is not None:
+                stamp(alert, timestamp)     # latency.py: time-to-alert
+                alert_writer.write(alert)
+                print("ALERT QUEUED:", alert)
+                stats.alert()
+
+        alert = None
         if count >= threshold:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
 
             # Cooldown check
-            if ip in last_alert_time:
-                if (now - last_alert_time[ip]).total_seconds() < ALERT_COOLDOWN:
-                    continue
-
-            alert = {
-                "type": "alert",
-                "attack": "ICMP Ping Flood",
-                "ip": ip,
-                "packet_count": count,
-                "time_window": time_window,
-                "timestamp": now,
-                "message": f"High-rate ICMP echo requests detected from {ip}",
-                "tips": "Check firewall rules and consider rate limiting ICMP.",
-                "status": "unresolved"
-            }
-
-            collection.insert_one(alert)
-            last_alert_time[ip] = now
-
-            print("ALERT STORED:", alert)
+            if ip not in last_alert_time or now - last_alert_time[ip] >= ALERT_COOLDOWN:
+                alert = {
+                    "type": "alert",
+                    "attack": "ICMP Ping Flood",
+                    "ip": ip,
+                    "packet_count": count,
+                    "time_window": time_window,
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": f"High-rate ICMP echo requests detected from {ip}",
+                    "tips": "Check firewall rules and consider rate limiting ICMP.",
+                    "status": "unresolved"
+                }
+
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
+
+        alert_writer.write(alert)
+        if timer:
+            timer.lap("sink")
+        last_alert_time[ip] = now
+
+        print("ALERT QUEUED:", alert)
+        stats.alert()
 
 except KeyboardInterrupt:
     print("ICMP monitoring stopped by user.")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
     proc.wait()
+    alert_writer.close()
     client.close()
\ No newline at end of file
@@ -1,11 +1,18 @@
 import subprocess
-import socketio
 import os
-from collections import deque
-from datetime import datetime, timezone
+import time
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from emitter import LiveEmitter
+from detectors import VictimTracker
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from latency import stamp
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from windows import RateWindow
+
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True) # Load environment variables from .env file
 MONGO_URI = os.getenv("MONGO_URI") # MongoDB connection string
 
@@ -14,25 +21,10 @@ BACKEND_SOCKET_URL = "http://localhost:5001" # Backend Socket.IO server URL
 
 # ================= SOCKET.IO CLIENT ================= #
 
-# This block of code establishes a Socket.IO client connection to a backend server.
-# It also defines event handlers for connection and disconnection events, printing messages to the console when these events occur. 
-# If the connection attempt fails, it catches the exception, prints an error message, and exits the program.
-
-sio = socketio.Client(reconnection=True)
-
-@sio.event
-def connect():
-    print("Connected to backend Socket.IO server")
+# This block of code starts a background Socket.IO emitter for the backend server.
+# It connects (and keeps retrying) off the packet loop, batches bursts of alerts and buffers them while the backend is unreachable.
 
-@sio.event
-def disconnect():
-    print("Disconnected from backend Socket.IO server")
-
-try:
-    sio.connect(BACKEND_SOCKET_URL)
-except Exception as e:
-    print("Unable to connect to backend:", e)
-    exit(1)
+live = LiveEmitter(BACKEND_SOCKET_URL)
 
 # ========================================================== #
 
@@ -43,34 +35,33 @@ db = client["alert_db"]
 heuristic_collection = db["heuristics"]
 alert_collection = db["alerts"]
 
-def load_heuristic():
-    # Fetch heuristic config from MongoDB #
-    config = heuristic_collection.find_one({"_id": "icmp_heuristic"})
-    if not config:
-        print("[!] Heuristic config not found, using defaults")
-        return {
-            "interface": "any",
-            "time_window": 5,
-            "threshold": 100,
-            "cooldown": 10
-        }
-    return {
-        "interface": config.get("interface", "any"),
-        "time_window": config.get("time_window", 5),
-        "threshold": config.get("threshold", 100),
-        "cooldown": config.get("cooldown", 10)
+# Heuristic config from MongoDB, cached in heuristics.json and refreshed in
+# the background; the defaults apply when no "icmp_heuristic" document exists
+heuristics = HeuristicStore(heuristic_collection, {
+    "icmp": {
+        "interface": "any",
+        "time_window": 5,
+        "threshold": 100,
+        "cooldown": 10,
+        "victim_threshold": 1000,   # packets toward one destination in window
+        "victim_sources": 20        # distinct sources needed for a victim alert
     }
+})
 
 # ========================================================== #
 
 # ================= LOAD HEURISTIC ================= #
 
 
-heuristic = load_heuristic() # Load heuristic configuration from MongoDB
+heuristic = heuristics.get("icmp") # Current heuristic configuration
 INTERFACE = heuristic["interface"]
 TIME_WINDOW = heuristic["time_window"]
 THRESHOLD = heuristic["threshold"]
 COOLDOWN = heuristic["cooldown"]
+VICTIM_THRESHOLD = heuristic["victim_threshold"]
+VICTIM_SOURCES = heuristic["victim_sources"]
+
+MAX_HOSTS = 100000        # tracked hosts per state table
 
 print(f"[*] Using heuristic: Interface={INTERFACE}, Time Window={TIME_WINDOW}, Threshold={THRESHOLD}, Cooldown={COOLDOWN}")
 
@@ -78,18 +69,39 @@ print(f"[*] Using heuristic: Interface={INTERFACE}, Time Window={TIME_WINDOW}, T
 
 
 # ================= DATA STRUCTURES ================= #
-ip_record = {}      # Dictionary to capture sliding window timestamps per IP
-last_emitted = {}   # Dictionary for cooldown tracker per IP
+ip_record = HostTable(TIME_WINDOW, MAX_HOSTS)      # Dictionary of bucketed sliding window counters per IP
+last_emitted = HostTable(COOLDOWN, MAX_HOSTS)   # Dictionary for cooldown tracker per IP
+victims = VictimTracker({"attack_type": "DISTRIBUTED ICMP PING FLOOD"}, VICTIM_THRESHOLD, VICTIM_SOURCES,
+                        TIME_WINDOW, COOLDOWN, MAX_HOSTS)   # per-destination counts, distinct sources and cooldown
+
+
+# Applies changed thresholds without dropping window state (the interface
+# only takes effect on restart)
+def apply_heuristics():
+    global TIME_WINDOW, THRESHOLD, COOLDOWN, VICTIM_THRESHOLD, VICTIM_SOURCES
+    version = heuristics.version
+    config = heuristics.get("icmp")
+    TIME_WINDOW, THRESHOLD, COOLDOWN = config["time_window"], config["threshold"], config["cooldown"]
+    resize_table(ip_record, TIME_WINDOW)
+    last_emitted.idle_ttl = COOLDOWN
+    VICTIM_THRESHOLD, VICTIM_SOURCES = config["victim_threshold"], config["victim_sources"]
+    victims.configure(VICTIM_THRESHOLD, VICTIM_SOURCES, TIME_WINDOW, COOLDOWN)
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # ================= TSHARK COMMAND ================= #
 
 cmd = [
     "tshark",
     "-i", INTERFACE, # Network interface to capture packets from
+    "-f", "icmp[icmptype] = icmp-echo", # Kernel capture filter: only echo requests reach tshark
     "-Y", "icmp.type == 8",   # ICMP echo request
     "-T", "fields", # Output format: fields
     "-e", "frame.time_epoch", # Epoch timestamp of the frame
-    "-e", "ip.src" # Source IP address
+    "-e", "ip.src", # Source IP address
+    "-e", "ip.dst" # Destination IP address (victim tracking)
 ]
 
 proc = subprocess.Popen(  # Runs the command in a subprocess, allowing Python to interact with it in real time
@@ -103,75 +115,117 @@ print("Live ICMP IDS started...")
 
 #######################################################
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("icmpLive", hosts=lambda: len(ip_record))
+prof = StageProfiler("icmpLive")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # ================= MAIN LOOP =================
 try:
     for line in proc.stdout:   #Reads line from the tshark output
+        timer = prof.start() if prof.enabled else None
         try:
-            timestamp, ip = line.strip().split() # Parse timestamp and source IP from tshark output like this:
-            #timestamp = '1705259123.456', ip = '192.168.0.5'
+            timestamp, ip, dst = line.strip().split() # Parse timestamp, source and destination IP from tshark output like this:
+            #timestamp = '1705259123.456', ip = '192.168.0.5', dst = '192.168.0.1'
 
             timestamp = float(timestamp) #converts string to a float number because it includes decimal value
         except ValueError:
+            stats.parse_error()
             continue
 
+        if timer:
+            timer.lap("parse")
+
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
+
+        # Expire idle hosts (bounded work per packet)
+        ip_record.tick(timestamp)
+        last_emitted.tick(timestamp)
+        victims.tick(timestamp)
+
         # Initialize queue for new IP #
 
-        # --> This block of code adds new ip into the deque. If the ip exists, it appends the timestamp in deque. #
+        # --> This block of code adds new ip with its own window counter. #
         if ip not in ip_record:
-            ip_record[ip] = deque()
-
-        ip_record[ip].append(timestamp)
+            ip_record[ip] = RateWindow(TIME_WINDOW)
 
         #################################################
 
         ############################################
 
-        # Sliding window cleanup #
-
-        #This block of code removes timestamps from the deque that are older than the defined time window.    
+        # Sliding window count #
 
-        while ip_record[ip] and ip_record[ip][0] < timestamp - TIME_WINDOW:
-            ip_record[ip].popleft()
+        # The counter expires old time slots itself and returns the packets in the current time window.
 
-        packet_count = len(ip_record[ip]) # Count packets in the current time window
-        print(f"ICMP from {ip} | count={packet_count}")
+        packet_count = ip_record[ip].add(timestamp)
+        victim_count = victims.add(dst, ip, timestamp)   # same packet, counted toward its destination
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"ICMP from {ip} | count={packet_count}")
+        if timer:
+            timer.lap("window")
 
         ####################################################
 
+        # VICTIM DETECTION: many sources under the threshold, one destination
+        if victim_count >= VICTIM_THRESHOLD:
+            alert = victims.check(dst, victim_count, timestamp)
+            if alert is not None:
+                stamp(alert, timestamp)     # latency.py: time-to-alert
+                live.emit(alert)
+                print("LIVE ALERT SENT", alert)
+                stats.alert()
+
         # ================= DETECTION ================= #
 
+        alert = None
         if packet_count >= THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_emitted.get(ip)
 
-            if not last_time or (now - last_time).total_seconds() >= COOLDOWN:
+            if not last_time or now - last_time >= COOLDOWN:
                 alert = {
                     "attack_type": "ICMP PING FLOOD",
                     "ip": ip,
                     "packet_count": packet_count,
                     "time_window": TIME_WINDOW,
                     "severity": "High",
-                    "timestamp": now.isoformat(),
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
                     "message": "Possible ICMP overflood attack. Please take immediate action",
                     "status": "unresolved"
                 }
 
-                # Emit live alert to backend
-                sio.emit("live_alert", alert)
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
 
-                print("LIVE ALERT SENT", alert)
+        if alert is None:
+            continue
+
+        # Emit live alert to backend
+        live.emit(alert)
+        if timer:
+            timer.lap("sink")
+
+        print("LIVE ALERT SENT", alert)
+        stats.alert()
 
-                last_emitted[ip] = now # Update last emitted time
-                # ip_record[ip].clear()   # optional: I have keep it for continuous monitoring
+        last_emitted[ip] = now # Update last emitted time
+        # ip_record[ip].clear()   # optional: I have keep it for continuous monitoring
 
 
 except KeyboardInterrupt:
     print("Stopping Live ICMP IDS...")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
     proc.wait()
     client.close()
-    sio.disconnect()
+    live.close()
     print("IDS shutdown complete")
 
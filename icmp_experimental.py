@@ -1,8 +1,10 @@
 import subprocess
-import csv
-import os
-from collections import deque
-from datetime import datetime, timezone
+
+from datasets import open_dataset
+from hoststate import HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from windows import RateWindow
 
 # =========================
 # CONFIGURATION
@@ -10,35 +12,34 @@ from datetime import datetime, timezone
 
 THRESHOLD = 100        # packets per TIME_WINDOW
 TIME_WINDOW = 10        # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
 INTERFACE = "any"
 
 ATTACK_TYPE = "ICMP_PING_FLOOD"
 CSV_FILE = "icmp_traffic_log.csv"
+DATASET_FORMAT = "csv"   # "csv" or "columnar" (typed arrays, see datasets.py)
 
 # DATA STRUCTURES
 
 
-ip_record = {}        # Sliding window timestamps per IP
-attack_state = {}    # IP -> True / False
+ip_record = HostTable(TIME_WINDOW, MAX_HOSTS)        # Sliding window timestamps per IP
+attack_state = HostTable(TIME_WINDOW, MAX_HOSTS)    # IP -> True / False
 
 # CSV INITIALIZATION
 
 
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "timestamp",
-            "src_ip",
-            "dst_ip",
-            "ip_len",
-            "ttl",
-            "icmp_type",
-            "icmp_code",
-            "icmp_seq",
-            "packet_count",
-            "label"
-        ])
+dataset = open_dataset(CSV_FILE, [
+    "timestamp",
+    "src_ip",
+    "dst_ip",
+    "ip_len",
+    "ttl",
+    "icmp_type",
+    "icmp_code",
+    "icmp_seq",
+    "packet_count",
+    "label"
+], format=DATASET_FORMAT)
 
 
 # TSHARK COMMAND
@@ -47,6 +48,7 @@ if not os.path.exists(CSV_FILE):
 cmd = [
     "tshark",
     "-i", INTERFACE,
+    "-f", "icmp[icmptype] = icmp-echo",
     "-Y", "icmp.type == 8",
     "-T", "fields",
     "-e", "frame.time_epoch",
@@ -69,12 +71,17 @@ proc = subprocess.Popen(
 
 print("[*] ICMP traffic capture started (CSV only)...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("icmp_experimental", hosts=lambda: len(ip_record))
+prof = StageProfiler("icmp_experimental")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # =========================
 # MAIN LOOP
 # =========================
 
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         fields = line.strip().split(",")
 
         if len(fields) < 8:
@@ -94,19 +101,25 @@ try:
         try:
             timestamp = float(frame_time)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Initialize sliding window
-        if src_ip not in ip_record:
-            ip_record[src_ip] = deque()
+        if timer:
+            timer.lap("parse")
 
-        ip_record[src_ip].append(timestamp)
+        # Expire idle hosts (bounded work per packet)
+        ip_record.tick(timestamp)
+        attack_state.tick(timestamp)
 
-        # Sliding window cleanup
-        while ip_record[src_ip] and ip_record[src_ip][0] < timestamp - TIME_WINDOW:
-            ip_record[src_ip].popleft()
+        # Initialize sliding window
+        if src_ip not in ip_record:
+            ip_record[src_ip] = RateWindow(TIME_WINDOW)
 
-        packet_count = len(ip_record[src_ip])
+        # Sliding window count
+        packet_count = ip_record[src_ip].add(timestamp)
+        stats.packet(src_ip, timestamp)
+        if timer:
+            timer.lap("window")
 
         # =========================
         # STATEFUL RATE-BASED LABELING
@@ -119,28 +132,35 @@ try:
 
         label = ATTACK_TYPE if attack_state[src_ip] else "NORMAL"
 
+        if timer:
+            timer.lap("detect")
+
         # WRITE TO CSV
     
-        with open(CSV_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now(timezone.utc).isoformat(),
-                src_ip,
-                dst_ip,
-                ip_len,
-                ttl,
-                icmp_type,
-                icmp_code,
-                icmp_seq,
-                packet_count,
-                label
-            ])
-
-        print(f"[{label}] {src_ip} → {dst_ip} | count={packet_count}")
+        dataset.write_row([
+            frame_time,       # packet time (epoch seconds)
+            src_ip,
+            dst_ip,
+            ip_len,
+            ttl,
+            icmp_type,
+            icmp_code,
+            icmp_seq,
+            packet_count,
+            label
+        ])
+        if timer:
+            timer.lap("sink")
+
+        if DEBUG:
+            print(f"[{label}] {src_ip} → {dst_ip} | count={packet_count}")
 
 except KeyboardInterrupt:
     print("\n[*] Stopping ICMP capture...")
 
 finally:
+    stats.close()
+    prof.close()
     proc.terminate()
+    dataset.close()
     print("[*] Capture stopped, CSV saved.")
@@ -0,0 +1,236 @@
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+
+from capture import BACKENDS, CaptureEngine
+from detectors import DETECTORS, SYN_ENGINES
+from emitter import LiveEmitter
+from heuristics import HeuristicStore
+from hoststate import DEFAULT_MAX_HOSTS
+from metrics import METRICS_PORT, start_server
+from reporter import DEFAULT_INTERVAL, StatsReporter
+from sharding import ShardedEngine
+from sinks import MongoAlertWriter, get_client
+from timerwheel import WHEEL
+
+# Single-capture launcher: one tshark feeding any subset of the detectors.
+#
+#   python ids.py                          # all detectors
+#   python ids.py --detectors syn,portscan
+#   python ids.py --backend pcap           # dumpcap + native decoder
+#   python ids.py -r log/icmp_normal.pcap  # offline replay, packet time
+#                                          # (alerts go to alerts_replay)
+#   python ids.py --live                   # also push alerts to the dashboard
+#   python ids.py --workers 4              # shard detection over 4 processes
+#   python ids.py --syn-engine sketch      # fixed-memory SYN counts (spoofed floods)
+#   python ids.py --metrics-port 9108      # Prometheus metrics on /metrics
+#   python ids.py --profile                # per-stage timing report on exit
+
+# ENV
+load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
+MONGO_URI = os.getenv("MONGO_URI")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multiplexed network IDS")
+    parser.add_argument(
+        "--detectors",
+        default=",".join(DETECTORS),
+        help=f"comma separated subset of: {', '.join(DETECTORS)}"
+    )
+    parser.add_argument("-i", "--interface", default="any")
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="tshark",
+        help="tshark text dissection or native pcap decoding of dumpcap output"
+    )
+    parser.add_argument(
+        "--syn-engine",
+        choices=SYN_ENGINES,
+        default="exact",
+        help="per-source windows, or Count-Min Sketches with a per-destination aggregate alert"
+    )
+    parser.add_argument(
+        "--max-hosts",
+        type=int,
+        default=DEFAULT_MAX_HOSTS,
+        help="cap on tracked hosts per detector table (CLOCK eviction beyond it). A host seen "
+             "by all five detectors costs about 1.8 KB, so the default keeps a sensor under 300 MB; "
+             "a million such hosts takes about 1.8 GB, not the 1 GB targeted"
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="seconds between per-detector summary lines (0 disables them)"
+    )
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="also emit alerts to the dashboard backend over Socket.IO"
+    )
+    parser.add_argument("--backend-url", default="http://localhost:5001")
+    parser.add_argument(
+        "-r", "--read",
+        metavar="PCAP",
+        help="replay a capture file instead of sniffing an interface"
+    )
+    parser.add_argument(
+        "--alerts-collection",
+        help="alert_db collection for alerts (default: alerts, or alerts_replay with -r)"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="replay pace multiplier (1 = real time, 0 = as fast as possible)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="detector processes, sharded by source IP (1 = detect in the capture process)"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="serve Prometheus metrics on this local port (0 = off)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="sample per-stage timings (also toggled with SIGUSR1) and report them on exit"
+    )
+    return parser.parse_args()
+
+
+def build_detectors(names, max_hosts=DEFAULT_MAX_HOSTS, syn_engine="exact"):
+    selected = []
+    for name in names.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in DETECTORS:
+            raise SystemExit(f"Unknown detector: {name}")
+        cls = SYN_ENGINES[syn_engine] if name == "syn" else DETECTORS[name]
+        selected.append(cls(max_hosts=max_hosts))
+    return selected
+
+
+def main():
+    args = parse_args()
+    detectors = build_detectors(args.detectors, args.max_hosts, args.syn_engine)
+    if not detectors:
+        raise SystemExit("No detectors selected")
+
+    start_server(args.metrics_port)
+
+    # MongoDB
+    client = get_client(MONGO_URI)
+    db = client["alert_db"]
+    # Replays stay out of the production collection and are tagged with
+    # their file; replayed packet times say nothing about time-to-alert
+    collection = args.alerts_collection or ("alerts_replay" if args.read else "alerts")
+    replay_tags = {"source": "replay", "replay_file": os.path.basename(args.read)} if args.read else None
+    alert_writer = MongoAlertWriter(db[collection], track_latency=not args.read)
+
+    # Thresholds from the heuristics collection, reloaded while running
+    heuristics = HeuristicStore(db["heuristics"], {det.NAME: det.heuristics() for det in detectors})
+    live = LiveEmitter(args.backend_url, track_latency=not args.read) if args.live else None
+
+    if args.workers > 1:
+        # Each worker reports its own shard
+        engine = ShardedEngine(
+            detectors,
+            args.workers,
+            interface=args.interface,
+            backend=args.backend,
+            read_file=args.read,
+            speed=args.speed,
+            max_hosts=args.max_hosts,
+            stats_interval=args.stats_interval,
+            heuristics=heuristics
+        )
+    else:
+        # Per-detector counters and metrics; summary lines unless interval is 0
+        for det in detectors:
+            det.stats = StatsReporter(det.NAME, interval=args.stats_interval, hosts=det.host_count)
+
+        engine = CaptureEngine(
+            detectors,
+            interface=args.interface,
+            backend=args.backend,
+            read_file=args.read,
+            speed=args.speed,
+            heuristics=heuristics
+        )
+
+    if args.profile:
+        engine.profiler.enabled = True
+
+    print(f"IDS started with detectors: {', '.join(d.NAME for d in detectors)}")
+    print(f"Alerts to alert_db.{collection}")
+    if not args.read:
+        capture = engine.capture if args.workers > 1 else engine
+        print(f"Capture filter: {capture.capture_filter() or '(none)'}")
+    started = time.monotonic()
+
+    def handle(det, alert):
+        if replay_tags is not None:
+            alert.update(replay_tags)
+        alert_writer.write(alert)
+        if live is not None:
+            live.emit(alert)
+        print(f"[{det.NAME}] ALERT QUEUED:", alert)
+
+    try:
+        for det, alert in engine.run():
+            handle(det, alert)
+
+    except KeyboardInterrupt:
+        print("\nStopping IDS...")
+
+    finally:
+        engine.stop()
+        if args.workers > 1:
+            # Alerts the workers finished after run() stopped
+            for det, alert in engine.drain():
+                handle(det, alert)
+        engine.profiler.close()
+        heuristics.close()
+        for det in detectors:
+            if det.stats is not None:
+                det.stats.close()
+        alert_writer.close()
+        client.close()
+        print(f"Alert writer: {alert_writer.stats()}")
+
+        if live is not None:
+            live.close()
+            print(f"Live emitter: {live.stats()}")
+
+        if args.read:
+            elapsed = time.monotonic() - started
+            rate = engine.packet_count / elapsed if elapsed > 0 else 0
+            print(f"Replayed {engine.packet_count} packets in {elapsed:.2f}s ({rate:.0f} pkt/s)")
+
+        if args.workers > 1:
+            print(f"Packets per shard: {engine.shard_counts}")
+            table_stats = engine.table_stats()
+        else:
+            table_stats = {det.NAME: det.table_stats() for det in detectors}
+
+        for det_name, tables in table_stats.items():
+            for name, stats in tables.items():
+                print(f"[{det_name}] {name}: {stats}")
+        if args.workers <= 1:
+            print(f"Timer wheel: {WHEEL.stats()}")
+
+        print("IDS shutdown complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import math
+import threading
+import time
+from collections import deque
+
+from metrics import REGISTRY
+
+# ================= END-TO-END ALERT LATENCY ================= #
+
+# Every alert carries two epoch floats (BSON dates only keep milliseconds):
+#
+#   packet_time  frame.time_epoch of the packet that crossed the threshold
+#   detected_at  wall time when the detector raised the alert
+#
+# Each sink stamps its own ack time once delivery is confirmed (Mongo
+# insert_many returned, Socket.IO emit handed to the transport) and
+# records, per attack type:
+#
+#   detect   detected_at - packet_time   capture, tshark buffering, detection
+#   deliver  acked - detected_at         sink queueing, batching, retries
+#   total    acked - packet_time         time-to-alert
+#
+# into the ids_alert_latency_seconds histogram (labels sink, attack,
+# stage) and a window of recent samples for exact percentiles, printed
+# when the sink closes. Replays are not tracked: their packet times are
+# not related to the wall clock.
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LATENCY_STAGES = ("detect", "deliver", "total")
+MAX_SAMPLES = 10000     # recent samples kept per attack and stage
+
+
+# Called where the alert is raised
+def stamp(alert, packet_time):
+    alert["packet_time"] = packet_time
+    alert["detected_at"] = time.time()
+    return alert
+
+
+class LatencyTracker:
+
+    def __init__(self, sink, enabled=True, max_samples=MAX_SAMPLES):
+        self.sink = sink
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.series = {}        # attack -> {stage: (histogram, samples)}
+        self.lock = threading.Lock()
+
+    def stages(self, attack):
+        series = self.series.get(attack)
+        if series is None:
+            series = self.series[attack] = {
+                stage: (REGISTRY.histogram("ids_alert_latency_seconds",
+                                           "Seconds from packet time to alert delivery, by stage",
+                                           buckets=LATENCY_BUCKETS, sink=self.sink, attack=attack, stage=stage),
+                        deque(maxlen=self.max_samples))
+                for stage in LATENCY_STAGES
+            }
+        return series
+
+    # Alerts acknowledged by the sink at `acked` (time.time())
+    def record(self, alerts, acked=None):
+        if not self.enabled:
+            return
+        if acked is None:
+            acked = time.time()
+
+        with self.lock:
+            for alert in alerts:
+                packet_time = alert.get("packet_time")
+                detected_at = alert.get("detected_at")
+                if packet_time is None or detected_at is None:
+                    continue
+
+                series = self.stages(alert.get("attack") or alert.get("attack_type", "unknown"))
+                for stage, value in (("detect", detected_at - packet_time),
+                                     ("deliver", acked - detected_at),
+                                     ("total", acked - packet_time)):
+                    histogram, samples = series[stage]
+                    histogram.observe(value)
+                    samples.append(value)
+
+    def report(self):
+        with self.lock:
+            rows = [(attack, stage, sorted(samples))
+                    for attack, series in sorted(self.series.items())
+                    for stage, (_, samples) in series.items() if samples]
+        if not rows:
+            return
+
+        print(f"[{self.sink}] alert latency (ms):")
+        print(f"  {'attack':<18} {'stage':<8} {'alerts':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for attack, stage, samples in rows:
+            p50, p90, p99 = (1000 * percentile(samples, q) for q in (0.5, 0.9, 0.99))
+            print(f"  {attack:<18} {stage:<8} {len(samples):>7} {p50:>9.1f} {p90:>9.1f} {p99:>9.1f} "
+                  f"{1000 * samples[-1]:>9.1f}")
+
+
+# Nearest-rank percentile of sorted samples
+def percentile(samples, q):
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
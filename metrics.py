@@ -0,0 +1,189 @@
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ================= PROMETHEUS METRICS ================= #
+
+# Minimal in-process metrics registry with a Prometheus text endpoint.
+#
+# Counters, gauges and fixed-bucket histograms are plain Python objects
+# updated from the packet loop; a value can also come from a callback that
+# is only evaluated when the endpoint is scraped (e.g. hosts tracked, sink
+# queue depth). The HTTP server runs in a daemon thread and is only started
+# when a port is configured:
+#
+#   IDS_METRICS_PORT=9108 python tcp_syn.py
+#   python ids.py --metrics-port 9108
+#   curl -s localhost:9108/metrics
+
+METRICS_HOST = os.getenv("IDS_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("IDS_METRICS_PORT", "0"))     # 0 = no endpoint
+
+# Seconds between frame.time_epoch and wall time when a packet is handled
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Callback:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    @property
+    def value(self):
+        return self.fn()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels, extra=None):
+    items = list(labels)
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+class Registry:
+
+    def __init__(self):
+        self.families = {}      # name -> [type, help, {labels: metric}]
+        self.lock = threading.Lock()
+
+    def register(self, name, kind, help, labels, metric):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, [kind, help, {}])
+            if family[0] != kind:
+                raise ValueError(f"{name} already registered as a {family[0]}")
+            # Re-registering the same labels returns the existing metric
+            return family[2].setdefault(key, metric)
+
+    def counter(self, name, help, fn=None, **labels):
+        return self.register(name, "counter", help, labels, Callback(fn) if fn else Counter())
+
+    def gauge(self, name, help, fn=None, **labels):
+        return self.register(name, "gauge", help, labels, Callback(fn) if fn else Gauge())
+
+    def histogram(self, name, help, buckets=LAG_BUCKETS, **labels):
+        return self.register(name, "histogram", help, labels, Histogram(buckets))
+
+    def render(self):
+        with self.lock:
+            families = [(name, kind, help, list(metrics.items()))
+                        for name, (kind, help, metrics) in sorted(self.families.items())]
+
+        out = []
+        for name, kind, help, metrics in families:
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                if kind != "histogram":
+                    try:
+                        value = metric.value
+                    except Exception:
+                        continue      # a failing callback must not break the scrape
+                    out.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ("+Inf",), metric.counts):
+                    cumulative += count
+                    out.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {cumulative}")
+                out.append(f"{name}_sum{format_labels(labels)} {metric.sum}")
+                out.append(f"{name}_count{format_labels(labels)} {metric.count}")
+
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ================= SINK METRICS ================= #
+
+# Shared ids_sink_* series for the Mongo writer and the Socket.IO emitter;
+# values are read from the sink's own counters at scrape time
+def register_sink_metrics(sink, label, written_attr, pending):
+    for name, attr, help in (("written", written_attr, "Alerts delivered to the sink"),
+                             ("dropped", "dropped", "Alerts dropped on a full queue"),
+                             ("failed", "failed", "Alert deliveries that failed")):
+        REGISTRY.counter(f"ids_sink_{name}_total", help, fn=lambda attr=attr: getattr(sink, attr), sink=label)
+    REGISTRY.gauge("ids_sink_pending", "Alerts waiting to be delivered", fn=pending, sink=label)
+
+
+# ================= HTTP ENDPOINT ================= #
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass      # no per-scrape console lines
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Starts the endpoint once per process; a port of 0 leaves it off
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint unavailable on {host}:{port}:", e)
+            return None
+
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+        return _server
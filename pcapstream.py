@@ -0,0 +1,293 @@
+import struct
+
+from capture import Packet
+
+# Native pcap / pcapng decoder.
+#
+# Reads the binary capture stream written by `dumpcap -w -` (or a capture
+# file) and decodes only the header fields the detectors use, straight from
+# the packet buffer. Yields the same capture.Packet records as the tshark
+# text backend, so detectors cannot tell the two apart. Addresses are
+# packed (addresses.py) straight from the header bytes.
+
+# ================= FORMAT CONSTANTS ================= #
+
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002      # obsolete packet block
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+
+IDB_OPT_TSRESOL = 9
+IDB_OPT_TSOFFSET = 14
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12         # some BSDs use DLT 12 for raw IP
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_VLAN = (0x8100, 0x88a8, 0x9100)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+
+U16 = struct.Struct("!H")
+U32 = struct.Struct("!I")
+TCP_PORTS = struct.Struct("!HH")
+ARP_HEAD = struct.Struct("!HHBBH")
+
+
+class PcapError(Exception):
+    pass
+
+
+# ================= LAYER DECODING ================= #
+
+# Returns (ethertype, offset of the network header) or (None, 0)
+def link_payload(linktype, data):
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None, 0
+        offset = 12
+        ethertype = U16.unpack_from(data, offset)[0]
+        while ethertype in ETHERTYPE_VLAN and len(data) >= offset + 6:
+            offset += 4
+            ethertype = U16.unpack_from(data, offset)[0]
+        return ethertype, offset + 2
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None, 0
+        return U16.unpack_from(data, 14)[0], 16
+
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None, 0
+        return U16.unpack_from(data, 0)[0], 20
+
+    if linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT):
+        if data and data[0] >> 4 == 4:
+            return ETHERTYPE_IPV4, 0
+        return None, 0
+
+    return None, 0
+
+
+def decode(ts, linktype, data):
+    ethertype, off = link_payload(linktype, data)
+
+    if ethertype == ETHERTYPE_IPV4:
+        if len(data) < off + 20:
+            return None
+
+        ihl = (data[off] & 0x0F) * 4
+        proto = data[off + 9]
+
+        # Only the first fragment carries the L4 header
+        if U16.unpack_from(data, off + 6)[0] & 0x1FFF:
+            return None
+
+        l4 = off + ihl
+        src = U32.unpack_from(data, off + 12)[0]
+
+        if proto == IPPROTO_TCP:
+            if len(data) < l4 + 14:
+                return None
+            sport, dport = TCP_PORTS.unpack_from(data, l4)
+            flags = U16.unpack_from(data, l4 + 12)[0] & 0x0FFF
+            dst = U32.unpack_from(data, off + 16)[0]
+            return Packet(ts, "tcp", src, dst, sport, dport, flags, -1, 0, None)
+
+        if proto == IPPROTO_ICMP:
+            if len(data) < l4 + 1:
+                return None
+            dst = U32.unpack_from(data, off + 16)[0]
+            return Packet(ts, "icmp", src, dst, 0, 0, 0, data[l4], 0, None)
+
+        return None
+
+    if ethertype == ETHERTYPE_ARP:
+        if len(data) < off + 28:
+            return None
+
+        htype, ptype, hlen, plen, oper = ARP_HEAD.unpack_from(data, off)
+        if ptype != ETHERTYPE_IPV4 or hlen != 6 or plen != 4:
+            return None
+
+        mac = int.from_bytes(data[off + 8:off + 14], "big")
+        ip = U32.unpack_from(data, off + 14)[0]
+        return Packet(ts, "arp", ip, None, 0, 0, 0, -1, oper, mac)
+
+    return None
+
+
+# ================= STREAM READERS ================= #
+
+def read_exact(stream, n):
+    buf = stream.read(n)
+    if len(buf) < n:
+        if buf:
+            raise PcapError("truncated capture stream")
+        return None
+    return buf
+
+
+def read_pcap_classic(stream, head):
+    magic_le = struct.unpack("<I", head)[0]
+    if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        endian = "<"
+    else:
+        endian = ">"
+
+    magic = struct.unpack(endian + "I", head)[0]
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+
+    rest = read_exact(stream, 20)
+    if rest is None:
+        return
+    linktype = struct.unpack(endian + "IHHiIII", head + rest)[6] & 0x0FFFFFFF
+
+    record = struct.Struct(endian + "IIII")
+
+    while True:
+        hdr = read_exact(stream, 16)
+        if hdr is None:
+            return
+        sec, frac, caplen, _ = record.unpack(hdr)
+
+        data = read_exact(stream, caplen)
+        if data is None:
+            return
+
+        pkt = decode(sec + frac * scale, linktype, data)
+        if pkt is not None:
+            yield pkt
+
+
+def tsresol_scale(value):
+    if value & 0x80:
+        return 2.0 ** -(value & 0x7F)
+    return 10.0 ** -value
+
+
+def parse_idb(body, endian):
+    linktype = struct.unpack_from(endian + "H", body, 0)[0]
+    scale = 1e-6
+    offset = 0
+
+    # Options: code(2) length(2) value padded to 32 bits
+    pos = 8
+    while pos + 4 <= len(body):
+        code, length = struct.unpack_from(endian + "HH", body, pos)
+        pos += 4
+        if code == 0:
+            break
+        if code == IDB_OPT_TSRESOL and length >= 1:
+            scale = tsresol_scale(body[pos])
+        elif code == IDB_OPT_TSOFFSET and length >= 8:
+            offset = struct.unpack_from(endian + "q", body, pos)[0]
+        pos += (length + 3) & ~3
+
+    return linktype, scale, offset
+
+
+def read_pcapng(stream, head):
+    endian = "<"
+    interfaces = []
+    block_head = struct.Struct(endian + "II")
+    first = True
+
+    while True:
+        if first:
+            hdr = head + (read_exact(stream, 4) or b"")
+            first = False
+        else:
+            hdr = read_exact(stream, 8)
+        if hdr is None or len(hdr) < 8:
+            return
+
+        # The SHB type is a palindrome, so it reads the same in both orders
+        block_type, total_len = block_head.unpack(hdr)
+
+        if block_type == PCAPNG_SHB:
+            # Byte order is only known after reading the magic
+            bom = read_exact(stream, 4)
+            if bom is None:
+                return
+            if struct.unpack("<I", bom)[0] == PCAPNG_BYTE_ORDER:
+                endian = "<"
+            elif struct.unpack(">I", bom)[0] == PCAPNG_BYTE_ORDER:
+                endian = ">"
+            else:
+                raise PcapError("bad pcapng byte-order magic")
+            block_head = struct.Struct(endian + "II")
+            total_len = block_head.unpack(hdr)[1]
+
+            # Each section starts a fresh interface list
+            interfaces = []
+            if read_exact(stream, total_len - 12) is None:
+                return
+            continue
+
+        if total_len < 12:
+            raise PcapError("bad pcapng block length")
+
+        body = read_exact(stream, total_len - 8)
+        if body is None:
+            return
+        body = memoryview(body)[:-4]
+
+        if block_type == PCAPNG_EPB:
+            iface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", body, 0)
+            if iface >= len(interfaces):
+                continue
+            linktype, scale, tsoffset = interfaces[iface]
+            ts = ((ts_high << 32) | ts_low) * scale + tsoffset
+            pkt = decode(ts, linktype, body[20:20 + caplen])
+            if pkt is not None:
+                yield pkt
+
+        elif block_type == PCAPNG_IDB:
+            interfaces.append(parse_idb(body, endian))
+
+        elif block_type == PCAPNG_OPB:
+            iface, _, ts_high, ts_low, caplen = struct.unpack_from(endian + "HHIII", body, 0)
+            if iface >= len(interfaces):
+                continue
+            linktype, scale, tsoffset = interfaces[iface]
+            ts = ((ts_high << 32) | ts_low) * scale + tsoffset
+            pkt = decode(ts, linktype, body[20:20 + caplen])
+            if pkt is not None:
+                yield pkt
+
+        # Simple packet blocks carry no timestamp and every other block
+        # type is metadata the detectors do not need.
+
+
+# Yields capture.Packet records from a binary pcap or pcapng stream
+def read_packets(stream):
+    head = read_exact(stream, 4)
+    if head is None:
+        return
+
+    if struct.unpack("<I", head)[0] == PCAPNG_SHB:
+        yield from read_pcapng(stream, head)
+        return
+
+    if struct.unpack("<I", head)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or \
+            struct.unpack(">I", head)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        yield from read_pcap_classic(stream, head)
+        return
+
+    raise PcapError("not a pcap or pcapng stream")
+
+
+def read_pcap(path):
+    with open(path, "rb") as f:
+        yield from read_packets(f)
@@ -1,10 +1,18 @@
+import math
 import subprocess
-from collections import defaultdict, deque
-from datetime import datetime, timezone
-from pymongo import MongoClient
+import time
 import os
 from dotenv import load_dotenv
 
+from addresses import pack_ip
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sinks import MongoAlertWriter, get_client
+from sketches import SweepWindow
+from windows import DistinctWindow
+
 # ENV
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
 MONGO_URI = os.getenv("MONGO_URI")
@@ -13,86 +21,213 @@ MONGO_URI = os.getenv("MONGO_URI")
 PORT_THRESHOLD = 15      # unique ports
 TIME_WINDOW = 10         # seconds
 ALERT_COOLDOWN = 60      # seconds
+HOST_THRESHOLD = 50      # distinct hosts probed on one port
+BLOCK_THRESHOLD = 0.5    # sqrt(ports / PORT_THRESHOLD * hosts / HOST_THRESHOLD)
+MAX_HOSTS = 100000        # tracked hosts per state table
 INTERFACE = "any"
 
-# MongoDB
-client = MongoClient(MONGO_URI)
-db = client["alert_db"]
-collection = db["alerts"]
-
 # Tracking
-# ip → deque of (timestamp, dst_port)
-ip_ports = defaultdict(deque)
-last_alert = {}
-
-# TSHARK
-cmd = [
-    "tshark",
-    "-i", INTERFACE,
-    "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
-    "-T", "fields",
-    "-e", "frame.time_epoch",
-    "-e", "ip.src",
-    "-e", "tcp.dstport"
-]
-
-proc = subprocess.Popen(
-    cmd,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.DEVNULL,
-    text=True
-)
-
-print("Port Scan Detection Started...")
-
-# MAIN LOOP
-try:
-    for line in proc.stdout:
-        try:
-            timestamp, ip, port = line.strip().split()
-            timestamp = float(timestamp)
-            port = int(port)
-        except ValueError:
-            continue
-
-        ip_ports[ip].append((timestamp, port))
-
-        # Sliding window cleanup
-        while ip_ports[ip] and ip_ports[ip][0][0] < timestamp - TIME_WINDOW:
-            ip_ports[ip].popleft()
-
-        # Count unique ports
-        unique_ports = {p for _, p in ip_ports[ip]}
-        count = len(unique_ports)
-
+# ip → distinct dst_port window
+ip_ports = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: DistinctWindow(TIME_WINDOW))
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Horizontal and block scans: distinct hosts per source, overall and per recent
+# port, exact while small, then a fixed-size sketch however many hosts are swept
+ip_sweeps = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: SweepWindow(TIME_WINDOW))
+last_sweep_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)     # (ip, port) or (ip, "block")
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics(heuristics):
+    global PORT_THRESHOLD, HOST_THRESHOLD, BLOCK_THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN
+    version = heuristics.version
+    config = heuristics.get("portscan")
+    PORT_THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN = config["port_threshold"], config["time_window"], config["cooldown"]
+    resize_table(ip_ports, TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    HOST_THRESHOLD, BLOCK_THRESHOLD = config["host_threshold"], config["block_threshold"]
+    resize_table(ip_sweeps, TIME_WINDOW)
+    last_sweep_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+# PER-PACKET DETECTION
+# One line of tshark output; alerts go to emit(). bench.py drives this
+# directly, without tshark or Mongo.
+def handle(line, stats, emit, timer=None):
+    try:
+        timestamp, ip, dst_ip, port = line.strip().split()
+        timestamp = float(timestamp)
+        port = int(port)
+        dst_ip = pack_ip(dst_ip)        # only a sweep key, never printed
+    except (ValueError, OSError):
+        stats.parse_error()
+        return
+
+    if timer:
+        timer.lap("parse")
+
+    # Expire idle hosts (bounded work per packet)
+    ip_ports.tick(timestamp)
+    last_alert.tick(timestamp)
+    ip_sweeps.tick(timestamp)
+    last_sweep_alert.tick(timestamp)
+
+    # Sliding window unique port count
+    count = ip_ports[ip].add(timestamp, port)
+
+    # Quick distinct host counts (upper bounds while small, confirmed before alerting)
+    host_count, sweep_count = ip_sweeps[ip].add(timestamp, dst_ip, port)
+
+    stats.packet(ip, timestamp)
+    if DEBUG:
         print(f"Scan activity from {ip} | unique ports={count}")
-
-        if count >= PORT_THRESHOLD:
-            now = datetime.now(timezone.utc)
-
-            # Cooldown check
-            if ip in last_alert:
-                if (now - last_alert[ip]).total_seconds() < ALERT_COOLDOWN:
-                    continue
-
+    if timer:
+        timer.lap("window")
+
+    # HORIZONTAL SCAN: one port across many hosts
+    if sweep_count >= HOST_THRESHOLD:
+        key = (ip, port)
+        last_time = last_sweep_alert.get(key)
+        if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+            hosts = ip_sweeps[ip].port_host_count(port, timestamp)
+            if hosts >= HOST_THRESHOLD:
+                alert = {
+                    "type": "alert",
+                    "attack": "Horizontal Port Scan",
+                    "ip": ip,
+                    "port": port,
+                    "host_count": hosts,
+                    "timestamp": timestamp,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": f"Port {port} probed on about {hosts} hosts in {TIME_WINDOW}s (possible network sweep)",
+                    "status": "unresolved"
+                }
+                emit(alert)
+                last_sweep_alert[key] = timestamp
+
+    # BLOCK SCAN: several ports on several hosts, below the vertical threshold
+    if 2 <= count < PORT_THRESHOLD and host_count >= 2 and \
+            count * host_count >= BLOCK_THRESHOLD ** 2 * PORT_THRESHOLD * HOST_THRESHOLD:
+        key = (ip, "block")
+        last_time = last_sweep_alert.get(key)
+        if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+            hosts = ip_sweeps[ip].host_count(timestamp)
+            score = math.sqrt(count / PORT_THRESHOLD * hosts / HOST_THRESHOLD)
+            if hosts >= 2 and score >= BLOCK_THRESHOLD:
+                alert = {
+                    "type": "alert",
+                    "attack": "Block Port Scan",
+                    "ip": ip,
+                    "port_count": count,
+                    "host_count": hosts,
+                    "score": round(score, 2),
+                    "timestamp": timestamp,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": f"{count} ports probed across about {hosts} hosts in {TIME_WINDOW}s (possible block scan)",
+                    "status": "unresolved"
+                }
+                emit(alert)
+                last_sweep_alert[key] = timestamp
+
+    alert = None
+    if count >= PORT_THRESHOLD:
+        now = timestamp      # packet time, the same clock as the windows
+
+        # Cooldown check
+        if ip not in last_alert or now - last_alert[ip] >= ALERT_COOLDOWN:
             alert = {
                 "type": "alert",
                 "attack": "Port Scan",
                 "ip": ip,
                 "timestamp": now,
+                "packet_time": timestamp,       # latency.py: time-to-alert
+                "detected_at": time.time(),
                 "message": f"Multiple ports probed in a short time (possible reconnaissance activity)",
                 "status": "unresolved"
             }
 
-            collection.insert_one(alert)
-            last_alert[ip] = now
+    # Every packet, alerting or not
+    if timer:
+        timer.lap("detect")
 
-            print("ALERT STORED:", alert)
+    if alert is None:
+        return
+
+    emit(alert)
+    if timer:
+        timer.lap("sink")
+    last_alert[ip] = now
+
+
+# TSHARK
+cmd = [
+    "tshark",
+    "-i", INTERFACE,
+    "-f", "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn",
+    "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
+    "-T", "fields",
+    "-e", "frame.time_epoch",
+    "-e", "ip.src",
+    "-e", "ip.dst",
+    "-e", "tcp.dstport"
+]
 
-except KeyboardInterrupt:
-    print("\nStopping Port Scan Detection...")
 
-finally:
-    proc.terminate()
-    proc.wait()
-    client.close()
+def main():
+    # MongoDB
+    client = get_client(MONGO_URI)
+    db = client["alert_db"]
+    collection = db["alerts"]
+    alert_writer = MongoAlertWriter(collection)   # batched, off the packet loop
+
+    # Hot-reloadable thresholds (Mongo, cached in heuristics.json)
+    heuristics = HeuristicStore(db["heuristics"], {
+        "portscan": {"port_threshold": PORT_THRESHOLD, "host_threshold": HOST_THRESHOLD,
+                     "block_threshold": BLOCK_THRESHOLD, "time_window": TIME_WINDOW, "cooldown": ALERT_COOLDOWN}
+    })
+    heuristic_version = apply_heuristics(heuristics)
+
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+
+    print("Port Scan Detection Started...")
+
+    # Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+    stats = StatsReporter("port_scan", hosts=lambda: len(ip_ports))
+    prof = StageProfiler("port_scan")     # IDS_PROFILE=1 or kill -USR1 to enable
+
+    def emit(alert):
+        alert_writer.write(alert)
+        print("ALERT QUEUED:", alert)
+        stats.alert()
+
+    # MAIN LOOP
+    try:
+        for line in proc.stdout:
+            timer = prof.start() if prof.enabled else None
+            if heuristics.version != heuristic_version:
+                heuristic_version = apply_heuristics(heuristics)
+            handle(line, stats, emit, timer)
+
+    except KeyboardInterrupt:
+        print("\nStopping Port Scan Detection...")
+
+    finally:
+        stats.close()
+        prof.close()
+        heuristics.close()
+        proc.terminate()
+        proc.wait()
+        alert_writer.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
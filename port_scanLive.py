@@ -1,37 +1,62 @@
+import math
 import subprocess
-import socketio
-from collections import defaultdict, deque
-from datetime import datetime, timezone
+import time
+
+from emitter import LiveEmitter
+from addresses import pack_ip
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sketches import SweepWindow
+from windows import DistinctWindow
 
 # CONFIG
 PORT_THRESHOLD = 20      # unique ports
 TIME_WINDOW = 5          # seconds
 ALERT_COOLDOWN = 60
+HOST_THRESHOLD = 50      # distinct hosts probed on one port
+BLOCK_THRESHOLD = 0.5    # sqrt(ports / PORT_THRESHOLD * hosts / HOST_THRESHOLD)
+MAX_HOSTS = 100000        # tracked hosts per state table
 INTERFACE = "any"
 ATTACK_TYPE = "PORT_SCAN"
 BACKEND_SOCKET_URL = "http://localhost:5001"
 
 # SOCKET.IO CLIENT
-sio = socketio.Client(reconnection=True)
-
-@sio.event
-def connect():
-    print("Connected to backend Socket.IO server")
-
-@sio.event
-def disconnect():
-    print("Disconnected from backend Socket.IO server")
-
-try:
-    sio.connect(BACKEND_SOCKET_URL)
-except Exception as e:
-    print("Unable to connect to backend:", e)
-    exit(1)
+live = LiveEmitter(BACKEND_SOCKET_URL)   # background thread, buffers while backend is down
 
 # TRACKING STRUCTURE
-# src_ip -> deque of (timestamp, dst_port)
-scan_activity = defaultdict(deque)
-last_alert = {}
+# src_ip -> distinct dst_port window
+scan_activity = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: DistinctWindow(TIME_WINDOW))
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Horizontal and block scans: distinct hosts per source, overall and per recent
+# port, exact while small, then a fixed-size sketch however many hosts are swept
+ip_sweeps = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: SweepWindow(TIME_WINDOW))
+last_sweep_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)     # (ip, port) or (ip, "block")
+
+# Hot-reloadable thresholds (heuristics.json, no Mongo here)
+heuristics = HeuristicStore(None, {
+    "portscan": {"port_threshold": PORT_THRESHOLD, "host_threshold": HOST_THRESHOLD,
+                 "block_threshold": BLOCK_THRESHOLD, "time_window": TIME_WINDOW, "cooldown": ALERT_COOLDOWN}
+})
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics():
+    global PORT_THRESHOLD, HOST_THRESHOLD, BLOCK_THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN
+    version = heuristics.version
+    config = heuristics.get("portscan")
+    PORT_THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN = config["port_threshold"], config["time_window"], config["cooldown"]
+    resize_table(scan_activity, TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    HOST_THRESHOLD, BLOCK_THRESHOLD = config["host_threshold"], config["block_threshold"]
+    resize_table(ip_sweeps, TIME_WINDOW)
+    last_sweep_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # TSHARK COMMAND
 cmd = [
@@ -39,11 +64,13 @@ cmd = [
     "-n",
     "-l",
     "-i", INTERFACE,
+    "-f", "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn",
     "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
     "-T", "fields",
     "-E", "separator=,",
     "-e", "frame.time_epoch",
     "-e", "ip.src",
+    "-e", "ip.dst",
     "-e", "tcp.dstport"
 ]
 
@@ -57,61 +84,143 @@ proc = subprocess.Popen(
 
 print("Live TCP Port Scan IDS started...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("port_scanLive", hosts=lambda: len(scan_activity))
+prof = StageProfiler("port_scanLive")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # MAIN LOOP
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         parts = line.strip().split(",")
-        if len(parts) != 3:
+        if len(parts) != 4:
             continue
 
         try:
             timestamp = float(parts[0])
             src_ip = parts[1]
-            dst_port = int(parts[2])
-        except ValueError:
+            dst_ip = pack_ip(parts[2])      # only a sweep key, never printed
+            dst_port = int(parts[3])
+        except (ValueError, OSError):
+            stats.parse_error()
             continue
 
-        scan_activity[src_ip].append((timestamp, dst_port))
-
-        # Sliding window cleanup
-        while scan_activity[src_ip] and scan_activity[src_ip][0][0] < timestamp - TIME_WINDOW:
-            scan_activity[src_ip].popleft()
-
-        # Count unique destination ports
-        unique_ports = {p for _, p in scan_activity[src_ip]}
-        port_count = len(unique_ports)
-
-        print(f"Port scan check {src_ip} | unique ports={port_count}")
+        if timer:
+            timer.lap("parse")
+
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
+
+        # Expire idle hosts (bounded work per packet)
+        scan_activity.tick(timestamp)
+        last_alert.tick(timestamp)
+        ip_sweeps.tick(timestamp)
+        last_sweep_alert.tick(timestamp)
+
+        # Sliding window unique destination port count
+        port_count = scan_activity[src_ip].add(timestamp, dst_port)
+
+        # Quick distinct host counts (upper bounds while small, confirmed before alerting)
+        host_count, sweep_count = ip_sweeps[src_ip].add(timestamp, dst_ip, dst_port)
+
+        stats.packet(src_ip, timestamp)
+        if DEBUG:
+            print(f"Port scan check {src_ip} | unique ports={port_count}")
+        if timer:
+            timer.lap("window")
+
+        # HORIZONTAL SCAN: one port across many hosts
+        if sweep_count >= HOST_THRESHOLD:
+            key = (src_ip, dst_port)
+            last_time = last_sweep_alert.get(key)
+            if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+                hosts = ip_sweeps[src_ip].port_host_count(dst_port, timestamp)
+                if hosts >= HOST_THRESHOLD:
+                    alert = {
+                        "attack_type": "HORIZONTAL_PORT_SCAN",
+                        "ip": src_ip,
+                        "port": dst_port,
+                        "host_count": hosts,
+                        "timestamp": timestamp,
+                        "packet_time": timestamp,       # latency.py: time-to-alert
+                        "detected_at": time.time(),
+                        "message": f"Port {dst_port} probed on about {hosts} hosts in {TIME_WINDOW}s (possible network sweep)",
+                        "status": "unresolved"
+                    }
+                    live.emit(alert)
+                    print("LIVE PORT SCAN ALERT:", alert)
+                    stats.alert()
+                    last_sweep_alert[key] = timestamp
+
+        # BLOCK SCAN: several ports on several hosts, below the vertical threshold
+        if 2 <= port_count < PORT_THRESHOLD and host_count >= 2 and \
+                port_count * host_count >= BLOCK_THRESHOLD ** 2 * PORT_THRESHOLD * HOST_THRESHOLD:
+            key = (src_ip, "block")
+            last_time = last_sweep_alert.get(key)
+            if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+                hosts = ip_sweeps[src_ip].host_count(timestamp)
+                score = math.sqrt(port_count / PORT_THRESHOLD * hosts / HOST_THRESHOLD)
+                if hosts >= 2 and score >= BLOCK_THRESHOLD:
+                    alert = {
+                        "attack_type": "BLOCK_PORT_SCAN",
+                        "ip": src_ip,
+                        "port_count": port_count,
+                        "host_count": hosts,
+                        "score": round(score, 2),
+                        "timestamp": timestamp,
+                        "packet_time": timestamp,       # latency.py: time-to-alert
+                        "detected_at": time.time(),
+                        "message": f"{port_count} ports probed across about {hosts} hosts in {TIME_WINDOW}s (possible block scan)",
+                        "status": "unresolved"
+                    }
+                    live.emit(alert)
+                    print("LIVE PORT SCAN ALERT:", alert)
+                    stats.alert()
+                    last_sweep_alert[key] = timestamp
 
         # DETECTION
+        alert = None
         if port_count >= PORT_THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_alert.get(src_ip)
 
-            if last_time and (now - last_time).total_seconds() < ALERT_COOLDOWN:
-                continue
-
-            alert = {
-                "attack_type": ATTACK_TYPE,
-                "ip": src_ip,
-                "ports_scanned": sorted(unique_ports),
-                "port_count": port_count,
-                "timestamp": now.isoformat(),
-                "message": "Multiple TCP ports probed in short time (possible port scan)",
-                "status": "unresolved"
-            }
+            if not last_time or now - last_time >= ALERT_COOLDOWN:
+                alert = {
+                    "attack_type": ATTACK_TYPE,
+                    "ip": src_ip,
+                    "ports_scanned": sorted(scan_activity[src_ip].values()),
+                    "port_count": port_count,
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": "Multiple TCP ports probed in short time (possible port scan)",
+                    "status": "unresolved"
+                }
+
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
 
-            sio.emit("live_alert", alert)
-            print("LIVE PORT SCAN ALERT:", alert)
+        live.emit(alert)
+        if timer:
+            timer.lap("sink")
+        print("LIVE PORT SCAN ALERT:", alert)
+        stats.alert()
 
-            last_alert[src_ip] = now
-            scan_activity[src_ip].clear()
+        last_alert[src_ip] = now
+        scan_activity[src_ip].clear()
 
 except KeyboardInterrupt:
     print("\nStopping Port Scan IDS...")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
     proc.wait()
-    sio.disconnect()
+    live.close()
     print("IDS shutdown complete")
@@ -1,8 +1,10 @@
 import subprocess
-import csv
-from collections import deque
-from datetime import datetime, timezone
-import os
+
+from datasets import open_dataset
+from hoststate import HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from windows import DistinctWindow
 
 # =========================
 # CONFIGURATION
@@ -11,35 +13,34 @@ import os
 INTERFACE = "any"
 TIME_WINDOW = 5          # seconds
 THRESHOLD = 20           # unique ports in window
+MAX_HOSTS = 100000        # tracked hosts per state table
 ATTACK_TYPE = "TCP_PORT_SCAN"
 CSV_FILE = "port_scan.csv"
+DATASET_FORMAT = "csv"   # "csv" or "columnar" (typed arrays, see datasets.py)
 
 # =========================
 # DATA STRUCTURES
 # =========================
 
-ip_record = {}      # {src_ip: deque[(timestamp, dst_port)]}
-attack_state = {}   # {src_ip: True/False}
+ip_record = HostTable(TIME_WINDOW, MAX_HOSTS)      # {src_ip: DistinctWindow of dst_port}
+attack_state = HostTable(TIME_WINDOW, MAX_HOSTS)   # {src_ip: True/False}
 
 # =========================
 # CSV INITIALIZATION
 # =========================
 
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "timestamp",
-            "src_ip",
-            "dst_ip",
-            "ip_len",
-            "ttl",
-            "src_port",
-            "dst_port",
-            "tcp_seq",
-            "unique_port_count",
-            "label"
-        ])
+dataset = open_dataset(CSV_FILE, [
+    "timestamp",
+    "src_ip",
+    "dst_ip",
+    "ip_len",
+    "ttl",
+    "src_port",
+    "dst_port",
+    "tcp_seq",
+    "unique_port_count",
+    "label"
+], format=DATASET_FORMAT)
 
 # =========================
 # TSHARK COMMAND
@@ -48,6 +49,7 @@ if not os.path.exists(CSV_FILE):
 cmd = [
     "tshark",
     "-i", INTERFACE,
+    "-f", "tcp",
     "-Y", "tcp",
     "-T", "fields",
     "-E", "separator=,",
@@ -70,12 +72,17 @@ proc = subprocess.Popen(
 
 print("TCP Port Scan IDS started... Press Ctrl+C to stop")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("port_scan_experimental", hosts=lambda: len(ip_record))
+prof = StageProfiler("port_scan_experimental")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # =========================
 # MAIN LOGIC
 # =========================
 
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         fields = line.strip().split(",")
 
         if len(fields) < 8:
@@ -94,23 +101,27 @@ try:
 
         try:
             timestamp = float(frame_time)
+            dst_port = int(dst_port)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Initialize sliding window
-        if src_ip not in ip_record:
-            ip_record[src_ip] = deque()
+        if timer:
+            timer.lap("parse")
 
-        # Store timestamp + destination port
-        ip_record[src_ip].append((timestamp, dst_port))
+        # Expire idle hosts (bounded work per packet)
+        ip_record.tick(timestamp)
+        attack_state.tick(timestamp)
 
-        # Sliding window cleanup
-        while ip_record[src_ip] and ip_record[src_ip][0][0] < timestamp - TIME_WINDOW:
-            ip_record[src_ip].popleft()
+        # Initialize sliding window
+        if src_ip not in ip_record:
+            ip_record[src_ip] = DistinctWindow(TIME_WINDOW)
 
-        # Count unique destination ports
-        unique_ports = {p for _, p in ip_record[src_ip]}
-        port_count = len(unique_ports)
+        # Store timestamp + destination port, count unique destination ports
+        port_count = ip_record[src_ip].add(timestamp, dst_port)
+        stats.packet(src_ip, timestamp)
+        if timer:
+            timer.lap("window")
 
         # =========================
         # STATEFUL RATE-BASED LABELING
@@ -123,31 +134,38 @@ try:
 
         label = ATTACK_TYPE if attack_state[src_ip] else "NORMAL"
 
+        if timer:
+            timer.lap("detect")
+
         # =========================
         # WRITE TO CSV
         # =========================
 
-        with open(CSV_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now(timezone.utc).isoformat(),
-                src_ip,
-                dst_ip,
-                ip_len,
-                ttl,
-                src_port,
-                dst_port,
-                tcp_seq,
-                port_count,
-                label
-            ])
-
-        print(f"[{label}] {src_ip}:{src_port} → {dst_ip}:{dst_port} | unique_ports={port_count}")
+        dataset.write_row([
+            frame_time,       # packet time (epoch seconds)
+            src_ip,
+            dst_ip,
+            ip_len,
+            ttl,
+            src_port,
+            dst_port,
+            tcp_seq,
+            port_count,
+            label
+        ])
+        if timer:
+            timer.lap("sink")
+
+        if DEBUG:
+            print(f"[{label}] {src_ip}:{src_port} → {dst_ip}:{dst_port} | unique_ports={port_count}")
 
 except KeyboardInterrupt:
     print("Stopping TCP Port Scan IDS...")
 
 finally:
+    stats.close()
+    prof.close()
     proc.terminate()
     proc.wait()
+    dataset.close()
     print("IDS shutdown complete")
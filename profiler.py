@@ -0,0 +1,160 @@
+import os
+import signal
+from bisect import bisect_left
+from time import perf_counter_ns
+
+# ================= HOT-PATH STAGE PROFILER ================= #
+
+# Sampled per-stage timers for the packet loops. One packet in
+# `sample_every` is timed stage by stage (read, parse, window, detect,
+# sink) into fixed log-spaced histograms; the report is printed on
+# shutdown.
+#
+# Switched on with IDS_PROFILE=1 (or ids.py --profile), or at runtime with
+# `kill -USR1 <pid>`, which toggles every profiler in the process;
+# `kill -USR2 <pid>` prints the report so far. When off, the loop only
+# pays for one attribute check per packet and a None check per stage:
+#
+#   timer = prof.start() if prof.enabled else None
+#   ...parse...
+#   if timer:
+#       timer.lap("parse")
+#
+# The gap between a timed packet's last lap and the start of the next
+# packet is recorded as "read" (waiting on the tshark pipe).
+
+PROFILE = os.getenv("IDS_PROFILE", "") not in ("", "0")
+SAMPLE_EVERY = int(os.getenv("IDS_PROFILE_SAMPLE", "64"))
+
+STAGES = ("read", "parse", "window", "detect", "sink")
+
+# Histogram upper bounds in microseconds; the last slot is overflow
+BUCKETS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+
+_profilers = []
+
+
+class StageTimer:
+    __slots__ = ("profiler", "last")
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.last = 0
+
+    # Time since the previous lap goes to `stage`
+    def lap(self, stage):
+        now = perf_counter_ns()
+        self.profiler.record(stage, now - self.last)
+        self.last = now
+
+
+class StageProfiler:
+
+    def __init__(self, name, stages=STAGES, sample_every=SAMPLE_EVERY, enabled=PROFILE):
+        self.name = name
+        self.stages = stages
+        self.sample_every = max(1, sample_every)
+        self.enabled = enabled
+
+        self.countdown = 1
+        self.timed = False      # the previous packet was timed
+        self.timer = StageTimer(self)
+        self.reset()
+
+        _profilers.append(self)
+        install_signals()
+
+    def reset(self):
+        self.counts = {stage: [0] * (len(BUCKETS_US) + 1) for stage in self.stages}
+        self.totals = dict.fromkeys(self.stages, 0)       # ns
+        self.packets = 0
+
+    # Called once per packet while enabled; returns a timer for sampled packets
+    def start(self):
+        timer = self.timer
+        if self.timed:
+            self.record("read", perf_counter_ns() - timer.last)
+            self.timed = False
+
+        self.packets += 1
+        self.countdown -= 1
+        if self.countdown > 0:
+            return None
+        self.countdown = self.sample_every
+
+        timer.last = perf_counter_ns()
+        self.timed = True
+        return timer
+
+    def record(self, stage, ns):
+        counts = self.counts.get(stage)
+        if counts is None:
+            counts = self.counts[stage] = [0] * (len(BUCKETS_US) + 1)
+            self.totals[stage] = 0
+        counts[bisect_left(BUCKETS_US, ns / 1000)] += 1
+        self.totals[stage] += ns
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.timed = False
+        print(f"[{self.name}] profiling {'on' if self.enabled else 'off'}")
+
+    def report(self):
+        timed = sum(self.totals.values())
+        if not timed:
+            print(f"[{self.name}] profile: no samples")
+            return
+
+        print(f"[{self.name}] profile: {self.packets} packets seen while on, 1 in {self.sample_every} timed")
+        print(f"  {'stage':<8} {'samples':>8} {'mean us':>9} {'p50 us':>8} {'p90 us':>8} {'p99 us':>8} {'share':>6}")
+        for stage, counts in self.counts.items():
+            n = sum(counts)
+            if not n:
+                continue
+            mean = self.totals[stage] / n / 1000
+            share = 100.0 * self.totals[stage] / timed
+            print(f"  {stage:<8} {n:>8} {mean:>9.1f} {percentile(counts, 0.5):>8} "
+                  f"{percentile(counts, 0.9):>8} {percentile(counts, 0.99):>8} {share:>5.1f}%")
+
+    # Report on shutdown if anything was sampled
+    def close(self):
+        if any(self.totals.values()):
+            self.report()
+        if self in _profilers:
+            _profilers.remove(self)
+
+
+# Upper bucket bound (us) holding the q-th sample
+def percentile(counts, q):
+    target = q * sum(counts)
+    seen = 0
+    for i, count in enumerate(counts):
+        seen += count
+        if seen >= target and count:
+            return str(BUCKETS_US[i]) if i < len(BUCKETS_US) else f">{BUCKETS_US[-1]}"
+    return "-"
+
+
+_signals_installed = False
+
+
+def toggle_all(signum, frame):
+    for profiler in list(_profilers):
+        profiler.toggle()
+
+
+def report_all(signum, frame):
+    for profiler in list(_profilers):
+        profiler.report()
+
+
+def install_signals():
+    global _signals_installed
+    if _signals_installed or not hasattr(signal, "SIGUSR1"):
+        return
+    try:
+        signal.signal(signal.SIGUSR1, toggle_all)
+        signal.signal(signal.SIGUSR2, report_all)
+    except ValueError:
+        return      # not the main thread
+    _signals_installed = True
@@ -0,0 +1,373 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from capture import CaptureEngine, Packet
+from hoststate import DEFAULT_MAX_HOSTS
+from latency import stamp
+from metrics import REGISTRY
+from reporter import StatsReporter
+from sketches import hash64
+
+# ================= SHARDED DETECTION ================= #
+
+# Spreads detection over N worker processes. The reader process runs the
+# usual CaptureEngine capture, drops packets no detector accepts and sends
+# the rest, in batches, to worker `hash64(src) % N` (sketches.py; packed
+# addresses hash to themselves, so plain hash() would shard on the low
+# bits and put every x.y.z.0/4/8... host on shard 0). Every worker owns a
+# full set of detectors, so all window and cooldown state for a source address
+# lives in exactly one process. That covers the per-source detectors,
+# including the horizontal and block port scans (the sweep state is per
+# scanning source).
+#
+# Per-destination state (victim windows, the sketch engine's destination
+# counts) has to see every source of a destination, so a packet that a
+# detector with a victim half accepts also goes to worker `hash64(dst) % N`,
+# marked VICTIM. The source shard then runs only process_source() and the
+# destination shard only process_victim() (detectors.py). When both hash
+# to one worker it runs process() as usual. Alerts match a single-process
+# run, except that a source alert and a victim alert can both fire on one
+# packet; a single process raises the victim alert on the next packet.
+#
+# Alerts come back over one result queue and are yielded from run() like
+# CaptureEngine.run(), so the sinks stay in the reader process.
+#
+# Capture and dispatch run on a reader thread. run() wakes up every
+# `flush_interval` seconds whether packets arrive or not, to send partial
+# batches, pass on alerts from the workers and forward heuristics
+# changes, so a quiet capture does not hold packets or alerts back. After
+# stop() (e.g. on Ctrl-C), drain() returns the alerts the workers still
+# sent back.
+#
+# Worker processes keep their own counters, so the metrics endpoint (in the
+# reader) exports capture counters, per-shard dispatch counts, the packet
+# lag at dispatch and alerts per detector as they come back.
+
+BATCH_SIZE = 256
+QUEUE_BATCHES = 64      # per-worker backlog before the reader blocks
+
+# What a worker runs for a packet
+WHOLE = 0       # process(): source and destination in this shard
+SOURCE = 1      # process_source() only
+VICTIM = 2      # process_victim() only
+
+
+def worker_main(shard, classes, max_hosts, stats_interval, inbox, results):
+    detectors = [cls(max_hosts=max_hosts) for cls in classes]
+
+    routes = {}
+    for det in detectors:
+        if stats_interval > 0:
+            det.stats = StatsReporter(f"{det.NAME}#{shard}", interval=stats_interval, hosts=det.host_count)
+        routes.setdefault(det.PROTO, []).append(det)
+
+    make = Packet._make
+
+    try:
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                break
+
+            # New heuristics: {detector name: values}
+            if isinstance(batch, dict):
+                for det in detectors:
+                    det.configure(**batch.get(det.NAME, {}))
+                continue
+
+            alerts = []
+            for role, fields in batch:
+                pkt = make(fields)
+                for det in routes.get(pkt.proto, ()):
+                    if not det.accepts(pkt):
+                        continue
+
+                    if role == VICTIM:
+                        if det.process_victim is None:
+                            continue
+                        alert = det.process_victim(pkt)
+                    else:
+                        if det.stats is not None:
+                            det.stats.packet(pkt.src)
+                        if role == SOURCE:
+                            alert = det.process_source(pkt)
+                        else:
+                            alert = det.process(pkt)
+                    if alert is not None:
+                        stamp(alert, pkt.ts)
+                        if det.stats is not None:
+                            det.stats.alert()
+                        alerts.append((det.NAME, alert))
+
+            if alerts:
+                results.put(("alerts", shard, alerts))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        for det in detectors:
+            if det.stats is not None:
+                det.stats.close()
+        results.put(("done", shard, {det.NAME: det.table_stats() for det in detectors}))
+
+
+class ShardedEngine:
+
+    def __init__(self, detectors, workers, interface="any", backend="tshark", read_file=None,
+                 speed=0, max_hosts=DEFAULT_MAX_HOSTS, stats_interval=0, heuristics=None,
+                 batch_size=BATCH_SIZE, flush_interval=0.05):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        # The reader's detector objects only filter packets and label alerts;
+        # the state lives in the workers
+        self.detectors = list(detectors)
+        self.by_name = {det.NAME: det for det in self.detectors}
+        self.capture = CaptureEngine(self.detectors, interface, backend, read_file, speed)
+        self.heuristics = heuristics
+        self.heuristic_version = None
+
+        # Reader-side stages; workers are not profiled
+        self.profiler = self.capture.profiler
+        self.profiler.stages = ("read", "parse", "dispatch")
+        self.profiler.reset()
+
+        self.workers = workers
+        self.max_hosts = max_hosts
+        self.stats_interval = stats_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.packet_count = 0       # packets read
+        self.dispatched = 0         # packets sent to a worker (twice if split)
+        self.shard_counts = [0] * workers
+        self.shard_stats = {}       # shard -> {detector: table stats}
+
+        for shard in range(workers):
+            REGISTRY.counter("ids_shard_packets_total", "Packets dispatched to each worker",
+                             fn=lambda shard=shard: self.shard_counts[shard], shard=shard)
+        self.m_lag = REGISTRY.histogram(
+            "ids_packet_lag_seconds", "Wall time minus packet time when handled", detector="dispatch")
+        self.m_alerts = {name: REGISTRY.counter("ids_alerts_total", "Alerts raised", detector=name)
+                         for name in self.by_name}
+
+        self.procs = []
+        self.inboxes = []
+        self.results = None
+
+        self.batches = [[] for _ in range(workers)]
+        self.lock = threading.Lock()        # batches, between reader thread and run()
+        self.reader = None
+        self.reader_error = None
+        self.stopping = False
+        self.leftover = []          # alerts collected by stop()
+
+    def start(self):
+        self.results = multiprocessing.Queue()
+        # Same detector classes as the reader, e.g. the sketch SYN engine
+        classes = [type(det) for det in self.detectors]
+
+        for shard in range(self.workers):
+            inbox = multiprocessing.Queue(maxsize=QUEUE_BATCHES)
+            proc = multiprocessing.Process(
+                target=worker_main,
+                args=(shard, classes, self.max_hosts, self.stats_interval, inbox, self.results),
+                name=f"ids-shard-{shard}",
+                daemon=True
+            )
+            proc.start()
+            self.inboxes.append(inbox)
+            self.procs.append(proc)
+
+    # Sends the store's current values to every worker if they changed
+    def push_heuristics(self):
+        version = self.heuristics.version
+        if version == self.heuristic_version:
+            return
+        self.heuristic_version = version
+        config = {det.NAME: self.heuristics.get(det.NAME) for det in self.detectors}
+        for inbox in self.inboxes:
+            inbox.put(config)
+
+    # None if no detector in the reader would look at this packet, else
+    # whether one of them keeps per-destination state for it
+    def wanted(self, pkt):
+        wanted = None
+        for det in self.capture.routes.get(pkt.proto, ()):
+            if det.accepts(pkt):
+                if det.process_victim is not None:
+                    return True
+                wanted = False
+        return wanted
+
+    def send(self, shard, batch):
+        self.inboxes[shard].put(batch)
+        self.shard_counts[shard] += len(batch)
+        self.dispatched += len(batch)
+
+    # Adds a packet to the shard's batch, sending it when full
+    def enqueue(self, shard, entry):
+        batch = self.batches[shard]
+        batch.append(entry)
+        if len(batch) >= self.batch_size:
+            self.send(shard, batch)
+            self.batches[shard] = []
+
+    # Sends every partial batch
+    def flush(self):
+        with self.lock:
+            for shard, batch in enumerate(self.batches):
+                if batch:
+                    self.send(shard, batch)
+                    self.batches[shard] = []
+
+    # Reader thread: capture and dispatch
+    def read(self):
+        capture = self.capture
+        prof = self.profiler
+        packets = capture.packets(prof)
+        if capture.read_file and capture.speed > 0:
+            packets = capture.paced(packets, prof)
+
+        workers = self.workers
+        lag = self.m_lag if capture.read_file is None else None
+        lock = self.lock
+
+        try:
+            for pkt in packets:
+                if self.stopping:
+                    break
+                self.packet_count += 1
+                timer = prof.timer if prof.timed else None
+                victim = self.wanted(pkt)
+                if victim is None:
+                    if timer:
+                        timer.lap("dispatch")
+                    continue
+
+                if lag is not None:
+                    lag.observe(time.time() - pkt.ts)
+
+                fields = tuple(pkt)
+                shard = hash64(pkt.src) % workers
+                with lock:
+                    if victim and pkt.dst is not None:
+                        dst_shard = hash64(pkt.dst) % workers
+                        if dst_shard != shard:
+                            self.enqueue(dst_shard, (VICTIM, fields))
+                            self.enqueue(shard, (SOURCE, fields))
+                        else:
+                            self.enqueue(shard, (WHOLE, fields))
+                    else:
+                        self.enqueue(shard, (WHOLE, fields))
+                if timer:
+                    timer.lap("dispatch")
+
+        except Exception as e:
+            self.reader_error = e
+
+    # Yields (detector, alert) for every alert raised in any worker
+    def run(self):
+        self.start()
+        if self.heuristics is not None:
+            self.push_heuristics()
+
+        self.reader = threading.Thread(target=self.read, name="ids-shard-reader", daemon=True)
+        self.reader.start()
+
+        while self.reader.is_alive():
+            yield from self.collect(block=False, timeout=self.flush_interval)
+            self.flush()
+            if self.heuristics is not None:
+                self.push_heuristics()
+
+        self.reader.join()
+        if self.reader_error is not None:
+            raise self.reader_error
+
+        # End of capture: flush, stop the workers and wait for their alerts
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put(None)
+
+        yield from self.collect(block=True)
+
+    # Yields alerts from the result queue: until every worker is done if
+    # `block`, else those arriving within `timeout` seconds
+    def collect(self, block, timeout=0.0):
+        deadline = time.monotonic() + timeout
+        while len(self.shard_stats) < len(self.procs):
+            try:
+                if block:
+                    kind, shard, payload = self.results.get(timeout=1.0)
+                else:
+                    wait = deadline - time.monotonic()
+                    if wait > 0:
+                        kind, shard, payload = self.results.get(timeout=wait)
+                    else:
+                        kind, shard, payload = self.results.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return
+                if not any(proc.is_alive() for proc in self.procs):
+                    return
+                continue
+
+            if kind == "done":
+                self.shard_stats[shard] = payload
+                continue
+
+            for name, alert in payload:
+                self.m_alerts[name].inc()
+                yield self.by_name[name], alert
+
+    def stop(self):
+        self.stopping = True
+        self.capture.stop()
+        if self.reader is not None:
+            self.reader.join(5.0)
+
+        if self.procs:
+            # Packets already read still go to the workers that are running
+            # (Ctrl-C stops them too), then the end marker
+            reader_done = self.reader is None or not self.reader.is_alive()
+            for shard, (inbox, proc) in enumerate(zip(self.inboxes, self.procs)):
+                if not proc.is_alive():
+                    continue
+                try:
+                    if reader_done and self.batches[shard]:
+                        inbox.put(self.batches[shard], timeout=1.0)
+                        self.batches[shard] = []
+                    inbox.put(None, timeout=1.0)
+                except queue.Full:
+                    pass
+
+            # Keep what the workers send back until they are done
+            self.leftover.extend(self.collect(block=True))
+
+        for proc in self.procs:
+            proc.join(5.0)
+            if proc.is_alive():
+                proc.terminate()
+
+        self.procs = []
+        self.inboxes = []
+
+    # Alerts that came back after run() stopped yielding; call after stop()
+    def drain(self):
+        leftover, self.leftover = self.leftover, []
+        return leftover
+
+    # Table stats summed over shards, per detector
+    def table_stats(self):
+        merged = {}
+        for tables in self.shard_stats.values():
+            for name, stats in tables.items():
+                for table, values in stats.items():
+                    total = merged.setdefault(name, {}).setdefault(table, {})
+                    for key, value in values.items():
+                        total[key] = total.get(key, 0) + value
+        return merged
@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from latency import LatencyTracker
+from metrics import register_sink_metrics
+
+# ================= SHARED MONGO CLIENT ================= #
+
+# One MongoClient per URI per process; MongoClient is thread-safe and
+# pools its own connections, so every detector can share it.
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri):
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = _clients[uri] = MongoClient(uri)
+        return client
+
+
+# ================= BATCHED ALERT WRITER ================= #
+
+# Takes alerts from the packet loop without touching the network and writes
+# them from a background thread with insert_many.
+#
+# A batch is flushed when it reaches `batch_size` alerts or when the oldest
+# queued alert has waited `flush_interval` seconds. The queue is bounded:
+# when it is full, `drop_policy` decides whether the new alert ("newest") or
+# the oldest queued one ("oldest") is discarded. write() never blocks.
+#
+# Alerts arrive with a float "timestamp" (packet time); the writer thread
+# stores a copy with it as a BSON date, so the packet loop never builds
+# datetimes and the caller's dict is not touched by insert_many.
+#
+# insert_many is unordered, so a failed call may still have stored part of
+# the batch. On a BulkWriteError only the documents that failed are
+# retried; a duplicate _id means an earlier attempt stored the document
+# and its reply was lost, so it counts as written.
+#
+# Alert latency (latency.py) is recorded when insert_many returns; pass
+# track_latency=False for replays.
+
+DROP_POLICIES = ("oldest", "newest")
+DUPLICATE_KEY = 11000
+
+
+class MongoAlertWriter:
+
+    def __init__(self, collection, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 drop_policy="oldest", retries=3, track_latency=True):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.retries = retries
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopping = threading.Event()
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+        register_sink_metrics(self, "mongo", "written", self.queue.qsize)
+        self.latency = LatencyTracker("mongo", enabled=track_latency)
+
+        self.thread = threading.Thread(target=self.run, name="mongo-alert-writer", daemon=True)
+        self.thread.start()
+
+    # Called from the packet loop
+    def write(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            pass
+
+        self.dropped += 1
+        if self.drop_policy == "newest":
+            return False
+
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(alert)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            return False
+
+    def run(self):
+        batch = []
+        deadline = 0.0
+
+        while True:
+            stopping = self.stopping.is_set()
+            if stopping:
+                timeout = 0
+            elif batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                timeout = 0.5
+
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                if stopping:
+                    # Queue drained on shutdown
+                    if batch:
+                        self.flush(batch)
+                    return
+
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self.flush(batch)
+                batch = []
+
+    def flush(self, batch):
+        pending = [(alert, document(alert)) for alert in batch]
+        for attempt in range(self.retries):
+            try:
+                self.collection.insert_many([doc for _, doc in pending], ordered=False)
+                self.stored([alert for alert, _ in pending])
+                return
+            except BulkWriteError as e:
+                retry = {error["index"] for error in e.details.get("writeErrors", ())
+                         if error.get("code") != DUPLICATE_KEY}
+                self.stored([alert for i, (alert, _) in enumerate(pending) if i not in retry])
+                pending = [entry for i, entry in enumerate(pending) if i in retry]
+                if not pending:
+                    return
+                print(f"Alert batch insert failed for {len(pending)} alerts:", e)
+            except Exception as e:
+                print("Alert batch insert failed:", e)
+
+            if self.stopping.is_set():
+                break
+            time.sleep(min(2 ** attempt, 10))
+
+        self.failed += len(pending)
+
+    def stored(self, alerts):
+        if alerts:
+            self.latency.record(alerts)
+            self.written += len(alerts)
+            self.batches += 1
+
+    # Flushes whatever is queued, then stops the writer thread
+    def close(self, timeout=10.0):
+        self.stopping.set()
+        self.thread.join(timeout)
+        self.latency.report()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+# Copy of an alert as stored in Mongo
+def document(alert):
+    doc = dict(alert)
+    timestamp = doc.get("timestamp")
+    if isinstance(timestamp, float):
+        doc["timestamp"] = datetime.fromtimestamp(timestamp, timezone.utc)
+    return doc
@@ -0,0 +1,547 @@
+from array import array
+from collections import OrderedDict
+from math import ceil, log
+
+from windows import RateWindow
+
+# ================= WINDOWED COUNT-MIN SKETCH ================= #
+
+# Approximate per-key packet counts over the last `time_window` seconds in
+# fixed memory, whatever the number of keys (e.g. a SYN flood from
+# randomized source addresses).
+#
+# `depth` rows of `width` counters per time slot, in a ring of slots like
+# windows.RateWindow, plus a running sum of the live slots so a query reads
+# `depth` counters instead of summing the ring. A slot's counters are
+# subtracted from the sum when it leaves the window (once per slot width).
+#
+# Estimates never undercount; with N packets in the window they overcount
+# by at most about e*N/width with probability 1 - e^-depth.
+
+DEFAULT_WIDTH = 2048
+DEFAULT_DEPTH = 4
+MAX_SKETCH_SLOTS = 16       # each slot holds width*depth counters
+
+MASK32 = 0xFFFFFFFF
+MASK64 = (1 << 64) - 1
+
+
+# 64-bit hash of `key` for the sketches. Packed addresses are small ints,
+# which hash to themselves, and structured ones (every x.y.z.1) share
+# their low bits; the murmur3 finalizer makes every output bit depend on
+# every input bit, so any subset of the bits can be used as an index.
+def hash64(key):
+    h = hash(key) & MASK64
+    h = ((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & MASK64
+    h = ((h ^ (h >> 33)) * 0xC4CEB9FE1A85EC53) & MASK64
+    return h ^ (h >> 33)
+
+
+def pick_sketch_granularity(time_window):
+    for g in (0.1, 0.5, 1.0, 5.0, 10.0):
+        if time_window / g <= MAX_SKETCH_SLOTS:
+            return g
+    return time_window / MAX_SKETCH_SLOTS
+
+
+class CountMinWindow:
+
+    def __init__(self, time_window, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, granularity=None):
+        self.width = width
+        self.depth = depth
+        self.cells = width * depth
+        self.zero = array("I", bytes(4 * self.cells))
+        self.setup(time_window, granularity)
+
+    def setup(self, time_window, granularity=None):
+        if granularity is None:
+            granularity = pick_sketch_granularity(time_window)
+        self.time_window = time_window
+        self.granularity = granularity
+        self.size = ceil(time_window / granularity) + 1
+        self.slots = [array("I", self.zero) for _ in range(self.size)]
+        self.sums = array("I", self.zero)
+        self.head = None        # absolute index of the newest slot
+        self.total = 0          # packets in the window, all keys
+
+    # Counter positions of `key`, one per row (double hashing)
+    def cells_of(self, key):
+        h = hash64(key)
+        h1 = h & MASK32
+        h2 = (h >> 32) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def drop(self, slot):
+        counts = self.slots[slot % self.size]
+        if not any(counts):
+            return
+        sums = self.sums
+        for i, n in enumerate(counts):
+            if n:
+                sums[i] -= n
+        self.total -= sum(counts[:self.width])      # every packet is in row 0 once
+        counts[:] = self.zero
+
+    # Expire every slot that fell out of the window before `slot`
+    def advance(self, slot):
+        head = self.head
+        if head is None:
+            self.head = slot
+            return
+        if slot <= head:
+            return
+
+        if slot - head >= self.size:
+            for counts in self.slots:
+                counts[:] = self.zero
+            self.sums[:] = self.zero
+            self.total = 0
+        else:
+            for s in range(head + 1, slot + 1):
+                self.drop(s)
+
+        self.head = slot
+
+    # Count one packet for `key` and return its in-window estimate
+    def add(self, key, timestamp, n=1):
+        slot = int(timestamp / self.granularity)
+        if slot != self.head:
+            self.advance(slot)
+
+        sums = self.sums
+
+        # Late packets are still counted if their slot is in the window
+        if slot <= self.head - self.size:
+            return min(sums[i] for i in self.cells_of(key))
+
+        counts = self.slots[slot % self.size]
+        self.total += n
+
+        h = hash64(key)
+        h1 = h & MASK32
+        h2 = (h >> 32) | 1
+        width = self.width
+        estimate = None
+        base = 0
+        for row in range(self.depth):
+            i = base + (h1 + row * h2) % width
+            counts[i] += n
+            value = sums[i] + n
+            sums[i] = value
+            if estimate is None or value < estimate:
+                estimate = value
+            base += width
+        return estimate
+
+    # In-window estimate for `key` as of `timestamp`, without counting
+    def estimate(self, key, timestamp=None):
+        if timestamp is not None:
+            self.advance(int(timestamp / self.granularity))
+        sums = self.sums
+        return min(sums[i] for i in self.cells_of(key))
+
+    # New time window: live slots are folded into the new ring by start time
+    def resize(self, time_window, granularity=None):
+        old_g, old_size, old_slots, head = self.granularity, self.size, self.slots, self.head
+        self.setup(time_window, granularity)
+        if head is None:
+            return
+
+        scale = old_g / self.granularity
+        self.head = int(head * scale + 1e-9)
+        sums = self.sums
+        for s in range(head - old_size + 1, head + 1):
+            old = old_slots[s % old_size]
+            slot = int(s * scale + 1e-9)
+            if slot <= self.head - self.size or not any(old):
+                continue
+            counts = self.slots[slot % self.size]
+            for i, n in enumerate(old):
+                if n:
+                    counts[i] += n
+                    sums[i] += n
+            self.total += sum(old[:self.width])
+
+    def memory(self):
+        return 4 * self.cells * (self.size + 1)
+
+
+# ================= HEAVY HITTERS ================= #
+
+# The `k` keys with the largest estimates in a CountMinWindow, for naming
+# the top sources of a flood. Keyed by (source, destination) pairs, the
+# sources named for a destination are ones that actually sent to it.
+# offer() is O(1) unless the estimate beats the smallest one in the table;
+# then the table is re-read from the sketch (stale entries decay with the
+# window) and the smallest is replaced.
+
+class HeavyHitters:
+
+    def __init__(self, sketch, k=32):
+        self.sketch = sketch
+        self.k = k
+        self.entries = {}       # key -> estimate when last seen
+        self.floor = 0          # smallest estimate in a full table
+
+    def offer(self, key, estimate):
+        entries = self.entries
+        if key in entries or len(entries) < self.k:
+            entries[key] = estimate
+            if len(entries) == self.k and not self.floor:
+                self.floor = min(entries.values())
+            return
+        if estimate <= self.floor:
+            return
+
+        self.refresh()
+        coldest = min(entries, key=entries.get)
+        if estimate > entries[coldest]:
+            del entries[coldest]
+            entries[key] = estimate
+        self.floor = min(entries.values())
+
+    def refresh(self):
+        estimate = self.sketch.estimate
+        for key in self.entries:
+            self.entries[key] = estimate(key)
+
+    # (key, estimate) pairs, largest first
+    def top(self, n=None):
+        self.refresh()
+        ranked = sorted(self.entries.items(), key=lambda kv: kv[1], reverse=True)
+        return [kv for kv in ranked[:n] if kv[1]]
+
+    # With (src, dst) keys: (src, estimate) toward `dst`, largest first
+    def top_sources(self, dst, n=None):
+        return [(src, count) for (src, to), count in self.top() if to == dst][:n]
+
+    def clear(self):
+        self.entries.clear()
+        self.floor = 0
+
+
+# ================= WINDOWED HYPERLOGLOG ================= #
+
+# Approximate number of distinct values (e.g. source addresses hitting one
+# destination) over the last `time_window` seconds, in fixed memory.
+#
+# One HyperLogLog register array (2^precision bytes) per time slot; add()
+# only raises one register of the current slot and of a running
+# register-wise max over the live slots, which is rebuilt only when a slot
+# expires. estimate() reads the running max and is cached until a register
+# rises, so checking a busy window on every packet stays cheap. Standard
+# error is about 1.04 / sqrt(2^precision): 13% at the default precision
+# of 6.
+
+DEFAULT_PRECISION = 6
+MAX_HLL_SLOTS = 10
+
+POW2 = [2.0 ** -r for r in range(65)]
+
+
+def pick_hll_granularity(time_window):
+    for g in (0.5, 1.0, 5.0, 10.0):
+        if time_window / g <= MAX_HLL_SLOTS:
+            return g
+    return time_window / MAX_HLL_SLOTS
+
+
+class DistinctSketchWindow:
+    __slots__ = ("precision", "m", "granularity", "size", "registers", "merged", "head", "cached")
+
+    def __init__(self, time_window, precision=DEFAULT_PRECISION, granularity=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.setup(time_window, granularity)
+
+    def setup(self, time_window, granularity=None):
+        if granularity is None:
+            granularity = pick_hll_granularity(time_window)
+        self.granularity = granularity
+        self.size = ceil(time_window / granularity) + 1
+        self.registers = bytearray(self.size * self.m)      # slot-major
+        self.merged = bytearray(self.m)     # max over live slots, None after expiry
+        self.head = None
+        self.cached = 0
+
+    def advance(self, slot):
+        head = self.head
+        if head is None:
+            self.head = slot
+            return
+        if slot <= head:
+            return
+
+        m = self.m
+        registers = self.registers
+        for s in range(head + 1, min(slot, head + self.size) + 1):
+            start = (s % self.size) * m
+            registers[start:start + m] = bytes(m)
+        self.head = slot
+        self.merged = None
+        self.cached = None
+
+    # Record `value` at `timestamp`
+    def add(self, timestamp, value):
+        slot = int(timestamp / self.granularity)
+        if slot != self.head:
+            self.advance(slot)
+        if slot <= self.head - self.size:
+            return
+
+        # Register from the top `precision` bits, rank from the rest
+        h = hash64(value)
+        p = self.precision
+        bits = 64 - p
+        rest = h & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+
+        j = h >> bits
+        i = (slot % self.size) * self.m + j
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+            merged = self.merged
+            if merged is not None and rank > merged[j]:
+                merged[j] = rank
+                self.cached = None
+
+    # Distinct values in the window as of the last add (or `timestamp`)
+    def estimate(self, timestamp=None):
+        if timestamp is not None:
+            self.advance(int(timestamp / self.granularity))
+        if self.cached is not None:
+            return self.cached
+
+        m = self.m
+        merged = self.merged
+        if merged is None:
+            merged = self.merged = self.merge()
+
+        total = 0.0
+        zeros = 0
+        for r in merged:
+            total += POW2[r]
+            if not r:
+                zeros += 1
+
+        alpha = 0.673 if m == 16 else 0.697 if m == 32 else 0.709 if m == 64 else 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / total
+        if raw <= 2.5 * m and zeros:
+            raw = m * log(m / zeros)      # small-range (linear counting) correction
+
+        self.cached = round(raw)
+        return self.cached
+
+    # Register-wise max over the live slots
+    def merge(self):
+        m = self.m
+        registers = self.registers
+        return bytearray(map(max, *[registers[start:start + m] for start in range(0, self.size * m, m)]))
+
+    # New time window: all live registers are merged into the newest slot
+    def resize(self, time_window, granularity=None):
+        m, head, old_g = self.m, self.head, self.granularity
+        merged = self.merge()
+
+        self.setup(time_window, granularity)
+        if head is None:
+            return
+        self.head = int(head * old_g / self.granularity + 1e-9)
+        start = (self.head % self.size) * m
+        self.registers[start:start + m] = merged
+        self.merged = merged
+        self.cached = None
+
+    def clear(self):
+        self.registers[:] = bytes(len(self.registers))
+        self.merged = bytearray(self.m)
+        self.cached = 0
+
+
+# ================= SPARSE DISTINCT WINDOW ================= #
+
+# Distinct values over the last `time_window` seconds, kept exactly
+# (value -> last seen) until there are more than SPARSE_VALUES of them,
+# then moved into a DistinctSketchWindow. The many keys that only ever see
+# a few values (normal clients and servers) cost a small dict; the few that
+# see thousands (scanners, flood victims) cost one fixed register array.
+
+SPARSE_VALUES = 16
+
+
+class SparseDistinctWindow:
+    __slots__ = ("time_window", "sparse", "sketch")
+
+    def __init__(self, time_window):
+        self.time_window = time_window
+        self.sparse = {}          # value -> last seen, until it outgrows SPARSE_VALUES
+        self.sketch = None        # DistinctSketchWindow after that
+
+    # Record `value` at `timestamp`
+    def add(self, timestamp, value):
+        sketch = self.sketch
+        if sketch is not None:
+            sketch.add(timestamp, value)
+            return
+
+        sparse = self.sparse
+        sparse[value] = timestamp
+        if len(sparse) > SPARSE_VALUES:
+            self.densify(timestamp)
+
+    def densify(self, timestamp):
+        cutoff = timestamp - self.time_window
+        live = {value: ts for value, ts in self.sparse.items() if ts >= cutoff}
+        if len(live) <= SPARSE_VALUES:
+            self.sparse = live
+            return
+
+        self.sketch = DistinctSketchWindow(self.time_window)
+        for value, ts in sorted(live.items(), key=lambda kv: kv[1]):
+            self.sketch.add(ts, value)
+        self.sparse = {}
+
+    # Cheap per-packet count: the cached sketch estimate, or while sparse an
+    # upper bound that may include expired values
+    def quick_count(self):
+        if self.sketch is not None:
+            return self.sketch.estimate()
+        return len(self.sparse)
+
+    # Distinct values in the window ending at `timestamp`
+    def count(self, timestamp):
+        if self.sketch is not None:
+            return self.sketch.estimate(timestamp)
+        cutoff = timestamp - self.time_window
+        return sum(1 for ts in self.sparse.values() if ts >= cutoff)
+
+    def resize(self, time_window):
+        self.time_window = time_window
+        if self.sketch is not None:
+            self.sketch.resize(time_window)
+
+    def clear(self):
+        self.sparse = {}
+        self.sketch = None
+
+
+# ================= VICTIM WINDOW ================= #
+
+# Per-destination state for victim-centric detection: packets toward the
+# destination and distinct sources sending them, over the same window.
+
+class VictimWindow:
+    __slots__ = ("packets", "sources")
+
+    def __init__(self, time_window):
+        # Same coarse slots as the sketch: victim thresholds are large
+        self.packets = RateWindow(time_window, pick_hll_granularity(time_window))
+        self.sources = SparseDistinctWindow(time_window)
+
+    # Count one packet from `src` and return the in-window packet total
+    def add(self, timestamp, src):
+        self.sources.add(timestamp, src)
+        return self.packets.add(timestamp)
+
+    # Distinct sources in the window ending at `timestamp`
+    def source_count(self, timestamp):
+        return self.sources.count(timestamp)
+
+    def resize(self, time_window):
+        self.packets.resize(time_window, pick_hll_granularity(time_window))
+        self.sources.resize(time_window)
+
+
+# ================= SWEEP WINDOW ================= #
+
+# Per-source state for horizontal and block scan detection: distinct
+# destinations overall and per destination port, over the same window.
+#
+# Most sources only ever probe a few (destination, port) pairs, so those
+# are kept exactly in one small dict, keyed by the packed address and
+# port (`dst << 16 | port`). Past SPARSE_VALUES pairs the source
+# moves to SparseDistinctWindows, and only the `max_ports` most recently
+# probed ports keep a host count: a source costs at most max_ports + 1 of
+# them however many ports and hosts it touches. A vertical scan just
+# cycles the oldest port out; a sweep keeps probing the same port and
+# keeps its count.
+
+MAX_SWEEP_PORTS = 32
+
+
+class SweepWindow:
+    __slots__ = ("time_window", "max_ports", "pairs", "hosts", "ports")
+
+    def __init__(self, time_window, max_ports=MAX_SWEEP_PORTS):
+        self.time_window = time_window
+        self.max_ports = max_ports
+        self.pairs = {}         # dst << 16 | port -> last seen, until it outgrows SPARSE_VALUES
+        self.hosts = None       # SparseDistinctWindow after that
+        self.ports = None       # port -> SparseDistinctWindow, least recent first
+
+    # Record a probe of `dst`:`port`; returns quick (hosts, hosts on port)
+    # counts, upper bounds while exact
+    def add(self, timestamp, dst, port):
+        pairs = self.pairs
+        if pairs is not None:
+            pairs[dst << 16 | port] = timestamp
+            if len(pairs) <= SPARSE_VALUES:
+                return len(pairs), len(pairs)
+            self.densify(timestamp)
+            if self.pairs is not None:
+                return len(self.pairs), len(self.pairs)
+            return self.hosts.quick_count(), self.ports[port].quick_count()
+
+        ports = self.ports
+        window = ports.get(port)
+        if window is None:
+            if len(ports) >= self.max_ports:
+                ports.popitem(last=False)
+            window = ports[port] = SparseDistinctWindow(self.time_window)
+        else:
+            ports.move_to_end(port)
+        hosts = self.hosts
+        hosts.add(timestamp, dst)
+        window.add(timestamp, dst)
+        return hosts.quick_count(), window.quick_count()
+
+    def densify(self, timestamp):
+        cutoff = timestamp - self.time_window
+        live = {pair: ts for pair, ts in self.pairs.items() if ts >= cutoff}
+        if len(live) <= SPARSE_VALUES:
+            self.pairs = live
+            return
+
+        self.pairs = None
+        self.hosts = SparseDistinctWindow(self.time_window)
+        self.ports = OrderedDict()
+        for pair, ts in sorted(live.items(), key=lambda kv: kv[1]):
+            self.add(ts, pair >> 16, pair & 0xFFFF)
+
+    # Distinct destinations in the window ending at `timestamp`
+    def host_count(self, timestamp):
+        if self.pairs is None:
+            return self.hosts.count(timestamp)
+        cutoff = timestamp - self.time_window
+        return len({pair >> 16 for pair, ts in self.pairs.items() if ts >= cutoff})
+
+    # Distinct destinations probed on `port`, 0 if it is not tracked
+    def port_host_count(self, port, timestamp):
+        if self.pairs is None:
+            window = self.ports.get(port)
+            return window.count(timestamp) if window is not None else 0
+        cutoff = timestamp - self.time_window
+        return sum(1 for pair, ts in self.pairs.items() if pair & 0xFFFF == port and ts >= cutoff)
+
+    def resize(self, time_window):
+        self.time_window = time_window
+        if self.pairs is None:
+            self.hosts.resize(time_window)
+            for window in self.ports.values():
+                window.resize(time_window)
+
+    def clear(self):
+        self.pairs = {}
+        self.hosts = None
+        self.ports = None
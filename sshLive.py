@@ -1,13 +1,23 @@
 import subprocess
-import socketio
-from collections import deque
-from datetime import datetime, timezone
+import time
+
+from emitter import LiveEmitter
+from detectors import VictimTracker
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from latency import stamp
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from windows import RateWindow
 
 # CONFIG
 
 THRESHOLD = 20            # SSH packets
 TIME_WINDOW = 10           # seconds
 COOLDOWN = 60             # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
+VICTIM_THRESHOLD = 200   # packets toward one destination in window
+VICTIM_SOURCES = 10      # distinct sources needed for a victim alert
 INTERFACE = "any"
 
 BACKEND_SOCKET_URL = "http://localhost:5001"
@@ -15,36 +25,51 @@ ATTACK_TYPE = "SSH_BRUTE_FORCE"
 
 # SOCKET.IO
 
-sio = socketio.Client(reconnection=True)
+live = LiveEmitter(BACKEND_SOCKET_URL)   # background thread, buffers while backend is down
 
-@sio.event
-def connect():
-    print("Connected to backend Socket.IO server")
+# DATA STRUCTURES
 
-@sio.event
-def disconnect():
-    print("Disconnected from backend Socket.IO server")
+ip_record = HostTable(TIME_WINDOW, MAX_HOSTS)        # { ip: RateWindow }
+last_emitted = HostTable(COOLDOWN, MAX_HOSTS)     # cooldown tracking
 
-try:
-    sio.connect(BACKEND_SOCKET_URL)
-except Exception as e:
-    print("Socket connection failed:", e)
-    exit(1)
+# Per-destination counts and distinct sources (botnet floods)
+victims = VictimTracker({"attack_type": "DISTRIBUTED SSH BRUTE FORCE"}, VICTIM_THRESHOLD, VICTIM_SOURCES,
+                        TIME_WINDOW, COOLDOWN, MAX_HOSTS)
+
+# Hot-reloadable thresholds (heuristics.json, no Mongo here)
+heuristics = HeuristicStore(None, {
+    "ssh": {"threshold": THRESHOLD, "time_window": TIME_WINDOW, "cooldown": COOLDOWN,
+            "victim_threshold": VICTIM_THRESHOLD, "victim_sources": VICTIM_SOURCES}
+})
 
-# DATA STRUCTURES
 
-ip_record = {}        # { ip: deque[timestamps] }
-last_emitted = {}     # cooldown tracking
+# Applies the current heuristics without dropping window state
+def apply_heuristics():
+    global THRESHOLD, TIME_WINDOW, COOLDOWN, VICTIM_THRESHOLD, VICTIM_SOURCES
+    version = heuristics.version
+    config = heuristics.get("ssh")
+    THRESHOLD, TIME_WINDOW, COOLDOWN = config["threshold"], config["time_window"], config["cooldown"]
+    resize_table(ip_record, TIME_WINDOW)
+    last_emitted.idle_ttl = COOLDOWN
+    VICTIM_THRESHOLD, VICTIM_SOURCES = config["victim_threshold"], config["victim_sources"]
+    victims.configure(VICTIM_THRESHOLD, VICTIM_SOURCES, TIME_WINDOW, COOLDOWN)
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # ---------------- TSHARK COMMAND ---------------- #
 
 cmd = [
     "tshark",
     "-i", INTERFACE,
+    "-f", "tcp port 22",
     "-Y", "tcp.port == 22",
     "-T", "fields",
     "-e", "frame.time_epoch",
-    "-e", "ip.src"
+    "-e", "ip.src",
+    "-e", "ip.dst",
+    "-e", "tcp.dstport"
 ]
 
 proc = subprocess.Popen(
@@ -56,56 +81,99 @@ proc = subprocess.Popen(
 
 print("Live SSH IDS started...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("sshLive", hosts=lambda: len(ip_record))
+prof = StageProfiler("sshLive")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # MAIN LOOP
 
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         try:
-            timestamp, ip = line.strip().split()
+            timestamp, ip, dst, dport = line.strip().split()
             timestamp = float(timestamp)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Initialize sliding window for IP
-        if ip not in ip_record:
-            ip_record[ip] = deque()
+        if timer:
+            timer.lap("parse")
 
-        ip_record[ip].append(timestamp)
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
 
-        # Sliding window cleanup
-        while ip_record[ip] and ip_record[ip][0] < timestamp - TIME_WINDOW:
-            ip_record[ip].popleft()
+        # Expire idle hosts (bounded work per packet)
+        ip_record.tick(timestamp)
+        last_emitted.tick(timestamp)
+        victims.tick(timestamp)
 
-        count = len(ip_record[ip])
-        print(f"SSH attempts from {ip} | count={count}")
+        # Initialize sliding window for IP
+        if ip not in ip_record:
+            ip_record[ip] = RateWindow(TIME_WINDOW)
+
+        # Sliding window count
+        count = ip_record[ip].add(timestamp)
+        # Client -> server packets count toward the server
+        victim_count = victims.add(dst, ip, timestamp) if dport == "22" else 0
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"SSH attempts from {ip} | count={count}")
+        if timer:
+            timer.lap("window")
+
+        # VICTIM DETECTION: many sources under the threshold, one destination
+        if victim_count >= VICTIM_THRESHOLD:
+            alert = victims.check(dst, victim_count, timestamp)
+            if alert is not None:
+                stamp(alert, timestamp)     # latency.py: time-to-alert
+                live.emit(alert)
+                print("LIVE ALERT SENT:", alert)
+                stats.alert()
 
         # DETECTION
 
+        alert = None
         if count >= THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_emitted.get(ip)
 
-            if not last_time or (now - last_time).total_seconds() >= COOLDOWN:
+            if not last_time or now - last_time >= COOLDOWN:
                 alert = {
                     "attack_type": ATTACK_TYPE,
                     "ip": ip,
                     "attempts": count,
                     "time_window": TIME_WINDOW,
                     "severity": "High",
-                    "timestamp": now.isoformat(),
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
                     "message": "Possible SSH brute-force attack detected"
                 }
 
-                sio.emit("live_alert", alert)
-                print("LIVE ALERT SENT:", alert)
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
+
+        live.emit(alert)
+        if timer:
+            timer.lap("sink")
+        print("LIVE ALERT SENT:", alert)
+        stats.alert()
 
-                last_emitted[ip] = now
-                ip_record[ip].clear()
+        last_emitted[ip] = now
+        ip_record[ip].clear()
 
 except KeyboardInterrupt:
     print("\nStopping SSH IDS...")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
-    sio.disconnect()
+    live.close()
     print("IDS shutdown complete")
@@ -1,10 +1,18 @@
 import subprocess
-from collections import defaultdict, deque
-from datetime import datetime, timezone
-from pymongo import MongoClient
+import time
 import os
 from dotenv import load_dotenv
 
+from detectors import VictimTracker
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from latency import stamp
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sketches import CountMinWindow, HeavyHitters
+from sinks import MongoAlertWriter, get_client
+from windows import RateWindow
+
 # ENV
 load_dotenv(dotenv_path="/home/manash/Desktop/networkids/python/.env", override=True)
 MONGO_URI = os.getenv("MONGO_URI")
@@ -13,81 +21,209 @@ MONGO_URI = os.getenv("MONGO_URI")
 THRESHOLD = 500          # SYN packets
 TIME_WINDOW = 10        # seconds
 ALERT_COOLDOWN = 60     # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
+VICTIM_THRESHOLD = 5000   # packets toward one destination in window
+VICTIM_SOURCES = 50      # distinct sources needed for a victim alert
 INTERFACE = "any"
-
-# MongoDB
-client = MongoClient(MONGO_URI)
-db = client["alert_db"]
-collection = db["alerts"]
+DST_THRESHOLD = 5000      # SYN packets toward one destination (sketch engine)
+SYN_ENGINE = os.getenv("IDS_SYN_ENGINE", "exact")    # "sketch" for spoofed-source floods
+SKETCH = SYN_ENGINE == "sketch"
 
 # Tracking
-syn_packets = defaultdict(deque)
-last_alert = {}
-
-# TSHARK
-cmd = [
-    "tshark",
-    "-i", INTERFACE,
-    "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
-    "-T", "fields",
-    "-e", "frame.time_epoch",
-    "-e", "ip.src"
-]
-
-proc = subprocess.Popen(
-    cmd,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.DEVNULL,
-    text=True
-)
-
-print("TCP SYN Flood Detection Started...")
-
-# MAIN LOOP
-try:
-    for line in proc.stdout:
-        try:
-            timestamp, ip = line.strip().split()
-            timestamp = float(timestamp)
-        except ValueError:
-            continue
-
-        syn_packets[ip].append(timestamp)
-
-        # Sliding window cleanup
-        while syn_packets[ip] and syn_packets[ip][0] < timestamp - TIME_WINDOW:
-            syn_packets[ip].popleft()
-
-        count = len(syn_packets[ip])
+syn_packets = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: RateWindow(TIME_WINDOW))
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Per-destination counts and distinct sources (botnet floods)
+victims = VictimTracker({"type": "alert", "attack": "Distributed TCP SYN Flood"}, VICTIM_THRESHOLD, VICTIM_SOURCES,
+                        TIME_WINDOW, ALERT_COOLDOWN, MAX_HOSTS)
+
+# Sketch engine: fixed-memory per-source and per-destination counts
+# (sketches.py), so randomized sources cannot grow the tables
+if SKETCH:
+    src_counts = CountMinWindow(TIME_WINDOW)
+    dst_counts = CountMinWindow(TIME_WINDOW)
+    pair_counts = CountMinWindow(TIME_WINDOW)     # (src, dst), to name a victim's top sources
+    top_pairs = HeavyHitters(pair_counts)
+    last_dst_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics(heuristics):
+    global THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN, DST_THRESHOLD, VICTIM_THRESHOLD, VICTIM_SOURCES
+    version = heuristics.version
+    config = heuristics.get("syn")
+    THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN = config["threshold"], config["time_window"], config["cooldown"]
+    DST_THRESHOLD = config["dst_threshold"]
+    resize_table(syn_packets, TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    VICTIM_THRESHOLD, VICTIM_SOURCES = config["victim_threshold"], config["victim_sources"]
+    victims.configure(VICTIM_THRESHOLD, VICTIM_SOURCES, TIME_WINDOW, ALERT_COOLDOWN)
+    if SKETCH:
+        if TIME_WINDOW != src_counts.time_window:
+            src_counts.resize(TIME_WINDOW)
+            dst_counts.resize(TIME_WINDOW)
+            pair_counts.resize(TIME_WINDOW)
+        last_dst_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+# PER-PACKET DETECTION
+# One line of tshark output; alerts go to emit(). bench.py drives this
+# directly, without tshark or Mongo.
+def handle(line, stats, emit, timer=None):
+    try:
+        timestamp, ip, dst = line.strip().split()
+        timestamp = float(timestamp)
+    except ValueError:
+        stats.parse_error()
+        return
+
+    if timer:
+        timer.lap("parse")
+
+    # Expire idle hosts (bounded work per packet)
+    syn_packets.tick(timestamp)
+    last_alert.tick(timestamp)
+    victims.tick(timestamp)
+
+    # Sliding window count
+    if SKETCH:
+        count = src_counts.add(ip, timestamp)
+        dst_count = dst_counts.add(dst, timestamp)
+        top_pairs.offer((ip, dst), pair_counts.add((ip, dst), timestamp))
+        victim_count = 0
+    else:
+        count = syn_packets[ip].add(timestamp)
+        victim_count = victims.add(dst, ip, timestamp)
+    stats.packet(ip, timestamp)
+    if DEBUG:
         print(f"SYN packets from {ip} | count={count}")
+    if timer:
+        timer.lap("window")
+
+    # VICTIM DETECTION: many sources under the threshold, one destination
+    if victim_count >= VICTIM_THRESHOLD:
+        alert = victims.check(dst, victim_count, timestamp)
+        if alert is not None:
+            stamp(alert, timestamp)     # latency.py: time-to-alert
+            emit(alert)
+
+    # AGGREGATE DETECTION (sketch engine): many sources, one victim
+    if SKETCH and dst_count >= DST_THRESHOLD:
+        last_time = last_dst_alert.get(dst)
+        if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+            alert = {
+                "type": "alert",
+                "attack": "Distributed TCP SYN Flood",
+                "ip": dst,
+                "packet_count": dst_count,
+                "top_sources": [{"ip": src, "count": n} for src, n in top_pairs.top_sources(dst, 5)],
+                "timestamp": timestamp,
+                "packet_time": timestamp,       # latency.py: time-to-alert
+                "detected_at": time.time(),
+                "message": f"SYN rate toward {dst} spiked (possible distributed SYN flood)",
+                "status": "unresolved"
+            }
+            emit(alert)
+            last_dst_alert[dst] = timestamp
 
-        if count >= THRESHOLD:
-            now = datetime.now(timezone.utc)
-
-            # Cooldown check
-            if ip in last_alert:
-                if (now - last_alert[ip]).total_seconds() < ALERT_COOLDOWN:
-                    continue
+    alert = None
+    if count >= THRESHOLD:
+        now = timestamp      # packet time, the same clock as the windows
 
+        # Cooldown check
+        if ip not in last_alert or now - last_alert[ip] >= ALERT_COOLDOWN:
             alert = {
                 "type": "alert",
                 "attack": "TCP SYN Flood",
                 "ip": ip,
                 "timestamp": now,
+                "packet_time": timestamp,       # latency.py: time-to-alert
+                "detected_at": time.time(),
                 "message": "High rate of TCP SYN packets detected "
                 "(possible SYN flood attack)",
                 "status": "unresolved"
             }
 
-            collection.insert_one(alert)
-            last_alert[ip] = now
+    # Every packet, alerting or not
+    if timer:
+        timer.lap("detect")
+
+    if alert is None:
+        return
+
+    emit(alert)
+    if timer:
+        timer.lap("sink")
+    last_alert[ip] = timestamp
+
 
-            print("ALERT STORED:", alert)
+# TSHARK
+cmd = [
+    "tshark",
+    "-i", INTERFACE,
+    "-f", "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn",
+    "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
+    "-T", "fields",
+    "-e", "frame.time_epoch",
+    "-e", "ip.src",
+    "-e", "ip.dst"
+]
 
-except KeyboardInterrupt:
-    print("\nStopping TCP SYN Flood Detection...")
 
-finally:
-    proc.terminate()
-    proc.wait()
-    client.close()
+def main():
+    # MongoDB
+    client = get_client(MONGO_URI)
+    db = client["alert_db"]
+    collection = db["alerts"]
+    alert_writer = MongoAlertWriter(collection)   # batched, off the packet loop
+
+    # Hot-reloadable thresholds (Mongo, cached in heuristics.json)
+    heuristics = HeuristicStore(db["heuristics"], {
+        "syn": {"threshold": THRESHOLD, "time_window": TIME_WINDOW, "cooldown": ALERT_COOLDOWN,
+                "dst_threshold": DST_THRESHOLD, "victim_threshold": VICTIM_THRESHOLD,
+                "victim_sources": VICTIM_SOURCES}
+    })
+    heuristic_version = apply_heuristics(heuristics)
+
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+
+    print("TCP SYN Flood Detection Started...")
+
+    # Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+    stats = StatsReporter("tcp_syn", hosts=lambda: len(syn_packets))
+    prof = StageProfiler("tcp_syn")     # IDS_PROFILE=1 or kill -USR1 to enable
+
+    def emit(alert):
+        alert_writer.write(alert)
+        print("ALERT QUEUED:", alert)
+        stats.alert()
+
+    # MAIN LOOP
+    try:
+        for line in proc.stdout:
+            timer = prof.start() if prof.enabled else None
+            if heuristics.version != heuristic_version:
+                heuristic_version = apply_heuristics(heuristics)
+            handle(line, stats, emit, timer)
+
+    except KeyboardInterrupt:
+        print("\nStopping TCP SYN Flood Detection...")
+
+    finally:
+        stats.close()
+        prof.close()
+        heuristics.close()
+        proc.terminate()
+        proc.wait()
+        alert_writer.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
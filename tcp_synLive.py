@@ -1,36 +1,80 @@
 import subprocess
-import socketio
-from collections import defaultdict, deque
-from datetime import datetime, timezone
+import time
+import os
+
+from emitter import LiveEmitter
+from detectors import VictimTracker
+from heuristics import HeuristicStore, resize_table
+from hoststate import HostTable
+from latency import stamp
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from sketches import CountMinWindow, HeavyHitters
+from windows import RateWindow
 
 # CONFIG
 THRESHOLD = 500           # SYN packets
 TIME_WINDOW = 10          # seconds
 ALERT_COOLDOWN = 60       # seconds
+MAX_HOSTS = 100000        # tracked hosts per state table
+VICTIM_THRESHOLD = 5000   # packets toward one destination in window
+VICTIM_SOURCES = 50      # distinct sources needed for a victim alert
 INTERFACE = "any"
+DST_THRESHOLD = 5000      # SYN packets toward one destination (sketch engine)
+SYN_ENGINE = os.getenv("IDS_SYN_ENGINE", "exact")    # "sketch" for spoofed-source floods
+SKETCH = SYN_ENGINE == "sketch"
 ATTACK_TYPE = "TCP_SYN_FLOOD"
 BACKEND_SOCKET_URL = "http://localhost:5001"
 
 # SOCKET.IO CLIENT
-sio = socketio.Client(reconnection=True)
-
-@sio.event
-def connect():
-    print("Connected to backend Socket.IO server")
-
-@sio.event
-def disconnect():
-    print("Disconnected from backend Socket.IO server")
-
-try:
-    sio.connect(BACKEND_SOCKET_URL)
-except Exception as e:
-    print("Unable to connect to backend:", e)
-    exit(1)
+live = LiveEmitter(BACKEND_SOCKET_URL)   # background thread, buffers while backend is down
 
 # TRACKING STRUCTURES
-syn_packets = defaultdict(deque)
-last_alert = {}
+syn_packets = HostTable(TIME_WINDOW, MAX_HOSTS, factory=lambda: RateWindow(TIME_WINDOW))
+last_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Per-destination counts and distinct sources (botnet floods)
+victims = VictimTracker({"attack_type": "DISTRIBUTED_" + ATTACK_TYPE}, VICTIM_THRESHOLD, VICTIM_SOURCES,
+                        TIME_WINDOW, ALERT_COOLDOWN, MAX_HOSTS)
+
+# Sketch engine: fixed-memory per-source and per-destination counts
+# (sketches.py), so randomized sources cannot grow the tables
+if SKETCH:
+    src_counts = CountMinWindow(TIME_WINDOW)
+    dst_counts = CountMinWindow(TIME_WINDOW)
+    pair_counts = CountMinWindow(TIME_WINDOW)     # (src, dst), to name a victim's top sources
+    top_pairs = HeavyHitters(pair_counts)
+    last_dst_alert = HostTable(ALERT_COOLDOWN, MAX_HOSTS)
+
+# Hot-reloadable thresholds (heuristics.json, no Mongo here)
+heuristics = HeuristicStore(None, {
+    "syn": {"threshold": THRESHOLD, "time_window": TIME_WINDOW, "cooldown": ALERT_COOLDOWN,
+            "dst_threshold": DST_THRESHOLD, "victim_threshold": VICTIM_THRESHOLD,
+            "victim_sources": VICTIM_SOURCES}
+})
+
+
+# Applies the current heuristics without dropping window state
+def apply_heuristics():
+    global THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN, DST_THRESHOLD, VICTIM_THRESHOLD, VICTIM_SOURCES
+    version = heuristics.version
+    config = heuristics.get("syn")
+    THRESHOLD, TIME_WINDOW, ALERT_COOLDOWN = config["threshold"], config["time_window"], config["cooldown"]
+    DST_THRESHOLD = config["dst_threshold"]
+    resize_table(syn_packets, TIME_WINDOW)
+    last_alert.idle_ttl = ALERT_COOLDOWN
+    VICTIM_THRESHOLD, VICTIM_SOURCES = config["victim_threshold"], config["victim_sources"]
+    victims.configure(VICTIM_THRESHOLD, VICTIM_SOURCES, TIME_WINDOW, ALERT_COOLDOWN)
+    if SKETCH:
+        if TIME_WINDOW != src_counts.time_window:
+            src_counts.resize(TIME_WINDOW)
+            dst_counts.resize(TIME_WINDOW)
+            pair_counts.resize(TIME_WINDOW)
+        last_dst_alert.idle_ttl = ALERT_COOLDOWN
+    return version
+
+
+heuristic_version = apply_heuristics()
 
 # TSHARK COMMAND
 cmd = [
@@ -38,11 +82,13 @@ cmd = [
     "-n",
     "-l",
     "-i", INTERFACE,
+    "-f", "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn",
     "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
     "-T", "fields",
     "-E", "separator=,",
     "-e", "frame.time_epoch",
-    "-e", "ip.src"
+    "-e", "ip.src",
+    "-e", "ip.dst"
 ]
 
 proc = subprocess.Popen(
@@ -55,58 +101,125 @@ proc = subprocess.Popen(
 
 print("Live TCP SYN Flood IDS started (Socket.IO only)...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("tcp_synLive", hosts=lambda: len(syn_packets))
+prof = StageProfiler("tcp_synLive")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # MAIN LOOP
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         parts = line.strip().split(",")
-        if len(parts) != 2:
+        if len(parts) != 3:
             continue
 
         try:
             timestamp = float(parts[0])
-            ip = parts[1]
+            ip, dst = parts[1], parts[2]
         except ValueError:
+            stats.parse_error()
             continue
 
-        syn_packets[ip].append(timestamp)
-
-        # Sliding window cleanup
-        while syn_packets[ip] and syn_packets[ip][0] < timestamp - TIME_WINDOW:
-            syn_packets[ip].popleft()
-
-        count = len(syn_packets[ip])
-        print(f"SYN packets from {ip} | count={count}")
+        if timer:
+            timer.lap("parse")
+
+        if heuristics.version != heuristic_version:
+            heuristic_version = apply_heuristics()
+
+        # Expire idle hosts (bounded work per packet)
+        syn_packets.tick(timestamp)
+        last_alert.tick(timestamp)
+        victims.tick(timestamp)
+
+        # Sliding window count
+        if SKETCH:
+            count = src_counts.add(ip, timestamp)
+            dst_count = dst_counts.add(dst, timestamp)
+            top_pairs.offer((ip, dst), pair_counts.add((ip, dst), timestamp))
+            victim_count = 0
+        else:
+            count = syn_packets[ip].add(timestamp)
+            victim_count = victims.add(dst, ip, timestamp)
+        stats.packet(ip, timestamp)
+        if DEBUG:
+            print(f"SYN packets from {ip} | count={count}")
+        if timer:
+            timer.lap("window")
+
+        # VICTIM DETECTION: many sources under the threshold, one destination
+        if victim_count >= VICTIM_THRESHOLD:
+            alert = victims.check(dst, victim_count, timestamp)
+            if alert is not None:
+                stamp(alert, timestamp)     # latency.py: time-to-alert
+                live.emit(alert)
+                print("LIVE ALERT SENT:", alert)
+                stats.alert()
+
+        # AGGREGATE DETECTION (sketch engine): many sources, one victim
+        if SKETCH and dst_count >= DST_THRESHOLD:
+            last_time = last_dst_alert.get(dst)
+            if not last_time or timestamp - last_time >= ALERT_COOLDOWN:
+                alert = {
+                    "attack_type": "DISTRIBUTED_" + ATTACK_TYPE,
+                    "ip": dst,
+                    "packet_count": dst_count,
+                    "top_sources": [{"ip": src, "count": n} for src, n in top_pairs.top_sources(dst, 5)],
+                    "timestamp": timestamp,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": f"SYN rate toward {dst} spiked (possible distributed SYN flood)",
+                    "status": "unresolved"
+                }
+                live.emit(alert)
+                print("LIVE ALERT SENT:", alert)
+                stats.alert()
+                last_dst_alert[dst] = timestamp
 
         # DETECTION
+        alert = None
         if count >= THRESHOLD:
-            now = datetime.now(timezone.utc)
+            now = timestamp      # packet time, the same clock as the windows
             last_time = last_alert.get(ip)
 
             # Cooldown check
-            if last_time and (now - last_time).total_seconds() < ALERT_COOLDOWN:
-                continue
-
-            alert = {
-                "attack_type": ATTACK_TYPE,
-                "ip": ip,
-                "packet_count": count,
-                "timestamp": now.isoformat(),
-                "message": "High rate of TCP SYN packets detected (possible SYN flood attack)",
-                "status": "unresolved"
-            }
-
-            # Emit live alert only
-            sio.emit("live_alert", alert)
-            print("LIVE ALERT SENT:", alert)
-
-            last_alert[ip] = now
+            if not last_time or now - last_time >= ALERT_COOLDOWN:
+                alert = {
+                    "attack_type": ATTACK_TYPE,
+                    "ip": ip,
+                    "packet_count": count,
+                    "timestamp": now,
+                    "packet_time": timestamp,       # latency.py: time-to-alert
+                    "detected_at": time.time(),
+                    "message": "High rate of TCP SYN packets detected (possible SYN flood attack)",
+                    "status": "unresolved"
+                }
+
+        # Every packet, alerting or not
+        if timer:
+            timer.lap("detect")
+
+        if alert is None:
+            continue
+
+        # Emit live alert only
+        live.emit(alert)
+        if timer:
+            timer.lap("sink")
+        print("LIVE ALERT SENT:", alert)
+        stats.alert()
+
+        last_alert[ip] = timestamp
+        if not SKETCH:
             syn_packets[ip].clear()
 
 except KeyboardInterrupt:
     print("\nStopping TCP SYN Flood IDS...")
 
 finally:
+    stats.close()
+    prof.close()
+    heuristics.close()
     proc.terminate()
     proc.wait()
-    sio.disconnect()
+    live.close()
     print("IDS shutdown complete")
\ No newline at end of file
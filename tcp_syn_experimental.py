@@ -1,39 +1,42 @@
 import subprocess
-import csv
-from collections import deque
-from datetime import datetime, timezone
+
+from datasets import open_dataset
+from hoststate import HostTable
+from profiler import StageProfiler
+from reporter import DEBUG, StatsReporter
+from windows import RateWindow
 
 # ================= CONFIG ================= #
 
 INTERFACE = "any"
 TIME_WINDOW = 1              # seconds
 THRESHOLD = 500               # SYN packets per IP
+MAX_HOSTS = 100000        # tracked hosts per state table
 ATTACK_TYPE = "TCP_SYN_FLOOD"
 
 CSV_FILE = "tcp_syn_dataset.csv"
+DATASET_FORMAT = "csv"   # "csv" or "columnar" (typed arrays, see datasets.py)
 
 # ========================================= #
 
 # STATE TRACKING
-ip_record = {}
-attack_state = {}
+ip_record = HostTable(TIME_WINDOW, MAX_HOSTS)
+attack_state = HostTable(TIME_WINDOW, MAX_HOSTS)
 
 # ================= CSV SETUP ================= #
 
-with open(CSV_FILE, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "timestamp",
-        "src_ip",
-        "dst_ip",
-        "ip_len",
-        "ttl",
-        "src_port",
-        "dst_port",
-        "tcp_seq",
-        "packet_count",
-        "label"
-    ])
+dataset = open_dataset(CSV_FILE, [
+    "timestamp",
+    "src_ip",
+    "dst_ip",
+    "ip_len",
+    "ttl",
+    "src_port",
+    "dst_port",
+    "tcp_seq",
+    "packet_count",
+    "label"
+], format=DATASET_FORMAT, truncate=True)
 
 # ================= TSHARK ================= #
 
@@ -42,6 +45,7 @@ cmd = [
     "-n",
     "-l",
     "-i", INTERFACE,
+    "-f", "tcp[tcpflags] & (tcp-syn|tcp-ack) = tcp-syn",
     "-Y", "tcp.flags.syn == 1 && tcp.flags.ack == 0",
     "-T", "fields",
     "-E", "separator=,",
@@ -65,10 +69,15 @@ proc = subprocess.Popen(
 
 print("TCP SYN Flood IDS started (stateful CSV logging)...")
 
+# Periodic summary instead of per-packet output (IDS_DEBUG=1 for traces)
+stats = StatsReporter("tcp_syn_experimental", hosts=lambda: len(ip_record))
+prof = StageProfiler("tcp_syn_experimental")     # IDS_PROFILE=1 or kill -USR1 to enable
+
 # ================= MAIN LOOP ================= #
 
 try:
     for line in proc.stdout:
+        timer = prof.start() if prof.enabled else None
         fields = line.strip().split(",")
 
         if len(fields) < 8:
@@ -88,19 +97,25 @@ try:
         try:
             timestamp = float(frame_time)
         except ValueError:
+            stats.parse_error()
             continue
 
-        # Initialize sliding window
-        if src_ip not in ip_record:
-            ip_record[src_ip] = deque()
+        if timer:
+            timer.lap("parse")
 
-        ip_record[src_ip].append(timestamp)
+        # Expire idle hosts (bounded work per packet)
+        ip_record.tick(timestamp)
+        attack_state.tick(timestamp)
 
-        # Sliding window cleanup
-        while ip_record[src_ip] and ip_record[src_ip][0] < timestamp - TIME_WINDOW:
-            ip_record[src_ip].popleft()
+        # Initialize sliding window
+        if src_ip not in ip_record:
+            ip_record[src_ip] = RateWindow(TIME_WINDOW)
 
-        packet_count = len(ip_record[src_ip])
+        # Sliding window count
+        packet_count = ip_record[src_ip].add(timestamp)
+        stats.packet(src_ip, timestamp)
+        if timer:
+            timer.lap("window")
 
         # =========================
         # STATEFUL RATE-BASED LABELING
@@ -113,28 +128,35 @@ try:
 
         label = ATTACK_TYPE if attack_state[src_ip] else "NORMAL"
 
+        if timer:
+            timer.lap("detect")
+
         # WRITE TO CSV
-        with open(CSV_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now(timezone.utc).isoformat(),
-                src_ip,
-                dst_ip,
-                ip_len,
-                ttl,
-                src_port,
-                dst_port,
-                tcp_seq,
-                packet_count,
-                label
-            ])
-
-        print(f"[{label}] {src_ip}:{src_port} → {dst_ip}:{dst_port} | count={packet_count}")
+        dataset.write_row([
+            frame_time,       # packet time (epoch seconds)
+            src_ip,
+            dst_ip,
+            ip_len,
+            ttl,
+            src_port,
+            dst_port,
+            tcp_seq,
+            packet_count,
+            label
+        ])
+        if timer:
+            timer.lap("sink")
+
+        if DEBUG:
+            print(f"[{label}] {src_ip}:{src_port} → {dst_ip}:{dst_port} | count={packet_count}")
 
 except KeyboardInterrupt:
     print("\nStopping TCP SYN IDS...")
 
 finally:
+    stats.close()
+    prof.close()
     proc.terminate()
     proc.wait()
+    dataset.close()
     print("IDS shutdown complete")
@@ -0,0 +1,114 @@
+from hoststate import BindingTable, HostTable
+from timerwheel import TimerWheel
+
+# Each table gets its own wheel with 1 s buckets; a timer comes due in the
+# bucket after its deadline, so a host idle for `idle_ttl` goes within one
+# more second.
+
+
+def table(idle_ttl, max_hosts=1000, **kwargs):
+    return HostTable(idle_ttl, max_hosts, wheel=TimerWheel(granularity=1), **kwargs)
+
+
+def test_expires_at_the_deadline():
+    hosts = table(10)
+    hosts.tick(0.5)
+    hosts["a"] = 1
+
+    for now in range(1, 11):
+        hosts.tick(now)
+    assert "a" in hosts
+
+    hosts.tick(11)
+    assert "a" not in hosts
+    assert hosts.stats() == {"hosts": 0, "expired": 1, "evicted": 0}
+
+
+def test_refreshed_host_is_kept():
+    hosts = table(10, factory=int)
+    hosts.tick(0.5)
+    hosts["a"] = 1
+
+    hosts.tick(5)
+    assert hosts["a"] == 1          # touched: now due at 15
+    for now in range(6, 16):
+        hosts.tick(now)
+    assert "a" in hosts
+    assert hosts.expired == 0
+
+    hosts.tick(16)
+    assert "a" not in hosts
+
+
+def test_peek_does_not_refresh():
+    hosts = table(10)
+    hosts.tick(0.5)
+    hosts["a"] = 1
+
+    hosts.tick(5)
+    assert hosts.peek("a") == 1
+    hosts.tick(11)
+    assert "a" not in hosts
+
+
+def test_reused_slot_keeps_one_timer():
+    hosts = table(10)
+    hosts.tick(0.5)
+    hosts["a"] = 1
+    hosts.tick(1)
+    del hosts["a"]
+
+    # "b" takes the freed slot and its timer, still due at 11
+    hosts.tick(9)
+    hosts["b"] = 2
+    assert hosts.wheel.pending == 1
+
+    hosts.tick(11)
+    assert "b" in hosts             # the stale timer found it fresh
+    assert hosts.wheel.pending == 1
+    for now in range(12, 20):
+        hosts.tick(now)
+    assert "b" in hosts
+
+    hosts.tick(20)
+    assert "b" not in hosts
+    assert hosts.wheel.pending == 0
+
+
+def test_flood_at_the_host_cap_keeps_timers_bounded():
+    hosts = table(60, max_hosts=100, factory=int)
+    for i in range(20000):
+        hosts.tick(1 + i * 0.001)
+        hosts[i] += 1
+
+    assert len(hosts) == 100
+    assert hosts.evicted == 19900
+    assert len(hosts.keys) == 100
+    assert hosts.wheel.pending <= 100
+
+
+def test_clock_eviction_spares_touched_hosts():
+    hosts = table(60, max_hosts=4)
+    hosts.tick(1)
+    for key in "abcd":
+        hosts[key] = 0
+
+    hosts.evict()                   # a full pass clears the referenced bits
+    hosts["e"] = 0
+    hosts.get("b")
+    hosts["f"] = 0
+    assert "b" in hosts
+    assert len(hosts) == 4
+
+
+def test_bindings_pruned_while_the_address_stays_active():
+    bindings = BindingTable(10, wheel=TimerWheel(granularity=1))
+    bindings.tick(0.5)
+    bindings.bind("ip", "mac1", 0.5)
+
+    for now in range(1, 25):
+        bindings.tick(now)
+        bindings.bind("ip", "mac2", now)
+
+    assert bindings.live("ip", 24) == 1
+    assert list(bindings.hosts.peek("ip")) == ["mac2"]
@@ -0,0 +1,157 @@
+import io
+import struct
+
+import pytest
+
+from addresses import pack_ip
+from pcapstream import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, PcapError, read_packets
+
+# Small captures built in memory: a TCP SYN, an ICMP echo request and an
+# ARP reply, framed as pcap (both byte orders, us and ns) and pcapng.
+
+SRC, DST = "10.0.0.1", "192.168.1.20"
+MAC = 0x0200_0000_0001
+TS = 1700000000.25
+
+
+def ipv4(proto, payload, frag=0):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 1, frag, 64, proto, 0,
+                       pack_ip(SRC).to_bytes(4, "big"), pack_ip(DST).to_bytes(4, "big")) + payload
+
+
+def ethernet(ethertype, payload, vlan=False):
+    head = b"\xff" * 6 + MAC.to_bytes(6, "big")
+    if vlan:
+        head += struct.pack("!HH", 0x8100, 7)
+    return head + struct.pack("!H", ethertype) + payload
+
+
+def tcp_syn(sport=40000, dport=22):
+    return ethernet(0x0800, ipv4(6, struct.pack("!HHIIHHHH", sport, dport, 0, 0, 0x5002, 1024, 0, 0)))
+
+
+def icmp_echo():
+    return ethernet(0x0800, ipv4(1, struct.pack("!BBHHH", 8, 0, 0, 1, 1)))
+
+
+def arp_reply():
+    body = struct.pack("!HHBBH", 1, 0x0800, 6, 4, 2)
+    body += MAC.to_bytes(6, "big") + pack_ip(SRC).to_bytes(4, "big")
+    body += b"\x00" * 6 + pack_ip(DST).to_bytes(4, "big")
+    return ethernet(0x0806, body)
+
+
+FRAMES = [tcp_syn(), icmp_echo(), arp_reply()]
+
+
+def pcap(frames, endian="<", nanos=False, linktype=LINKTYPE_ETHERNET):
+    magic = 0xa1b23c4d if nanos else 0xa1b2c3d4
+    out = struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)
+    for i, frame in enumerate(frames):
+        ts = TS + i
+        sec = int(ts)
+        frac = round((ts - sec) * (1e9 if nanos else 1e6))
+        out += struct.pack(endian + "IIII", sec, frac, len(frame), len(frame)) + frame
+    return out
+
+
+def block(endian, block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    total = len(body) + 12
+    return struct.pack(endian + "II", block_type, total) + body + struct.pack(endian + "I", total)
+
+
+def pcapng(frames, endian="<", tsresol=None):
+    out = block(endian, 0x0A0D0D0A, struct.pack(endian + "IHHq", 0x1A2B3C4D, 1, 0, -1))
+
+    options = b""
+    if tsresol is not None:
+        options = struct.pack(endian + "HHB3x", 9, 1, tsresol) + struct.pack(endian + "HH", 0, 0)
+    out += block(endian, 0x00000001, struct.pack(endian + "HHI", LINKTYPE_ETHERNET, 0, 65535) + options)
+
+    scale = 10 ** (tsresol if tsresol is not None else 6)
+    for i, frame in enumerate(frames):
+        units = round((TS + i) * scale)
+        out += block(endian, 0x00000006, struct.pack(endian + "IIIII", 0, units >> 32, units & 0xFFFFFFFF,
+                                                      len(frame), len(frame)) + frame)
+    return out
+
+
+def decoded(capture):
+    return list(read_packets(io.BytesIO(capture)))
+
+
+def check(packets, step=1.0):
+    syn, echo, arp = packets
+
+    assert syn.ts == pytest.approx(TS, abs=1e-6)
+    assert (syn.proto, syn.src, syn.dst, syn.sport, syn.dport, syn.flags) == \
+        ("tcp", pack_ip(SRC), pack_ip(DST), 40000, 22, 0x002)
+
+    assert echo.ts == pytest.approx(TS + step, abs=1e-6)
+    assert (echo.proto, echo.src, echo.dst, echo.icmp_type) == ("icmp", pack_ip(SRC), pack_ip(DST), 8)
+
+    assert (arp.proto, arp.src, arp.arp_op, arp.mac) == ("arp", pack_ip(SRC), 2, MAC)
+
+
+def test_pcap_little_endian():
+    check(decoded(pcap(FRAMES)))
+
+
+def test_pcap_big_endian():
+    check(decoded(pcap(FRAMES, endian=">")))
+
+
+def test_pcap_nanosecond_magic():
+    packets = decoded(pcap(FRAMES, nanos=True))
+    check(packets)
+    assert packets[0].ts == pytest.approx(TS, abs=1e-9)
+
+    check(decoded(pcap(FRAMES, endian=">", nanos=True)))
+
+
+def test_pcapng_enhanced_packet_blocks():
+    check(decoded(pcapng(FRAMES)))
+    check(decoded(pcapng(FRAMES, endian=">")))
+
+
+def test_pcapng_interface_tsresol():
+    check(decoded(pcapng(FRAMES, tsresol=9)))
+    check(decoded(pcapng(FRAMES, endian=">", tsresol=3)))
+
+
+def test_truncated_trailing_record():
+    capture = pcap(FRAMES)
+    packets = read_packets(io.BytesIO(capture[:-10]))
+    assert next(packets).proto == "tcp"
+    assert next(packets).proto == "icmp"
+    with pytest.raises(PcapError):
+        next(packets)
+
+    # Cut at a record boundary: a clean end of stream
+    assert [p.proto for p in decoded(capture[:-len(FRAMES[-1]) - 16])] == ["tcp", "icmp"]
+
+
+def test_truncated_pcapng_block():
+    capture = pcapng(FRAMES)
+    with pytest.raises(PcapError):
+        decoded(capture[:-6])
+
+
+def test_vlan_sll_and_skipped_frames():
+    vlan = ethernet(0x0800, ipv4(1, struct.pack("!BBHHH", 8, 0, 0, 1, 1)), vlan=True)
+    fragment = ethernet(0x0800, ipv4(6, b"\x00" * 20, frag=185))
+    udp = ethernet(0x0800, ipv4(17, b"\x00" * 8))
+    packets = decoded(pcap([vlan, fragment, udp, tcp_syn(dport=80)]))
+    assert [(p.proto, p.dport) for p in packets] == [("icmp", 0), ("tcp", 80)]
+
+    # Linux cooked capture: 16-byte header, ethertype last
+    sll = struct.pack("!HHH8sH", 0, 1, 6, b"\x00" * 8, 0x0800) + ipv4(1, struct.pack("!BBHHH", 8, 0, 0, 1, 1))
+    (echo,) = decoded(pcap([sll], linktype=LINKTYPE_LINUX_SLL))
+    assert (echo.proto, echo.icmp_type) == ("icmp", 8)
+
+
+def test_not_a_capture():
+    with pytest.raises(PcapError):
+        decoded(b"hello world")
+    assert decoded(b"") == []
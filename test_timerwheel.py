@@ -0,0 +1,131 @@
+from timerwheel import TimerWheel
+
+# Wheels with 1 s buckets, so bucket boundaries fall on whole seconds.
+
+
+class Owner:
+
+    def __init__(self):
+        self.deadlines = {}
+        self.calls = []         # (key, now) for every expire()
+        self.expired = {}       # key -> time it was dropped
+
+    def add(self, wheel, key, deadline):
+        self.deadlines[key] = deadline
+        wheel.schedule(deadline, self, key)
+
+    def expire(self, key, now):
+        self.calls.append((key, now))
+        deadline = self.deadlines[key]
+        if deadline >= now:
+            return deadline
+        self.expired[key] = now
+        return None
+
+
+def test_fires_in_the_bucket_after_the_deadline():
+    wheel = TimerWheel(granularity=1)
+    owner = Owner()
+    wheel.advance(0.5)
+    owner.add(wheel, "a", 3.5)
+
+    for now in (1, 2, 3, 3.5, 3.9):
+        wheel.advance(now)
+    assert owner.calls == []
+
+    wheel.advance(4)
+    assert owner.expired == {"a": 4}
+    assert wheel.pending == 0
+
+
+def test_refreshed_key_is_rescheduled_not_dropped():
+    wheel = TimerWheel(granularity=1)
+    owner = Owner()
+    wheel.advance(0.5)
+    owner.add(wheel, "a", 3)
+
+    owner.deadlines["a"] = 10       # touched since: the owner hands back its new deadline
+    for now in range(1, 11):
+        wheel.advance(now)
+    assert owner.calls == [("a", 4)]
+    assert "a" not in owner.expired
+    assert wheel.rescheduled == 1
+    assert wheel.pending == 1
+
+    wheel.advance(11)
+    assert owner.expired == {"a": 11}
+
+
+def test_cascades_from_level_1_to_level_0():
+    wheel = TimerWheel(granularity=1, slots=4, levels=3)
+    owner = Owner()
+    wheel.advance(0.5)
+    owner.add(wheel, "a", 10)       # bucket 11: past level 0 (4 buckets), so level 1
+    assert wheel.filed[:2] == [0, 1]
+
+    for now in range(1, 9):
+        wheel.advance(now)
+    # Level-1 bucket [8, 12) came due at 8 and filed the key on level 0
+    assert owner.calls == [("a", 8)]
+    assert wheel.filed[:2] == [1, 0]
+
+    for now in (9, 10):
+        wheel.advance(now)
+    assert owner.expired == {}
+    wheel.advance(11)
+    assert owner.expired == {"a": 11}
+
+
+def test_jumps_over_empty_levels():
+    wheel = TimerWheel(granularity=0.1, max_steps=8)
+    owner = Owner()
+    wheel.advance(0.05)
+    owner.add(wheel, "a", 1000)     # 10000 level-0 buckets away, on level 2
+    assert wheel.filed == [0, 0, 1, 0]
+
+    # Far more buckets than max_steps, but the empty levels are skipped:
+    # the key cascades down and the wheel catches up in one packet
+    wheel.advance(999)
+    assert wheel.tick == 9990
+    assert wheel.filed == [1, 0, 0, 0]
+    assert owner.expired == {}
+
+    for i in range(9991, 10010):
+        wheel.advance(i / 10)
+    assert 1000 < owner.expired["a"] <= 1000.2
+
+
+def test_carries_steps_past_max_steps_to_the_next_packet():
+    wheel = TimerWheel(granularity=1, max_steps=4)
+    owner = Owner()
+    wheel.advance(0.5)
+    for i in range(20):
+        owner.add(wheel, i, i + 0.5)    # one key per level-0 bucket, no jumps
+
+    wheel.advance(30)
+    assert sorted(owner.expired) == [0, 1, 2, 3]
+    assert wheel.tick == 4
+
+    wheel.advance(30.5)
+    assert sorted(owner.expired) == list(range(8))
+
+    for i in range(4):
+        wheel.advance(31 + i)
+    assert sorted(owner.expired) == list(range(20))
+    assert wheel.pending == 0
+
+
+def test_spreads_a_burst_over_max_work():
+    wheel = TimerWheel(granularity=1, max_work=10)
+    owner = Owner()
+    wheel.advance(0.5)
+    for i in range(25):
+        owner.add(wheel, i, 2)
+
+    wheel.advance(3)
+    assert len(owner.expired) == 10
+    assert wheel.stats()["due"] == 15
+    wheel.advance(3.1)
+    wheel.advance(3.2)
+    assert len(owner.expired) == 25
+    assert wheel.stats()["due"] == 0
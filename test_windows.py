@@ -0,0 +1,158 @@
+import random
+
+from windows import SMALL_PORTS, DistinctWindow, RateWindow
+
+# Windows against brute force over random timestamps. Late packets are at
+# most JITTER seconds behind the newest one.
+
+JITTER = 0.5
+
+
+def timestamps(rng, n, rate, jitter=0.0):
+    now = 1000.0
+    out = []
+    for _ in range(n):
+        now += rng.expovariate(rate)
+        out.append(now - rng.uniform(0, jitter))
+    return out
+
+
+# Every packet whose slot is among the `size` newest, as RateWindow buckets them
+def slot_count(window, slots):
+    head = max(slots)
+    return sum(1 for s in slots if s > head - window.size)
+
+
+def test_rate_window_matches_brute_force():
+    rng = random.Random(1)
+    for time_window, rate in ((1, 50), (5, 20), (10, 3), (60, 1)):
+        for jitter in (0.0, JITTER):
+            window = RateWindow(time_window)
+            seen, slots = [], []
+            for ts in timestamps(rng, 1500, rate, jitter):
+                total = window.add(ts)
+                seen.append(ts)
+                slots.append(int(ts / window.granularity))
+
+                assert total == slot_count(window, slots)
+                # Never short of the window, never a whole slot past its edge slot
+                newest = max(seen)
+                assert total >= sum(1 for t in seen if newest - time_window <= t <= newest)
+                assert total <= sum(1 for t in seen if t > newest - time_window - 2 * window.granularity)
+
+
+def test_rate_window_count_expires_without_adding():
+    window = RateWindow(10)
+    for i in range(100):
+        window.add(1000.0 + i * 0.05)
+    assert window.count(1005.0) == 100
+    assert window.count(1012.0) == 60       # 0.2 s slots: packets from 1002.0 on
+    assert window.count(1100.0) == 0
+
+
+def test_rate_window_allocates_the_ring_on_a_second_slot():
+    window = RateWindow(10)
+    for _ in range(5):
+        window.add(1000.01)
+    assert window.counts is None
+    assert window.total == 5
+
+    window.add(1001.0)
+    assert window.counts is not None
+    assert window.total == 6
+
+    # A gap longer than the window empties the ring in place
+    counts = window.counts
+    assert window.add(1100.0) == 1
+    assert window.counts is counts
+
+
+def test_rate_window_late_packet_allocates_the_ring():
+    window = RateWindow(10)
+    window.add(1005.0)
+    window.add(1005.0)
+    assert window.add(1003.0) == 3          # an earlier slot, still in the window
+    assert window.counts is not None
+    assert window.add(990.0) == 3           # out of the window: dropped
+    assert window.count(1014.0) == 2        # 0.1 s slots: 1004.0 on
+    assert window.count(1016.0) == 0
+
+
+def test_rate_window_resize_keeps_in_window_counts():
+    rng = random.Random(2)
+    window = RateWindow(10)
+    seen = timestamps(rng, 2000, 100)
+    for ts in seen:
+        window.add(ts)
+
+    newest = seen[-1]
+    window.resize(5)
+    total = window.count(newest)
+    assert total >= sum(1 for t in seen if newest - 5 <= t)
+    assert total <= sum(1 for t in seen if newest - 5 - 2 * window.granularity < t)
+
+
+# Ports whose last sighting is within `time_window` of `cutoff_at`
+def live_ports(last_seen, cutoff_at, time_window):
+    return {port for port, t in last_seen.items() if t >= cutoff_at - time_window}
+
+
+def test_distinct_window_matches_brute_force():
+    rng = random.Random(3)
+    for time_window, ports in ((1, 10), (5, 40), (10, 2000)):
+        window = DistinctWindow(time_window)
+        last_seen = {}
+        for ts in timestamps(rng, 5000, 50):
+            port = rng.randrange(ports)
+            distinct = window.add(ts, port)
+            last_seen[port] = ts
+
+            assert distinct == len(window)
+            assert set(window.values()) == live_ports(last_seen, ts, time_window)
+
+
+def test_distinct_window_with_late_packets():
+    rng = random.Random(4)
+    for time_window, ports in ((1, 10), (5, 40), (10, 2000)):
+        window = DistinctWindow(time_window)
+        last_seen = {}
+        newest = 0.0
+        for ts in timestamps(rng, 5000, 50, JITTER):
+            port = rng.randrange(ports)
+            window.add(ts, port)
+            last_seen[port] = max(ts, last_seen.get(port, 0.0))
+            newest = max(newest, ts)
+
+            # A late packet never shortens a port's stay, and expiry lags
+            # by at most the jitter
+            values = set(window.values())
+            assert values >= live_ports(last_seen, newest, time_window)
+            assert values <= live_ports(last_seen, ts, time_window + JITTER)
+
+
+def test_distinct_window_switches_to_a_dict():
+    window = DistinctWindow(10)
+    for port in range(SMALL_PORTS):
+        window.add(1000.0 + port * 0.1, port)
+    assert window.last_seen is None
+    assert window.ports.typecode == "H"
+
+    assert window.add(1002.0, 65535) == SMALL_PORTS + 1
+    assert window.last_seen is not None
+    assert list(window.values())[-1] == 65535
+
+    # The switch keeps last-seen order, so expiry still pops the oldest
+    assert window.add(1010.55, 1) == SMALL_PORTS - 4
+    assert 0 not in window.values()
+
+    window.clear()
+    assert window.add(1020.0, 80) == 1
+    assert window.last_seen is None
+
+
+def test_distinct_window_stays_small_when_old_ports_expire():
+    window = DistinctWindow(1)
+    for i in range(200):
+        window.add(1000.0 + i * 0.1, i)     # one new port every 0.1 s, ~11 live
+    assert window.last_seen is None
+    assert len(window) == 11
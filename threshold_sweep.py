@@ -0,0 +1,272 @@
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from datasets import COLUMNAR_SUFFIX, load_columnar, parse_timestamp
+
+# Offline threshold tuning for the labelled datasets.
+#
+# Recomputes the per-source sliding-window packet count (SSH / SYN / ICMP)
+# or distinct destination port count (port scan) for many TIME_WINDOW
+# values, then reports for every THRESHOLD how many packets, sources and
+# alert episodes that setting would have produced, next to the label the
+# capture was recorded with.
+#
+#   python threshold_sweep.py tcp_syn_dataset.csv --windows 1,5,10 --thresholds 100,250,500
+#   python threshold_sweep.py port_scan.cols --metric distinct --windows 5,10 --thresholds 10,15,20
+#
+# With --relabel WINDOW,THRESHOLD a copy of a CSV dataset is written with the
+# count column and label recomputed for that setting:
+#
+#   python threshold_sweep.py port_scan.csv --relabel 10,20 -o port_scan_w10_t20.csv
+#
+# Everything is vectorised: rows are sorted by (source, time) once and each
+# window is a handful of searchsorted calls over the whole dataset.
+
+US = 1_000_000      # timestamps are compared as integer microseconds
+
+
+# ================= LOADING ================= #
+
+def load_dataset(path):
+    if path.endswith(COLUMNAR_SUFFIX) or os.path.isdir(path):
+        data, labels = load_columnar(path)
+        label = np.asarray(labels, dtype=object)[data["label"]] if labels else None
+        return {
+            "timestamp": data["timestamp"],
+            "src_ip": data["src_ip"],
+            "dst_port": data.get("dst_port"),
+            "label": label,
+            "has_ports": "dst_port" in data,
+            "has_distinct": "unique_port_count" in data,
+        }
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        idx = {name: i for i, name in enumerate(header)}
+        rows = [row for row in reader if len(row) == len(header)]
+
+    has_ports = "dst_port" in idx
+    return {
+        "timestamp": np.array([parse_timestamp(r[idx["timestamp"]]) for r in rows], dtype=np.float64),
+        "src_ip": np.array([r[idx["src_ip"]] for r in rows], dtype=object),
+        "dst_port": np.array([int(r[idx["dst_port"]] or 0) for r in rows], dtype=np.int64) if has_ports else None,
+        "label": np.array([r[idx["label"]] for r in rows], dtype=object) if "label" in idx else None,
+        "has_ports": has_ports,
+        "has_distinct": "unique_port_count" in idx,
+        "header": header,
+        "rows": rows,
+    }
+
+
+# ================= PREPARATION ================= #
+
+# Sorts rows by (source, time) and builds a single int64 key per row where
+# every source lives in its own non-overlapping time range, so one
+# searchsorted over the key array never crosses a source boundary.
+def prepare(data, max_window):
+    _, group = np.unique(data["src_ip"], return_inverse=True)
+    ts_us = np.round((data["timestamp"] - data["timestamp"].min()) * US).astype(np.int64)
+
+    order = np.lexsort((ts_us, group))
+    group = group[order]
+    ts_us = ts_us[order]
+
+    span = int(ts_us.max()) + int(max_window * US) + 2
+    key = group.astype(np.int64) * span + ts_us
+
+    # True where a row starts a new source
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = group[1:] != group[:-1]
+
+    return order, group, key, first
+
+
+# Packets from the same source within the last `window` seconds (inclusive),
+# matching the deque semantics of the detectors
+def rate_counts(key, window):
+    w = int(window * US)
+    left = np.searchsorted(key, key - w, side="left")
+    return np.arange(len(key)) - left + 1
+
+
+# Distinct destination ports from the same source within `window` seconds.
+#
+# Each row stays "live" until the first later row that either repeats its
+# (source, port) or falls outside its window; the distinct count at row i
+# is the rows started up to i minus the rows already ended by i.
+def distinct_counts(key, group, ports, window):
+    w = int(window * US)
+    n = len(key)
+
+    # Position of the next row with the same (source, port); rows are in
+    # (source, time) order so a stable sort on port keeps time order
+    by_port = np.lexsort((np.arange(n), ports, group))
+    same = (group[by_port][1:] == group[by_port][:-1]) & (ports[by_port][1:] == ports[by_port][:-1])
+
+    end = np.searchsorted(key, key + w, side="right")
+    end[by_port[:-1][same]] = np.minimum(end[by_port[:-1][same]], by_port[1:][same])
+    end.sort()
+
+    return np.arange(1, n + 1) - np.searchsorted(end, np.arange(n), side="right")
+
+
+# ================= SWEEP ================= #
+
+def summarize(counts, group, first, threshold, attack):
+    flagged = counts >= threshold
+
+    # An episode starts where a source crosses the threshold
+    prev = np.zeros(len(flagged), dtype=bool)
+    prev[1:] = flagged[:-1]
+    prev[first] = False
+    episodes = int(np.count_nonzero(flagged & ~prev))
+
+    row = {
+        "flagged": int(np.count_nonzero(flagged)),
+        "sources": int(np.unique(group[flagged]).size),
+        "episodes": episodes,
+    }
+
+    if attack is not None:
+        row["agree"] = int(np.count_nonzero(flagged == attack))
+    return row
+
+
+def sweep(data, metric, windows, thresholds):
+    order, group, key, first = prepare(data, max(windows))
+
+    attack = None
+    if data["label"] is not None:
+        attack = (data["label"] != "NORMAL")[order]
+
+    ports = None
+    if metric == "distinct":
+        ports = np.asarray(data["dst_port"], dtype=np.int64)[order]
+
+    results = []
+    for window in windows:
+        if metric == "distinct":
+            counts = distinct_counts(key, group, ports, window)
+        else:
+            counts = rate_counts(key, window)
+
+        for threshold in thresholds:
+            row = summarize(counts, group, first, threshold, attack)
+            row.update(window=window, threshold=threshold)
+            results.append(row)
+
+    return results
+
+
+# ================= RELABEL ================= #
+
+# Writes the CSV rows back in their original order with the window count
+# and label recomputed for one (window, threshold) setting
+def relabel(data, metric, window, threshold, out_path, attack_label):
+    order, group, key, first = prepare(data, window)
+    if metric == "distinct":
+        ports = np.asarray(data["dst_port"], dtype=np.int64)[order]
+        counts = distinct_counts(key, group, ports, window)
+    else:
+        counts = rate_counts(key, window)
+
+    original = np.empty_like(counts)
+    original[order] = counts
+
+    header = data["header"]
+    count_name = "unique_port_count" if metric == "distinct" else "packet_count"
+    count_col = header.index(count_name) if count_name in header else None
+    label_col = header.index("label") if "label" in header else None
+
+    flagged = 0
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row, count in zip(data["rows"], original.tolist()):
+            if count_col is not None:
+                row[count_col] = count
+            if label_col is not None:
+                if count >= threshold:
+                    row[label_col] = attack_label
+                    flagged += 1
+                else:
+                    row[label_col] = "NORMAL"
+            writer.writerow(row)
+
+    return flagged
+
+
+def default_attack_label(data):
+    if data["label"] is not None:
+        for label in np.unique(data["label"]):
+            if label != "NORMAL":
+                return label
+    return "ATTACK"
+
+
+def parse_list(value):
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep TIME_WINDOW/THRESHOLD over a labelled dataset")
+    parser.add_argument("dataset", help="CSV file or .cols directory")
+    parser.add_argument("--metric", choices=("rate", "distinct"),
+                        help="packet count or distinct dst ports (default: from dataset columns)")
+    parser.add_argument("--windows", type=parse_list, default=[1, 5, 10, 30])
+    parser.add_argument("--thresholds", type=parse_list, default=[10, 20, 50, 100, 200, 500])
+    parser.add_argument("--relabel", type=parse_list, metavar="WINDOW,THRESHOLD",
+                        help="write a relabelled copy of a CSV dataset for one setting")
+    parser.add_argument("-o", "--output", help="output CSV for --relabel")
+    parser.add_argument("--attack-label", help="label for flagged rows (default: from dataset)")
+    args = parser.parse_args()
+
+    if args.relabel and (len(args.relabel) != 2 or not args.output):
+        raise SystemExit("--relabel takes WINDOW,THRESHOLD and needs --output")
+
+    started = time.monotonic()
+    data = load_dataset(args.dataset)
+    loaded = time.monotonic()
+
+    metric = args.metric or ("distinct" if data["has_distinct"] else "rate")
+    if metric == "distinct" and not data["has_ports"]:
+        raise SystemExit("Dataset has no dst_port column for distinct counting")
+
+    if args.relabel:
+        if "rows" not in data:
+            raise SystemExit("--relabel needs a CSV dataset")
+        window, threshold = args.relabel
+        label = args.attack_label or default_attack_label(data)
+        flagged = relabel(data, metric, window, threshold, args.output, label)
+        print(f"{args.output}: {len(data['rows'])} rows, {flagged} labelled {label} "
+              f"(window={window:g}s, threshold={threshold:g})")
+        return
+
+    results = sweep(data, metric, args.windows, args.thresholds)
+    done = time.monotonic()
+
+    rows = len(data["timestamp"])
+    print(f"{args.dataset}: {rows} rows, metric={metric} "
+          f"(load {loaded - started:.2f}s, sweep {done - loaded:.2f}s)")
+
+    with_labels = data["label"] is not None
+    head = f"{'window':>8} {'threshold':>10} {'flagged':>10} {'sources':>8} {'episodes':>9}"
+    if with_labels:
+        head += f" {'label agree':>12}"
+    print(head)
+
+    for r in results:
+        line = (f"{r['window']:>8g} {r['threshold']:>10g} {r['flagged']:>10} "
+                f"{r['sources']:>8} {r['episodes']:>9}")
+        if with_labels:
+            line += f" {100.0 * r['agree'] / rows if rows else 0:>11.1f}%"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+from collections import deque
+
+from metrics import REGISTRY
+
+# ================= HIERARCHICAL TIMER WHEEL ================= #
+
+# Expiry scheduling on packet time, shared by every HostTable (and the ARP
+# MAC bindings) in the process, so idle state is reclaimed for quiet hosts
+# too and the cost per packet does not depend on how many hosts are
+# tracked.
+#
+# Level 0 has `slots` buckets of `granularity` seconds; each level above
+# covers `slots` buckets of the level below (64 x 0.1 s: 6.4 s, 6.8 min,
+# 7.3 h). A timer is just (owner, key) in the bucket of its deadline; when
+# the bucket comes due the wheel calls
+#
+#   owner.expire(key, now) -> None (key removed or gone) or a new deadline
+#
+# and re-files the key under the returned deadline. Owners check their own
+# last-seen time there, so touching a key never has to find and move its
+# timer: a busy key is looked at once per TTL. Keys in a higher-level
+# bucket are handed to expire() when their bucket cascades and simply come
+# back with their real deadline, which files them one level lower.
+#
+# advance(now) does bounded work: at most `max_steps` bucket steps and
+# `max_work` expire() calls per new packet time. Stretches where the lower
+# levels are empty are skipped in one jump, so a long gap in the capture
+# costs a few steps, not one per bucket. Anything left is carried to the
+# next packet, so a burst of expiries is spread out instead of stalling
+# one packet. Deadlines beyond the top level wait in an overflow list,
+# re-filed once per top-level lap.
+
+DEFAULT_GRANULARITY = 0.1     # seconds per level-0 bucket
+DEFAULT_SLOTS = 64
+DEFAULT_LEVELS = 3
+MAX_STEPS = 64                # bucket steps per packet
+MAX_WORK = 256                # expire() calls per packet
+
+
+class TimerWheel:
+
+    def __init__(self, granularity=DEFAULT_GRANULARITY, slots=DEFAULT_SLOTS, levels=DEFAULT_LEVELS,
+                 max_steps=MAX_STEPS, max_work=MAX_WORK):
+        self.granularity = granularity
+        self.slots = slots
+        self.levels = levels
+        self.max_steps = max_steps
+        self.max_work = max_work
+
+        # level -> bucket -> {owner: [keys]}
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.spans = [slots ** level for level in range(levels + 1)]    # ticks per bucket
+        self.overflow = {}
+        self.filed = [0] * (levels + 1)     # keys per level, overflow last
+        self.due = deque()          # [owner, keys, next index] waiting for expire()
+        self.tick = None            # absolute index of the current level-0 bucket
+        self.now = 0.0
+        self.pending = 0            # keys filed in the wheel
+
+        # Counters
+        self.fired = 0              # expire() calls
+        self.rescheduled = 0        # ... that returned a new deadline
+
+    # File `key` of `owner` to be looked at once `deadline` has passed
+    def schedule(self, deadline, owner, key):
+        # Always a later bucket: its start is past the deadline
+        tick = int(deadline / self.granularity) + 1
+        current = self.tick
+        if current is None:
+            current = self.tick = tick - 1
+        if tick <= current:
+            tick = current + 1
+
+        spans = self.spans
+        for level in range(self.levels):
+            if tick // spans[level + 1] == current // spans[level + 1]:
+                bucket = self.wheels[level][(tick // spans[level]) % self.slots]
+                break
+        else:
+            level = self.levels
+            bucket = self.overflow
+        self.filed[level] += 1
+
+        keys = bucket.get(owner)
+        if keys is None:
+            bucket[owner] = [key]
+        else:
+            keys.append(key)
+        self.pending += 1
+
+    # Move the wheel to packet time `now` (once per new packet time)
+    def advance(self, now):
+        if now <= self.now:
+            return
+        self.now = now
+
+        target = int(now / self.granularity)
+        if self.tick is None:
+            self.tick = target
+
+        spans = self.spans
+        filed = self.filed
+        steps = self.max_steps
+        while self.tick < target and steps:
+            # Nothing filed below `level`: jump to just before its next boundary
+            level = 0
+            while level < self.levels and not filed[level]:
+                level += 1
+            if level:
+                boundary = (self.tick // spans[level] + 1) * spans[level]
+                if boundary > target:
+                    self.tick = target
+                    break
+                self.tick = boundary - 1
+            self.step()
+            steps -= 1
+
+        if self.due:
+            self.run_due(now)
+
+    # Next level-0 bucket; higher-level buckets cascade at their boundaries
+    def step(self):
+        tick = self.tick = self.tick + 1
+        slots = self.slots
+        spans = self.spans
+
+        for level in range(self.levels):
+            if level and tick % spans[level]:
+                break
+            wheel = self.wheels[level]
+            index = (tick // spans[level]) % slots
+            if wheel[index]:
+                self.collect(level, wheel[index])
+                wheel[index] = {}
+        else:
+            if tick % spans[self.levels] == 0 and self.overflow:
+                self.collect(self.levels, self.overflow)
+                self.overflow = {}
+
+    def collect(self, level, bucket):
+        for owner, keys in bucket.items():
+            self.due.append([owner, keys, 0])
+            self.filed[level] -= len(keys)
+
+    def run_due(self, now):
+        due = self.due
+        budget = self.max_work
+
+        while due and budget:
+            entry = due[0]
+            owner, keys, i = entry
+            end = min(len(keys), i + budget)
+            budget -= end - i
+            self.pending -= end - i
+
+            for key in keys[i:end]:
+                self.fired += 1
+                deadline = owner.expire(key, now)
+                if deadline is not None:
+                    self.rescheduled += 1
+                    self.schedule(deadline, owner, key)
+
+            if end < len(keys):
+                entry[2] = end
+            else:
+                due.popleft()
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "due": sum(len(keys) - i for _, keys, i in self.due),
+            "fired": self.fired,
+            "rescheduled": self.rescheduled,
+        }
+
+
+# One wheel per process, advanced by whichever table sees a packet first
+WHEEL = TimerWheel()
+
+REGISTRY.gauge("ids_timers_pending", "Expiry timers filed in the timer wheel", fn=lambda: WHEEL.pending)
+REGISTRY.counter("ids_timers_fired_total", "Expiry timers that came due", fn=lambda: WHEEL.fired)
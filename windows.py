@@ -0,0 +1,232 @@
+from array import array
+from collections import OrderedDict
+from math import ceil
+
+# ================= BUCKETED SLIDING WINDOW ================= #
+
+# Packet counter over the last `time_window` seconds, kept as a ring of
+# fixed-width time slots instead of one timestamp per packet.
+#
+# Memory per host is constant (one uint32 per slot) and both update and
+# expiry are O(1) amortized: each slot is cleared at most once per lap of
+# the ring. The window covers between time_window and time_window plus one
+# slot, so a host that sends THRESHOLD packets inside TIME_WINDOW is still
+# always counted as reaching THRESHOLD.
+#
+# The ring is only allocated once a host's packets span two slots; until
+# then the single slot's count is `total`. Most hosts in a busy network
+# send a handful of packets at a time, so they never pay for a ring.
+
+# Slot widths tried in order, smallest first (1 ms ... 10 s)
+GRANULARITIES = (0.001, 0.01, 0.1, 1.0, 10.0)
+MAX_SLOTS = 128
+
+
+def pick_granularity(time_window):
+    for g in GRANULARITIES:
+        if time_window / g <= MAX_SLOTS:
+            return g
+    return time_window / MAX_SLOTS
+
+
+class RateWindow:
+    __slots__ = ("granularity", "size", "counts", "head", "total")
+
+    def __init__(self, time_window, granularity=None):
+        if granularity is None:
+            granularity = pick_granularity(time_window)
+
+        self.granularity = granularity
+        self.size = ceil(time_window / granularity) + 1
+        self.counts = None    # ring of per-slot counts, None while all in slot `head`
+        self.head = None      # absolute index of the newest slot
+        self.total = 0
+
+    # Expire every slot that fell out of the window before `slot`
+    def advance(self, slot):
+        head = self.head
+        if head is None:
+            self.head = slot
+            return
+        if slot <= head:
+            return
+
+        counts = self.counts
+        size = self.size
+
+        if slot - head >= size:
+            if counts is not None:
+                for i in range(size):
+                    counts[i] = 0
+            self.total = 0
+        elif counts is None:
+            # Second slot: move to a ring
+            counts = self.counts = array("I", bytes(4 * size))
+            counts[head % size] = self.total
+        else:
+            for s in range(head + 1, slot + 1):
+                i = s % size
+                self.total -= counts[i]
+                counts[i] = 0
+
+        self.head = slot
+
+    # Count one packet at `timestamp` and return the in-window total
+    def add(self, timestamp, n=1):
+        slot = int(timestamp / self.granularity)
+        self.advance(slot)
+
+        # Late packets are still counted if their slot is in the window
+        if slot == self.head:
+            if self.counts is not None:
+                self.counts[slot % self.size] += n
+            self.total += n
+        elif slot > self.head - self.size:
+            if self.counts is None:
+                self.counts = array("I", bytes(4 * self.size))
+                self.counts[self.head % self.size] = self.total
+            self.counts[slot % self.size] += n
+            self.total += n
+
+        return self.total
+
+    # In-window total as of `timestamp`, without counting a packet
+    def count(self, timestamp):
+        self.advance(int(timestamp / self.granularity))
+        return self.total
+
+    # Re-buckets the in-window counts for a new time window; counts that
+    # fall outside a shorter window are dropped
+    def resize(self, time_window, granularity=None):
+        if granularity is None:
+            granularity = pick_granularity(time_window)
+
+        old_g, old_size, old_counts, head = self.granularity, self.size, self.counts, self.head
+
+        self.granularity = granularity
+        self.size = ceil(time_window / granularity) + 1
+        scale = old_g / granularity
+        if head is None:
+            return
+        self.head = int(head * scale + 1e-9)
+        if old_counts is None:
+            return
+
+        # Each old slot moves to the new slot holding its start time
+        self.counts = array("I", bytes(4 * self.size))
+        self.total = 0
+        for s in range(head - old_size + 1, head + 1):
+            n = old_counts[s % old_size]
+            if not n:
+                continue
+            slot = int(s * scale + 1e-9)
+            if slot > self.head - self.size:
+                self.counts[slot % self.size] += n
+                self.total += n
+
+    def clear(self):
+        self.counts = None
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+
+# ================= DISTINCT-VALUE WINDOW ================= #
+
+# Distinct ports seen in the last `time_window` seconds. Each port keeps
+# only its last-seen time, in last-seen order, so memory follows the number
+# of distinct ports rather than the packet rate (a sweep of one port across
+# thousands of hosts is one entry) and expiry pops from the cold end.
+#
+# Up to SMALL_PORTS ports sit in a pair of typed arrays (2-byte port,
+# 8-byte time) searched in place; past that the window moves to an ordered
+# dict so a vertical scan stays O(1) per packet.
+
+SMALL_PORTS = 16
+
+
+class DistinctWindow:
+    __slots__ = ("time_window", "ports", "times", "last_seen")
+
+    def __init__(self, time_window):
+        self.time_window = time_window
+        self.ports = array("H")         # ports, oldest first, while small
+        self.times = array("d")         # ... and their last-seen times
+        self.last_seen = None           # port -> last timestamp, oldest first, once large
+
+    # Record `port` at `timestamp` and return the distinct count
+    def add(self, timestamp, port):
+        last_seen = self.last_seen
+        if last_seen is None:
+            ports, times = self.ports, self.times
+            if ports and ports[-1] == port:
+                if timestamp >= times[-1]:
+                    times[-1] = timestamp
+            elif port in ports:
+                i = ports.index(port)
+                if timestamp >= times[i]:
+                    del ports[i]
+                    del times[i]
+                    ports.append(port)
+                    times.append(timestamp)
+            else:
+                ports.append(port)
+                times.append(timestamp)
+                if len(ports) > SMALL_PORTS:
+                    self.expire(timestamp)
+                    if len(self.ports) > SMALL_PORTS:
+                        self.grow()
+                    return len(self)
+            self.expire(timestamp)
+            return len(self.ports)
+
+        seen = last_seen.get(port)
+        if seen is None or timestamp >= seen:
+            last_seen[port] = timestamp
+            last_seen.move_to_end(port)
+        self.expire(timestamp)
+        return len(self)
+
+    def grow(self):
+        self.last_seen = OrderedDict(zip(self.ports, self.times))
+        self.ports = self.times = None
+
+    def expire(self, timestamp):
+        cutoff = timestamp - self.time_window
+        last_seen = self.last_seen
+
+        if last_seen is None:
+            times = self.times
+            n = 0
+            while n < len(times) and times[n] < cutoff:
+                n += 1
+            if n:
+                del self.ports[:n]
+                del times[:n]
+            return
+
+        while last_seen and next(iter(last_seen.values())) < cutoff:
+            last_seen.popitem(last=False)
+        if not last_seen:
+            self.clear()
+
+    # A shorter window takes effect on the next add
+    def resize(self, time_window):
+        self.time_window = time_window
+
+    # Distinct ports currently in the window
+    def values(self):
+        if self.last_seen is None:
+            return self.ports.tolist()
+        return self.last_seen.keys()
+
+    def clear(self):
+        self.ports = array("H")
+        self.times = array("d")
+        self.last_seen = None
+
+    def __len__(self):
+        if self.last_seen is None:
+            return len(self.ports)
+        return len(self.last_seen)